@@ -0,0 +1,82 @@
+#------------------------------------------------------------------------------#
+#                                                                              #
+# Project:           Greenhouse control with Raspberry Pi Pico W               #
+# Module:            conftest.py (gemeinsame Vorbereitung der Tests)           #
+#                                                                              #
+# Die Tests laufen mit pytest auf dem PC gegen gw2_sim: eine simulierte        #
+# Platine mit fester Startzeit auf einer Ereignisschleife mit virtueller Zeit, #
+# die Steuerung einmal geladen und gestartet (boot), ohne WLAN.                #
+#                                                                              #
+#------------------------------------------------------------------------------#
+
+import io, asyncio, contextlib
+
+import pytest
+
+import gw2_sim
+
+SIM_UTC          = 1748858400   # 2025-06-02 10:00 UTC, Sommer
+
+#-------------------------------------------------------------------------------
+# Schreiber fuer serve_client, sammelt die Antwort
+
+class CaptureWriter:
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.closed = False
+
+    def write(self, buf):
+        self.buf += buf
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        pass
+
+    def status(self):
+        return int(self.buf.split(b" ", 2)[1]) if self.buf else None
+
+    def body(self):
+        return bytes(self.buf).split(b"\r\n\r\n", 1)[1]
+
+#-------------------------------------------------------------------------------
+
+class Sim:
+
+    def __init__(self):
+        self.loop = gw2_sim.VirtualLoop()
+        asyncio.set_event_loop(self.loop)
+        self.board = gw2_sim.Board(utc = SIM_UTC, source = self.loop.time)
+        self.board.wlan.ap = False
+        gw2_sim.install(self.board)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.gw = gw2_sim.load()
+            self.gw.boot()
+
+    def run(self, coro):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.loop.run_until_complete(coro)
+
+    # rohe Anfrage an serve_client, Rueckgabe ist der Schreiber mit der Antwort
+    async def request(self, raw):
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        writer = CaptureWriter()
+        await self.gw.serve_client(reader, writer)
+        return writer
+
+    async def get(self, path):
+        return await self.request("GET {} HTTP/1.1\r\nHost: gw2\r\n\r\n".format(path).encode())
+
+    def http(self, path):
+        return self.run(self.get(path))
+
+@pytest.fixture(scope = "session")
+def sim():
+    return Sim()
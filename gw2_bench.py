@@ -0,0 +1,309 @@
+#------------------------------------------------------------------------------#
+#                                                                              #
+# Project:           Greenhouse control with Raspberry Pi Pico W               #
+# Module:            gw2_bench.py (Messungen auf simulierter Hardware)         #
+#                                                                              #
+# Laesst die Funktionen aus gw2_pico.py unveraendert gegen gw2_sim laufen und  #
+# misst je Vorgang Laufzeit, Speicher, I2C-Transfers und blockierte Zeit,      #
+# dazu die Verzoegerung der Ereignisschleife im laufenden Betrieb. Vergleich   #
+# mit dem gespeicherten Stand in gw2_bench.json.                               #
+#                                                                              #
+# Aufruf:   python gw2_bench.py [-n 20] [--loop 10] [--save] [--check]         #
+#                                                                              #
+#------------------------------------------------------------------------------#
+
+import sys, io, json, time, asyncio, contextlib, tracemalloc
+
+import gw2_sim
+
+BASELINE         = "gw2_bench.json"
+
+# feste Startzeit der simulierten Platine, LCD-Inhalt und damit die I2C-Transfers
+# haengen sonst vom Datum auf dem PC ab
+BENCH_UTC        = 1748858400   # 2025-06-02 10:00 UTC
+
+# Kennzahlen je Vorgang (Mittel je Aufruf):
+#   wall_us   Laufzeit auf dem PC, schnellster Aufruf (nur fuer Verhaeltnisse brauchbar)
+#   alloc_b   hoechster zusaetzlicher Speicher waehrend des Aufrufs
+#   heap_b    verbleibender Zuwachs nach dem Aufruf
+#   i2c_tx    I2C-Transaktionen
+#   i2c_b     I2C-Nutzbytes
+#   blk_ms    blockierte Zeit auf dem Pico (sleep_ms und Buszeit I2C/1-Wire)
+# Ereignisschleife: Verzoegerung eines 10-ms-Weckers, getrennt nach blockierter Zeit
+# auf dem Pico (blk, wie oben) und Verzoegerung auf dem PC (lag), dazu Jitter und
+# Laufzeit je Job. Verglichen wird nur die blockierte Zeit, lag haengt am PC.
+# wall_us wird nur angezeigt, nicht geprueft (schwankt von Lauf zu Lauf mit dem PC).
+
+# Zulaessige Verschlechterung gegenueber dem gespeicherten Stand
+TOLERANCE = {"alloc_b": 0.10, "heap_b": 0.10, "i2c_tx": 0.0, "i2c_b": 0.0,
+             "blk_ms": 0.02, "blk_max_ms": 0.02, "blk_p99_ms": 0.02}
+
+# Unterhalb dieser Werte gibt es keine Verschlechterung (Rauschen)
+FLOOR = {"alloc_b": 256, "heap_b": 256, "i2c_tx": 0, "i2c_b": 0,
+         "blk_ms": 0.05, "blk_max_ms": 0.05, "blk_p99_ms": 0.05}
+
+#-------------------------------------------------------------------------------
+# HTTP-Anfrage ohne Netz: Leser mit fertiger Anfrage, Schreiber zaehlt nur
+
+class NullWriter:
+
+    def __init__(self):
+        self.nbytes = 0
+        self.writes = 0
+
+    def write(self, buf):
+        self.nbytes += len(buf)
+        self.writes += 1
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+async def http_get(gw, path):
+    reader = asyncio.StreamReader()
+    reader.feed_data("GET {} HTTP/1.1\r\nHost: gw2\r\n\r\n".format(path).encode())
+    reader.feed_eof()
+    writer = NullWriter()
+    await gw.serve_client(reader, writer)
+    return writer.nbytes
+
+#-------------------------------------------------------------------------------
+# Vorgaenge: Name, Vorbereitung (nicht gemessen), Aufruf (Funktion oder Coroutine-Funktion)
+
+def ops(gw, board):
+
+    def page(p):
+        return lambda: http_get(gw, p)
+
+    def param_edit():
+        gw.t_heat_on = 6.5 if gw.t_heat_on == 6.0 else 6.0
+        gw.pcache.touch()
+
+    # Wandlung anstossen bzw. nach der Wandlungszeit auslesen (zwei Laeufe von job_sense)
+    def conv_start():
+        gw.ds_busy = False
+
+    def conv_done():
+        gw.ds_busy = False
+        gw.job_sense()
+        board.st.sleep(gw.ds_conv_ms() / 1000)
+
+    return (
+        ("http_page",     None,                page("/")),
+        ("http_status",   None,                page("/api/status")),
+        ("http_hist",     None,                page("/api/hist?res=1&n=120")),
+        ("http_chart",    None,                page("/chart")),
+        ("http_events",   None,                page("/api/events")),
+        ("lcd_stats",     gw.showlcd_params,   gw.showlcd_stats),
+        ("lcd_params",    gw.showlcd_stats,    gw.showlcd_params),
+        ("lcd_err",       gw.showlcd_stats,    gw.errlcd),
+        ("lcd_same",      gw.showlcd_stats,    gw.showlcd_stats),
+        ("ctrl",          None,                gw.job_ctrl),
+        ("sense_conv",    conv_start,          gw.job_sense),
+        ("sense_read",    conv_done,           gw.job_sense),
+        ("wepr",          param_edit,          gw.wepr),
+        ("lepr",          None,                gw.lepr),
+        ("rel_save",      None,                gw.rel_save),
+        ("evlog_add",     None,                lambda: gw.evlog.add(gw.EV_PARAM, 0)),
+        ("clock_secs",    gw.clock.invalidate, gw.clock.secs),
+    )
+
+async def call(fn):
+    r = fn()
+    if asyncio.iscoroutine(r): await r
+
+# Jeder Vorgang n-mal ohne tracemalloc (Zeit, Bus), dann n-mal mit (Speicher)
+async def bench_ops(gw, board, n, only = None):
+
+    res = {}
+    bus = board.bus
+    st = board.st
+    for name, pre, fn in ops(gw, board):
+        if only and name not in only: continue
+        wall = None
+        tx = nb = 0
+        blk = 0.0
+        for i in range(n):
+            if pre: pre()
+            tx0, nb0, w0 = bus.xfers, bus.nbytes, st.warp
+            t0 = time.perf_counter()
+            await call(fn)
+            dt = time.perf_counter() - t0
+            if wall is None or dt < wall: wall = dt
+            tx += bus.xfers - tx0
+            nb += bus.nbytes - nb0
+            blk += st.warp - w0
+            # EEPROM-Schreibzeit abwarten, damit der naechste Aufruf nicht auf NACK laeuft
+            st.sleep(0.01)
+
+        alloc = heap = 0
+        tracemalloc.start()
+        for i in range(n):
+            if pre: pre()
+            m0 = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            await call(fn)
+            m1, peak = tracemalloc.get_traced_memory()
+            alloc += peak - m0
+            heap += m1 - m0
+            st.sleep(0.01)
+        tracemalloc.stop()
+
+        res[name] = {"wall_us": round(wall * 1000000, 1), "alloc_b": alloc // n,
+                     "heap_b": heap // n, "i2c_tx": round(tx / n, 2), "i2c_b": round(nb / n, 1),
+                     "blk_ms": round(blk * 1000 / n, 3)}
+    return res
+
+#-------------------------------------------------------------------------------
+# Laufender Betrieb: main() mit Wecker alle 10 ms und einem Seitenabruf je Sekunde
+
+def pctl(v, p):
+    if not v: return 0
+    v = sorted(v)
+    return v[min(len(v) - 1, int(len(v) * p))]
+
+async def bench_loop(gw, board, secs):
+
+    st = board.st
+    blks = []
+    lags = []
+    task = asyncio.create_task(gw.main())
+    t_end = time.monotonic() + secs
+    t_page = 0.0
+    while time.monotonic() < t_end:
+        t0 = time.monotonic()
+        w0 = st.warp
+        await asyncio.sleep(0.01)
+        blks.append((st.warp - w0) * 1000)
+        lags.append(max(time.monotonic() - t0 - 0.01, 0) * 1000)
+        if t0 - t_page >= 1.0:
+            t_page = t0
+            await http_get(gw, "/")
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+    res = {"blk_max_ms": round(max(blks), 2), "blk_p99_ms": round(pctl(blks, 0.99), 2),
+           "blk_sum_ms": round(sum(blks), 1), "lag_max_ms": round(max(lags), 2),
+           "lag_p99_ms": round(pctl(lags, 0.99), 2), "wakeups": len(lags)}
+    for j in gw.sched.jobs:
+        s = j.stats()
+        res["job_" + j.name] = {"runs": s["runs"], "jit_max": s["jit_max"], "t_max": s["t_max"], "over": s["over"]}
+    return res
+
+#-------------------------------------------------------------------------------
+# Vergleich mit dem gespeicherten Stand
+
+def worse(key, new, old):
+    if key not in TOLERANCE or old is None: return False
+    return new > FLOOR[key] and new > old * (1 + TOLERANCE[key]) + 1e-9
+
+def delta(new, old):
+    if old is None: return "   neu"
+    if old == 0: return "     ~" if new == 0 else "    +∞"
+    return "{:+6.0f}%".format((new - old) * 100 / old)
+
+def report(res, base):
+
+    bad = []
+    ops_b = base.get("ops", {}) if base else {}
+    keys = ("wall_us", "alloc_b", "heap_b", "i2c_tx", "i2c_b", "blk_ms")
+    print("{:14s}".format("Vorgang") + "".join("{:>18s}".format(k) for k in keys))
+    for name, r in res["ops"].items():
+        b = ops_b.get(name, {})
+        line = "{:14s}".format(name)
+        for k in keys:
+            mark = "!" if worse(k, r[k], b.get(k)) else " "
+            if mark == "!": bad.append("{}.{}".format(name, k))
+            line += "{:>10} {}{}".format(r[k], delta(r[k], b.get(k)) if b else "      ", mark)
+        print(line)
+
+    if "loop" in res:
+        lp = res["loop"]
+        lb = base.get("loop", {}) if base else {}
+        print("")
+        print("Ereignisschleife: {} Wecker, blockiert max {} ms, p99 {} ms, Summe {} ms".format(
+            lp["wakeups"], lp["blk_max_ms"], lp["blk_p99_ms"], lp["blk_sum_ms"]))
+        print("  Verzoegerung auf dem PC max {} ms, p99 {} ms".format(lp["lag_max_ms"], lp["lag_p99_ms"]))
+        for k in ("blk_max_ms", "blk_p99_ms"):
+            if worse(k, lp[k], lb.get(k)): bad.append("loop." + k)
+        for k, v in lp.items():
+            if k.startswith("job_"):
+                print("  {:8s} {:4d} Laeufe, Jitter max {:5d} ms, Laufzeit max {:5d} ms, Frist verfehlt {}".format(
+                    k[4:], v["runs"], v["jit_max"], v["t_max"], v["over"]))
+    return bad
+
+#-------------------------------------------------------------------------------
+
+def main(argv):
+
+    n = 20
+    secs = 10.0
+    only = None
+    save = check = False
+    i = 1
+    while i < len(argv):
+        a = argv[i]
+        if a == "-n":
+            i += 1
+            n = int(argv[i])
+        elif a == "--loop":
+            i += 1
+            secs = float(argv[i])
+        elif a == "--only":
+            i += 1
+            only = argv[i].split(",")
+        elif a == "--save":
+            save = True
+        elif a == "--check":
+            check = True
+        else:
+            print("Aufruf: python gw2_bench.py [-n 20] [--loop 10] [--only a,b] [--save] [--check]")
+            return 2
+        i += 1
+
+    board = gw2_sim.install(gw2_sim.Board(utc = BENCH_UTC))
+    board.http_port = 0
+    quiet = io.StringIO()
+    with contextlib.redirect_stdout(quiet):
+        gw = gw2_sim.load()
+        gw.boot()
+        # einen vollen Tag Verlauf fuer Diagramm und /api/hist
+        t = gw.clock.secs()
+        for k in range(1440, 0, -1):
+            gw.HIST[1].add(t - k * 60, 20 + (k % 60) / 10, 10 + (k % 30) / 10)
+
+    async def run():
+        with contextlib.redirect_stdout(quiet):
+            res = {"ops": await bench_ops(gw, board, n, only)}
+            if secs > 0: res["loop"] = await bench_loop(gw, board, secs)
+        return res
+
+    res = asyncio.run(run())
+
+    try:
+        with open(BASELINE) as f:
+            base = json.load(f)
+    except OSError:
+        base = None
+    bad = report(res, base)
+
+    if save:
+        res["python"] = sys.version.split()[0]
+        res["n"] = n
+        with open(BASELINE, "w") as f:
+            json.dump(res, f, indent=1)
+        print("Stand in {} gespeichert.".format(BASELINE))
+    if bad:
+        print("Schlechter als gespeichert: " + ", ".join(bad))
+    return 1 if check and bad else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
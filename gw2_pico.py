@@ -12,14 +12,21 @@
 #                                                                              #
 #------------------------------------------------------------------------------#
 
+# Hardware-Schicht: machine, onewire, ds18x20, network und uasyncio sind die einzigen
+# Zugriffe auf den Pico. Auf dem PC setzt gw2_sim.install() simulierte Module mit
+# gleicher Schnittstelle ein (I2C-Bus mit DS1307, AT24C32N und LCD, DS18B20, WLAN, NTP).
+
 from machine import I2C, Pin, RTC
 from micropython import const
 import network
 import uasyncio as asyncio
-import time, ntptime
+import time, socket
+import json, struct, uctypes
 from time import sleep_ms
 import onewire, ds18x20
 from random import randint
+from gc import mem_alloc
+from array import array
 
 #-------------------------------------------------------------------------------
 
@@ -33,6 +40,14 @@ WRITE_EEPROM     = False     # EEPROM fest im Script schreiben (in der Entwicklu
 
 WEB_PERMIT       = False     # Austausch mit Web abschalten (Trotzdem auf Internet-Zugang testen)
 
+SENS_PERIOD      = 2         # Abtastintervall der Tempsensoren (sec)
+
+SENS_RES         = 12        # Aufloesung der DS18B20 (9-12 Bit), Wandlungszeit 94 ms (9 Bit) bis 750 ms (12 Bit)
+
+CTRL_PID         = False     # Heizung/Ventilator stetig (PID mit Relais-PWM) statt Zweipunkt, per /api/ctrl?pid=0|1 umschaltbar
+
+PROF             = False     # Laufzeitprofil je Stufe (Jobs, Teilschritte, Web-Handler), per /api/perf?on=0|1 umschaltbar
+
 #-------------------------------------------------------------------------------
 # globaler Counter fuer jeden Turn um 1 erhoeht
 
@@ -70,7 +85,7 @@ t_vc_off         = 35.0      # Ventilator aus bei geschlossenem Oberlicht (Tuer)
 t_vo_on          = 40.0      # Ventilator ein bei offenem Oberlicht (Tuer)
 t_vo_off         = 39.0      # Ventilator aus bei offenem Oberlicht (Tuer)
 
-# Im EEPROM werden fuer Temperaturen derzeit nur ganzzahlige Werte (0-255) gespeichert
+# Im EEPROM werden Temperaturen als Festkomma-Werte in Zehntel Grad gespeichert (-3276.8 bis 3276.7)
 # Im Winter (eigentlich ausser Betrieb) gelten die Herbst-Zeiten und -temperaturen
 
 ct_hour          = 18        # Stunde zum unbedingten Schliessen der Fenster
@@ -81,9 +96,42 @@ ct_min           = 30        # Minute zum unbedingten Schliessen der Fenster
 tcorr_in         = 0.4       # Korrektur Temperatur Innenfuehler
 tcorr_out        = 0.4       # Korrektur Temperatur Aussenfuehler
 
-# Gespeichert wird ein Byte mit Addition von 3.0 und Multiplikator 10
+# Gespeichert werden wie die Temperaturen Zehntel Grad
 # Es koennen Korrekturen von inklusive -3.0 bis +9.0 Grad vorgenommen werden
 
+# Parameter-Tabelle in der Reihenfolge der Web-App (psel 1-18)
+# Name, Typ, Minimum, Maximum, Schrittweite fuer +/-, Bezeichnung
+PARAMS = (
+    ("mot_duration",  int,     5,  120, 1,   "Motorzeit"),
+    ("t_win_f_open",  float,   0,   50, 1,   "Fenster offen im Fruehling"),
+    ("t_win_f_close", float,   0,   50, 1,   "Fenster zu im Fruehling"),
+    ("t_win_s_open",  float,   0,   50, 1,   "Fenster offen im Sommer"),
+    ("t_win_s_close", float,   0,   50, 1,   "Fenster zu im Sommer"),
+    ("t_win_h_open",  float,   0,   50, 1,   "Fenster offen im Herbst"),
+    ("t_win_h_close", float,   0,   50, 1,   "Fenster zu im Herbst"),
+    ("t_wcut_close",  float, -10,   30, 1,   "Schliessen auf Grund Aussentemp"),
+    ("t_heat_off",    float, -10,   30, 1,   "Heizung aus"),
+    ("t_heat_on",     float, -10,   30, 1,   "Heizung ein"),
+    ("t_vc_on",       float,  10,   50, 1,   "Venti ein bei Tuer zu"),
+    ("t_vc_off",      float,  10,   50, 1,   "Venti aus bei Tuer zu"),
+    ("t_vo_on",       float,  10,   50, 1,   "Venti ein bei Tuer offen"),
+    ("t_vo_off",      float,  10,   50, 1,   "Venti aus bei Tuer offen"),
+    ("ct_hour",       int,     0,   23, 1,   "Stunde zu per Zeit"),
+    ("ct_min",        int,     0,   59, 1,   "Minute zu per Zeit"),
+    ("tcorr_in",      float, -3.0, 9.0, 0.1, "Korrektur TFuehler innen"),
+    ("tcorr_out",     float, -3.0, 9.0, 0.1, "Korrektur TFuehler aussen"),
+)
+
+# Einschalt-/Ausschaltpaare, der erste Wert muss groesser als der zweite sein
+PARAM_PAIRS = (
+    ("t_win_f_open", "t_win_f_close"),
+    ("t_win_s_open", "t_win_s_close"),
+    ("t_win_h_open", "t_win_h_close"),
+    ("t_heat_off", "t_heat_on"),
+    ("t_vc_on", "t_vc_off"),
+    ("t_vo_on", "t_vo_off"),
+)
+
 #-------------------------------------------------------------------------------
 # Extremwerte zur Temperaturwarnung, die ins Error-Log geschrieben wird
 
@@ -193,13 +241,69 @@ led_g.value(1)
 # Tuerkontakt
 tuer = Pin(15, Pin.IN, Pin.PULL_UP)
 
+# Relais mit Zaehlern, ersetzt den Pin mit gleicher value()-API (low-aktiv)
+# Gezaehlt werden Schaltvorgaenge, Einschaltdauer (ms), letzter Wechsel (Sekunden
+# der Uhr) und zu kurze Ein- oder Aus-Zeiten (kuerzer short_ms, 0 = nicht pruefen).
+# Alle Relais-Zugriffe (Fensterheber, Regelung, Handbetrieb) laufen hierueber.
+
+RELAY_SHORT_MS   = const(60000)
+rel_dirty        = False
+
+class Relay:
+
+    def __init__(self, name, pin, short_ms = 0):
+        self.name = name
+        self.pin = pin
+        self.short_ms = short_ms
+        self.on = False
+        self.t_chg = time.ticks_ms()
+        self.t_last = 0
+        self.switches = 0
+        self.on_ms = 0
+        self.short = 0
+
+    def value(self, v = None):
+
+        global rel_dirty
+
+        if v is None:
+            return self.pin.value()
+        self.pin.value(v)
+        on = not v
+        if on == self.on:
+            return
+        now = time.ticks_ms()
+        dt = time.ticks_diff(now, self.t_chg)
+        if self.on:
+            self.on_ms += dt
+        if self.short_ms and dt < self.short_ms and self.t_last:
+            self.short += 1
+            if GDEBUG: print("Relais {} zu kurz geschaltet ({} ms).".format(self.name, dt))
+        self.on = on
+        self.t_chg = now
+        self.t_last = clock.secs() if clock is not None else 0
+        self.switches += 1
+        rel_dirty = True
+
+    # Einschaltdauer in s, einschliesslich der laufenden
+    def on_s(self):
+        ms = self.on_ms
+        if self.on: ms += time.ticks_diff(time.ticks_ms(), self.t_chg)
+        return ms // 1000
+
+    def stats(self):
+        return {"on": self.on, "switches": self.switches, "on_s": self.on_s(),
+                "last": self.t_last, "short": self.short}
+
 # Relais-Board
-rel01 = Pin(18, Pin.OUT)
-rel02 = Pin(19, Pin.OUT)
-rel03 = Pin(20, Pin.OUT)
-rel04 = Pin(21, Pin.OUT)
-rel05 = Pin(22, Pin.OUT)
-rel06 = Pin(26, Pin.OUT)
+rel01 = Relay("rel01", Pin(18, Pin.OUT))
+rel02 = Relay("rel02", Pin(19, Pin.OUT))
+rel03 = Relay("rel03", Pin(20, Pin.OUT))
+rel04 = Relay("rel04", Pin(21, Pin.OUT))
+rel05 = Relay("rel05", Pin(22, Pin.OUT), RELAY_SHORT_MS)
+rel06 = Relay("rel06", Pin(26, Pin.OUT), RELAY_SHORT_MS)
+
+RELAYS = (rel01, rel02, rel03, rel04, rel05, rel06)
 
 rel01.value(1)
 rel02.value(1)
@@ -220,10 +324,121 @@ msg_txt = ["","","","","","","","","",""]
 # Fehlerspeicher
 err_txt = ["","",""]
 
+# Ereignis-Codes fuer das Ereignis-Log im EEPROM (siehe EventLog)
+EV_START         = const(1)
+EV_PARAM         = const(2)
+EV_DOOR_OPEN     = const(3)
+EV_DOOR_CLOSE    = const(4)
+EV_WIN_OPEN      = const(10)
+EV_WIN_CLOSE     = const(11)
+EV_WIN_CLOSE_TS  = const(12)
+EV_WIN_CLOSE_CT  = const(13)
+EV_WIN_MAN_OPEN  = const(14)
+EV_WIN_MAN_CLOSE = const(15)
+EV_WIN_AUTO      = const(16)
+EV_VENT_ON       = const(20)
+EV_VENT_OFF      = const(21)
+EV_VENT_MAN_ON   = const(22)
+EV_VENT_MAN_OFF  = const(23)
+EV_VENT_AUTO     = const(24)
+EV_HEAT_ON       = const(30)
+EV_HEAT_OFF      = const(31)
+EV_HEAT_MAN_ON   = const(32)
+EV_HEAT_MAN_OFF  = const(33)
+EV_HEAT_AUTO     = const(34)
+EV_ERR           = const(50)   # plus Fehlernummer von err_hndl (1-6)
+
+# Ereignis-Log, wird nach dem EEPROM angelegt
+evlog            = None
+
+# Versionszaehler fuer Status, Parameter und Logs (ETag der JSON-API)
+# Jede Aenderung erhoeht den Zaehler, ein unveraenderter Abruf kostet nur ein 304.
+VER_ST           = const(0)
+VER_PAR          = const(1)
+VER_LOG          = const(2)
+
+ver              = [0, 0, 0]
+
+# Kennung dieses Starts, damit ETags nach einem Neustart nicht zufaellig wieder passen
+boot_id          = randint(1, 99999)
+
+#-------------------------------------------------------------------------------
+# Uhrzeit-Cache
+
+# Die RTC wird hoechstens einmal je Sekunde gelesen, die Zeitstrings werden erst
+# bei Bedarf und dann nur einmal je Sekunde formatiert. Alle Verbraucher (Logs,
+# LCD, Regelung, Web) holen die Zeit hier. Nach dem Stellen der Uhr invalidate().
+
+class Clock:
+
+    def __init__(self, rtc):
+        self.rtc = rtc
+        self.dt = None
+        self.t = 0
+        self.reads = 0
+        self._clear()
+
+    def _clear(self):
+        self._long = None
+        self._short = None
+        self._iso = None
+        self._lcd = None
+        self._secs = None
+
+    def invalidate(self):
+        self.dt = None
+
+    # datetime-Tupel der RTC
+    def now(self):
+        t = time.ticks_ms()
+        if self.dt is None or time.ticks_diff(t, self.t) >= 1000:
+            self.dt = self.rtc.datetime()
+            self.t = t
+            self.reads += 1
+            self._clear()
+        return self.dt
+
+    # "TT.MM.JJJJ hh:mm:ss " fuer Meldungen und Terminal
+    def long(self):
+        it = self.now()
+        if self._long is None:
+            self._long = "{:02}.{:02}.{:04} {:02}:{:02}:{:02} ".format(it[2], it[1], it[0], it[4], it[5], it[6])
+        return self._long
+
+    # "ETTMMhhmm " fuer das Fehler-Log (LCD)
+    def short(self):
+        it = self.now()
+        if self._short is None:
+            self._short = "E{:02}{:02}{:02}{:02} ".format(it[2], it[1], it[4], it[5])
+        return self._short
+
+    # "JJJJ-MM-TTThh:mm:ss" fuer das Web
+    def iso(self):
+        it = self.now()
+        if self._iso is None:
+            self._iso = "{:04}-{:02}-{:02}T{:02}:{:02}:{:02}".format(it[0], it[1], it[2], it[4], it[5], it[6])
+        return self._iso
+
+    # Zeile 4 der Statusseite auf dem LCD
+    def lcd(self):
+        it = self.now()
+        if self._lcd is None:
+            self._lcd = "GZeit {:02}.{:02}.{:02} {:02}:{:02}".format(it[2], it[1], it[0] % 100, it[4], it[5])
+        return self._lcd
+
+    # Sekunden seit Epoche (Ortszeit)
+    def secs(self):
+        it = self.now()
+        if self._secs is None:
+            self._secs = time.mktime((it[0], it[1], it[2], it[4], it[5], it[6], 0, 0))
+        return self._secs
+
+clock = None
+
 #-------------------------------------------------------------------------------
 # Meldungsspeicher fuellen
 
-def msg(msg_str, timeflag):
+def msg(msg_str, timeflag, ev = 0, val = None):
 
     # Im Gegensatz zum Fehlerspeicher gibt es hier keine kurze (20 Zeichen), sondern nur die Langversion (45 Zeichen),
     # da der Meldungspeicher nicht ueber LCD sondern nur ueber Web (und bei Bedarf ueber Terminal zu Debugzwecken) angezeigt werden soll.
@@ -231,8 +446,7 @@ def msg(msg_str, timeflag):
 
     msg_str = msg_str + "                                                  "
     if timeflag == 1:
-        it = rtc.datetime()
-        msgtime    ="{:02}.{:02}.{:04} {:02}:{:02}:{:02} ".format(it[2], it[1], it[0], it[4], it[5], it[6])
+        msgtime    = clock.long()
         # Log auf maximal 45 Zeichen kuerzen, Datum-String hat 20 Zeichen, bleiben 25 Zeichen Text.
         msg_txt.insert(0,msgtime + msg_str[:30])
     if timeflag == 0:
@@ -240,6 +454,14 @@ def msg(msg_str, timeflag):
 
     msg_txt.pop()
 
+    # Stellaktionen zusaetzlich ins Ereignis-Log, als Wert die Innentemperatur
+    if ev and evlog is not None:
+        evlog.add(ev, temp_innen if val is None else val)
+
+    # Meldungen begleiten jede Stellaktion, damit aendert sich auch der Status
+    ver[VER_LOG] += 1
+    ver[VER_ST] += 1
+
 #-------------------------------------------------------------------------------
 # Errorhandler, Fehlerspeicher fuellen
 
@@ -250,9 +472,8 @@ def err_hndl(err):
     # Ins Fehler-Log (Liste err_txt mit drei Eintraegen) kommt die kurze Zeit (errlcdtime), damit es auch ueber LCD anzeigbar bleibt.
     # Fuer die print-Ausgaben ins Terminal (nur zu Debug-Zwecken) kommt der lange Zeitstring und es wird laenger formuliert mit Praefix "FEHLER".
 
-    it = rtc.datetime()
-    errtime    ="{:02}.{:02}.{:04} {:02}:{:02}:{:02} ".format(it[2], it[1], it[0], it[4], it[5], it[6])
-    errlcdtime ="E{:02}{:02}{:02}{:02} ".format(it[2], it[1], it[4], it[5])
+    errtime    = clock.long()
+    errlcdtime = clock.short()
 
     if  err == 1:
         led_r.value(0)
@@ -260,18 +481,21 @@ def err_hndl(err):
         # fuer LCD max 20 Zeichen inklusive Datum |1234567890| Es bleiben 10 Zeichen Text.
         err_txt.insert(0, errlcdtime +            "I2C-Bus   ")
         err_txt.pop()
+        if evlog is not None: evlog.add(EV_ERR + err, temp_innen)
     elif err == 2:
         led_r.value(0)      
         print("FEHLER: " + errtime + "OneWire-Bus/DS18B20")
         # fuer LCD max 20 Zeichen inklusive Datum |1234567890| Es bleiben 10 Zeichen Text.
         err_txt.insert(0, errlcdtime +            "1W/DS18B20")
         err_txt.pop()
+        if evlog is not None: evlog.add(EV_ERR + err, temp_innen)
     elif err == 3:
         led_y.value(0)
         print("WARNUNG: " + errtime + "Keine Verbindung zum Web")
         # fuer LCD max 20 Zeichen inklusive Datum |1234567890| Es bleiben 10 Zeichen Text.
         err_txt.insert(0, errlcdtime +            "Offline   ")
         err_txt.pop()
+        if evlog is not None: evlog.add(EV_ERR + err, temp_innen)
     elif err == 4:
       if err_ugrad == False:
         led_y.value(0)
@@ -279,6 +503,7 @@ def err_hndl(err):
         # fuer LCD max 20 Zeichen inklusive Datum |1234567890| Es bleiben 10 Zeichen Text.
         err_txt.insert(0, errlcdtime +            "< " + str(ex_unten) + " Grad  ")
         err_txt.pop()
+        if evlog is not None: evlog.add(EV_ERR + err, temp_innen)
         err_ugrad = True
     elif err == 5:
       if err_ograd == False:
@@ -287,6 +512,7 @@ def err_hndl(err):
         # fuer LCD max 20 Zeichen inklusive Datum |1234567890| Es bleiben 10 Zeichen Text.
         err_txt.insert(0, errlcdtime +            "> " + str(ex_oben) + " Grad ")
         err_txt.pop()
+        if evlog is not None: evlog.add(EV_ERR + err, temp_innen)
         err_ograd = True
     elif  err == 6:
         led_r.value(0)
@@ -294,9 +520,12 @@ def err_hndl(err):
         # fuer LCD max 20 Zeichen inklusive Datum |1234567890| Es bleiben 10 Zeichen Text.
         err_txt.insert(0, errlcdtime +            "MEM-Error ")
         err_txt.pop()
+        if evlog is not None: evlog.add(EV_ERR + err, temp_innen)
     else :
         print("FEHLER: Unbekannter Fehler.")
 
+    ver[VER_LOG] += 1
+
     if temp_innen > ex_unten : err_ugrad = False
     if temp_innen < ex_oben  : err_ograd = False
 
@@ -319,20 +548,125 @@ def showlogs():
 #-------------------------------------------------------------------------------
 # Temperaturen der DS18B20-Sensoren abfragen
 
+# Die Wandlung laeuft asynchron im Sensor-Job (job_sense), der die Messwerte
+# aller ROMs mit Zeitstempel in den Puffer tsamples schreibt. Steuerung und Webserver
+# lesen nur noch aus dem Puffer, das blockierende Warten auf die Wandlung entfaellt.
+
+# Messwert-Puffer, je ROM [Temperatur (unkorrigiert), Zeitstempel ticks_ms]
+tsamples = []
+
+# Wandlungszeit je nach Aufloesung (750 ms bei 12 Bit, halbiert je Bit weniger)
+def ds_conv_ms():
+    return 750 >> (12 - SENS_RES)
+
+# Aufloesung in das Konfigurationsregister aller Sensoren schreiben (TH/TL bleiben erhalten)
+def ds_resolution(res):
+    for rom in roms:
+        try:
+            sp = ds.read_scratch(rom)
+            ds.write_scratch(rom, bytes([sp[2], sp[3], ((res - 9) << 5) | 0x1F]))
+        except Exception as e:
+            print(e)
+            err_hndl(2)
+
+# Wandlung abgeschlossen, alle ROMs auslesen und in den Puffer schreiben
+def ds_publish():
+    now = time.ticks_ms()
+    for i in range(len(roms)):
+        try:
+            tsamples[i][0] = ds.read_temp(roms[i])
+            tsamples[i][1] = now
+        except Exception as e:
+            # CRC-Fehler o.ae., letzter gueltiger Wert bleibt im Puffer
+            print(e)
+            err_hndl(2)
+    read_temp(False)
+    t = clock.secs()
+    for h in HIST.values():
+        h.add(t, temp_innen, temp_aussen)
+
+# Einmalige Messung mit Warten auf die Wandlung (nur beim Start)
+def ds_sample():
+    ds.convert_temp()
+    time.sleep_ms(ds_conv_ms())
+    ds_publish()
+
+# Aktuelle Werte aus dem Puffer uebernehmen
 def read_temp(pr = True):
 
     global temp_innen, temp_aussen
 
-    tc = 0
-    ds.convert_temp()
-    time.sleep_ms(750)
-    for rom in roms:
-        tc += 1
-        if(tc == 1): temp_innen = round(ds.read_temp(rom),1) + tcorr_in
-        if(tc == 2): temp_aussen = round(ds.read_temp(rom),1) + tcorr_out
+    ti = temp_innen
+    ta = temp_aussen
+    if len(tsamples) > 0: temp_innen = round(tsamples[0][0] + tcorr_in, 1)
+    if len(tsamples) > 1: temp_aussen = round(tsamples[1][0] + tcorr_out, 1)
+    if ti != temp_innen or ta != temp_aussen: ver[VER_ST] += 1
     if pr: print("Innen-Temp: {}".format(temp_innen))
     if pr: print("Außen-Temp: {}".format(temp_aussen))
 
+#-------------------------------------------------------------------------------
+# Temperaturverlauf
+
+# Ring fester Groesse je Aufloesung, ein array('h') mit je Bucket sechs Werten in
+# Zehntel Grad: innen min/max/mittel, aussen min/max/mittel. Jede Messung wird
+# sofort in den laufenden Bucket eingerechnet, es entstehen keine Objekte je
+# Messwert. Buckets ohne Messung enthalten HIST_NONE. Der Index ergibt sich aus
+# der Zeit (Sekunden // Bucketlaenge), damit bleiben Luecken erhalten.
+
+HIST_NONE        = const(-32768)
+
+class History:
+
+    def __init__(self, step, n):
+        self.step = step              # Bucketlaenge in s
+        self.n = n                    # Anzahl Buckets
+        self.buf = array("h", (HIST_NONE for _ in range(n * 6)))
+        # dieselben Werte als Bytes (ohne Kopie), zum Senden in /api/hist?fmt=bin
+        self.raw = memoryview(uctypes.bytearray_at(uctypes.addressof(self.buf), n * 12))
+        self.cur = None               # laufender Bucket (Sekunden // step)
+        self.acc = [0, 0, 0, 0, 0, 0] # innen min/max/Summe, aussen min/max/Summe
+        self.cnt = 0
+
+    def add(self, t, ti, ta):
+        b = t // self.step
+        vi = int(round(ti * 10))
+        va = int(round(ta * 10))
+        acc = self.acc
+        if self.cur is None or b > self.cur:
+            # Luecke seit dem letzten Bucket leeren, hoechstens einmal rundum
+            if self.cur is not None:
+                for k in range(self.cur + 1, min(b, self.cur + self.n + 1)):
+                    o = (k % self.n) * 6
+                    for j in range(6): self.buf[o + j] = HIST_NONE
+            self.cur = b
+            acc[0] = acc[1] = vi
+            acc[3] = acc[4] = va
+            acc[2] = acc[5] = 0
+            self.cnt = 0
+        # Uhr zurueckgestellt: weiter in den laufenden Bucket
+        if vi < acc[0]: acc[0] = vi
+        if vi > acc[1]: acc[1] = vi
+        if va < acc[3]: acc[3] = va
+        if va > acc[4]: acc[4] = va
+        acc[2] += vi
+        acc[5] += va
+        self.cnt += 1
+        o = (self.cur % self.n) * 6
+        buf = self.buf
+        buf[o] = acc[0]
+        buf[o + 1] = acc[1]
+        buf[o + 2] = acc[2] // self.cnt
+        buf[o + 3] = acc[3]
+        buf[o + 4] = acc[4]
+        buf[o + 5] = acc[5] // self.cnt
+
+    # Beginn (s) des aeltesten der letzten num Buckets und dessen Ring-Position
+    def start(self, num):
+        b = self.cur - num + 1
+        return b * self.step, b % self.n
+
+HIST = {1: History(60, 1440), 15: History(900, 672)}    # 24 h in Minuten, 7 Tage in Viertelstunden
+
 #-------------------------------------------------------------------------------
 # Min/Max-Werte festhalten und Ueberschreitung Grenzwerte abfragen
 
@@ -340,9 +674,14 @@ def ex_vals():
 
     global temp_innen, ex_unten, ex_oben, temp_max_innen, temp_min_innen, temp_ok
 
-    if temp_innen < temp_min_innen : temp_min_innen = temp_innen
-    if temp_innen > temp_max_innen : temp_max_innen = temp_innen
+    if temp_innen < temp_min_innen :
+        temp_min_innen = temp_innen
+        ver[VER_ST] += 1
+    if temp_innen > temp_max_innen :
+        temp_max_innen = temp_innen
+        ver[VER_ST] += 1
 
+    ok = temp_ok
     temp_ok = True
 
     if temp_innen < ex_unten :
@@ -355,6 +694,8 @@ def ex_vals():
         print("Innentemperatur groesser {} Grad.".format(ex_oben))
         err_hndl(5)
 
+    if ok != temp_ok: ver[VER_ST] += 1
+
 #-------------------------------------------------------------------------------
 # Fenstersteuerung
 
@@ -366,293 +707,651 @@ def ex_vals():
 # rel04.value()  | 1/aus = nach oben | 0/ein = nach unten | 1/aus = Ruhestellung |
 #                |-------------------|--------------------|----------------------|
 
-def gh_win():
-
-  global wins_open, t_wcut_close, tsave, t_tsave, wdtime
-  global temp_innen, temp_aussen
-  global t_win_f_open, t_win_f_close
-  global t_win_s_open, t_win_s_close
-  global t_win_h_open, t_win_h_close
-  global ct_hour, ct_min, it
-
-  # Pruefe, ob etwa Abendzeit zum Fensterschliessen erreicht
-  if it[4] == ct_hour and it[5] >= ct_min : wdtime = True
-  if it[4] == 23 : wdtime = False # Hebe Schliessen um 23Uhr auf
-  if wdtime :
-      if GDEBUG : print("Abendzeit, Fenster bleiben geschlossen.")
-
-  if wins_manu == False:
-
-    # Jahreszeitliche Abhaengigkeit
-    if year_time == 0:
-        t_win_open = t_win_f_open
-        t_win_close = t_win_f_close
-    elif year_time == 1:
-        t_win_open = t_win_s_open
-        t_win_close = t_win_s_close
-    elif year_time == 2:
-        t_win_open = t_win_h_open
-        t_win_close = t_win_h_close
-    elif year_time == 3:
-        t_win_open = t_win_h_open
-        t_win_close = t_win_h_close
-
-    # Fenster oeffnen
-
-    if temp_innen >= t_win_open and tsave == False and wdtime == False:
-        if wins_open == False:
-            print("Oeffne Fenster.")
-            msg("Oeffne Fenster", 1)
-            rel01.value(0)
-            rel02.value(1)
-            rel03.value(0)
-            rel04.value(1)
-
-            led_g.value(0)
-            time.sleep(mot_duration)
-            
-            rel01.value(1)
-            rel02.value(1)
-            rel03.value(1)
-            rel04.value(1)
-
-            led_g.value(1)
-
+# Fensterantrieb als Zustandsmaschine ueber rel01-rel04
+# Die Fahrt laeuft als eigener asynchroner Task, die Hauptschleife und der Webserver
+# arbeiten waehrend der Motorlaufzeit weiter. Eine Fahrt kann gestartet, abgebrochen
+# und umgekehrt werden, die Stellung wird aus der Fahrzeit geschaetzt.
+
+WD_DOWN          = const(-1)  # nach unten (schliessen)
+WD_STOP          = const(0)   # Ruhestellung
+WD_UP            = const(1)   # nach oben (oeffnen)
+
+WD_PAUSE_MS      = const(500) # Pause bei Richtungsumkehr (Motor zur Ruhe kommen lassen)
+
+class WinDrive:
+
+    def __init__(self, ra, rb, rc, rd, led):
+        self.rel = (ra, rb, rc, rd)
+        self.led = led
+        self.state = WD_STOP     # aktuelle Fahrtrichtung
+        self.pos = 0.0           # geschaetzte Stellung, 0.0 unten (zu) bis 1.0 oben (auf)
+        self.p0 = 0.0            # Stellung zu Fahrtbeginn
+        self.t0 = None           # Zeitpunkt Fahrtbeginn (ticks_ms), None solange nicht bestromt
+        self.task = None
+
+    def _relays(self, d):
+        # a-Relais ein = nach oben, b-Relais ein = nach unten (aktiv low)
+        va = 0 if d == WD_UP else 1
+        vb = 0 if d == WD_DOWN else 1
+        self.rel[0].value(va)
+        self.rel[1].value(vb)
+        self.rel[2].value(va)
+        self.rel[3].value(vb)
+        self.led.value(0 if d != WD_STOP else 1)
+        ver[VER_ST] += 1
+
+    def _stop(self):
+        self.pos = self.position()
+        self.state = WD_STOP
+        self.t0 = None
+        self._relays(WD_STOP)
+
+    async def _run(self, d, ms, pause):
+        if pause:
+            await asyncio.sleep_ms(WD_PAUSE_MS)
+        self.p0 = self.pos
+        self.t0 = time.ticks_ms()
+        self._relays(d)
+        await asyncio.sleep_ms(ms)
+        # regulaeres Fahrtende, bei Abbruch hat cancel() bereits angehalten
+        self.task = None
+        self._stop()
+
+    def position(self):
+        if self.t0 is None:
+            return self.pos
+        p = self.p0 + self.state * time.ticks_diff(time.ticks_ms(), self.t0) / (mot_duration * 1000)
+        return min(1.0, max(0.0, p))
+
+    def moving(self):
+        return self.state != WD_STOP
+
+    def start(self, d, full = False):
+        # full - volle Motorlaufzeit wie bei manueller Fahrt, sonst nur die Reststrecke
+        if d == self.state:
+            return
+        pause = self.state != WD_STOP
+        self.cancel()
+        if full:
+            rest = 1.0
+        elif d == WD_UP:
+            rest = 1.0 - self.pos
         else:
-            if GDEBUG: print("Fenster weiterhin offen.")
-        wins_open = True
-
-    # Fenster schliessen
-
-    if temp_innen <= t_win_close or temp_aussen <= t_wcut_close or wdtime :
-        if wins_open == True:
-
-            if temp_aussen <= t_wcut_close :
-
-                print("Schliesse Fenster auf Grund Aussentemperatur (Waermespeicher).")
-                msg("Schliesse Fenster (Waermespeicher)", 1)
-                # Waermespeicherfunktion
-                # nun muss das Oeffnen pausieren (tsave), bis Aussentemperatur wieder
-                # auf mehr als t_tsave (5) Grad steigt (siehe unten), damit die Fenster nicht gleich wieder aufgehen
-                tsave = True
-
-            elif wdtime :
-                
-                print("Schliesse Fenster auf Grund Abendzeit.")
-                msg("Schliesse Fenster (Abendzeit)", 1)
-                # auch hier soll nicht gleich wieder geoeffnet und Waerme gespeichert werden
-                # deshalb steht das Flag wdtime wie tsave mit in der Oeffnen-Abfrage oben
-                
-            else:
-                print("Schliesse Fenster.")
-                msg("Schliesse Fenster", 1)
-                
-            rel01.value(1)
-            rel02.value(0)
-            rel03.value(1)
-            rel04.value(0)
-            
-            led_g.value(0)           
-            time.sleep(mot_duration)
-            
-            rel01.value(1)
-            rel02.value(1)
-            rel03.value(1)
-            rel04.value(1)
-
-            led_g.value(1)           
+            rest = self.pos
+        ms = int(rest * mot_duration * 1000)
+        if ms <= 0:
+            return
+        self.state = d
+        self.task = asyncio.create_task(self._run(d, ms, pause))
 
-        else:
-            if GDEBUG: print("Fenster weiterhin geschlossen.")
-        wins_open = False
-        
-  # Waermespeicher-Flag loeschen, wenn Aussentemperatur t_tsave Grad hoeher als das Limit t_wcut_close ist 
-  if temp_aussen >= t_wcut_close + t_tsave :
-      tsave = False
-  if tsave :
-      if GDEBUG : print("Waermespeicher, Fenster bleiben geschlossen.")
+    def reverse(self):
+        if self.state != WD_STOP:
+            self.start(-self.state)
 
-#-------------------------------------------------------------------------------
-# Ventilator (Relais5)
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self._stop()
 
-def gh_vent():
+wdrive = WinDrive(rel01, rel02, rel03, rel04, led_g)
 
-    global tval
-    global vent_on
-    global temp_innen
-    global t_vc_on, t_vc_off
-    global t_vo_on, t_vo_off
-
-    if vent_manu == False:
+#-------------------------------------------------------------------------------
+# Regelung per Regeltabelle
 
-        # Bei geschlossenem Oberlicht (Tuer zu)
-        if tval:
-            if temp_innen >= t_vc_on  :
-                if vent_on == False:
-                    print("Schalte Ventilator ein. (Tür zu).")
-                    msg("Ventilator ein", 1)
-                else:
-                    if GDEBUG: print("Ventilator weiterhin an.")
-                vent_on = True
-                rel05.value(0)
-
-            if temp_innen <= t_vc_off :
-                if vent_on == True:
-                    print("Schalte Ventilator aus. (Tür zu).")
-                    msg("Ventilator aus", 1)
-                else:
-                    if GDEBUG: print("Ventilator weiterhin aus.")
-                vent_on = False
-                rel05.value(1)
-
-        # Bei offenem Oberlicht (Tuer auf)
+# Jeder Steller (Fenster, Ventilator, Heizung, ...) ist eine Zeile in RULES:
+#
+#   name    Kurzname
+#   state   globaler Zustand (True = ein/offen)
+#   manu    globales Flag Handbetrieb, dann wird der Steller nicht geregelt
+#   sense   globaler Messwert
+#   rising  True: ein bei Wert >= Ein-Grenze, aus bei <= Aus-Grenze (Fenster, Ventilator)
+#           False: ein bei Wert <= Ein-Grenze, aus bei >= Aus-Grenze (Heizung)
+#   sel     globaler Index fuer die Grenzen (year_time, tval) oder None
+#   on/off  Parameternamen der Ein-/Aus-Grenzen, je Index einer
+#   block   Bedingungen, die das Einschalten sperren
+#   force   Bedingungen, die ausschalten: (Bedingung, Ereignis, Meldung, zu setzendes Flag)
+#   out     Stellfunktion out(on), wird nur bei Zustandswechsel gerufen
+#   ev/txt  Ereignis-Codes und Meldungen fuer Ein und Aus
+#
+# Bedingungen sind Tupel: ("flag", name) - globales Flag gesetzt,
+# ("le", wert, grenze) bzw. ("ge", wert, grenze) - Vergleich zweier Globals.
+# Ein weiterer Steller (zweite Heizung, Sprueher) ist nur eine weitere Zeile.
+
+class Rule:
+
+    def __init__(self, name, state, manu, sense, rising, sel, on, off, block, force, out, ev, txt, pid = None):
+        self.name = name
+        self.state = state
+        self.manu = manu
+        self.sense = sense
+        self.rising = rising
+        self.sel = sel
+        self.on = on
+        self.off = off
+        self.block = block
+        self.force = force
+        self.out = out
+        self.ev = ev
+        self.txt = txt
+        self.pid = pid
+        self.stat_reset()
+
+    # Schaltspiele und Regelabweichung zur Mitte der Grenzen (kleinste, groesste, mittlerer
+    # Betrag), fuer den Vergleich beider Modi
+    def stat_reset(self):
+        self.t0 = time.ticks_ms()
+        self.switches = 0
+        self.e_min = 0.0
+        self.e_max = 0.0
+        self.e_abs = 0.0
+        self.e_n = 0
+
+    def stats(self):
+        h = time.ticks_diff(time.ticks_ms(), self.t0) / 3600000
+        return {"state": globals()[self.state], "switches": self.switches,
+                "per_h": round(self.switches / h, 2) if h > 0 else 0,
+                "e_min": round(self.e_min, 2), "e_max": round(self.e_max, 2),
+                "e_abs": round(self.e_abs / self.e_n, 2) if self.e_n else 0,
+                "duty": round(self.pid.u, 3) if self.pid and pid_on else None}
+
+    # aktuelle Ein-/Aus-Grenzen
+    def limits(self, g):
+        i = int(g[self.sel]) if self.sel else 0
+        return g[self.on[i]], g[self.off[i]]
+
+# Stetiger Modus: PID auf den Messwert, Sollwert ist die Mitte der Ein-/Aus-Grenzen.
+# Die Stellgroesse (Tastgrad 0..1) wird je PWM-Fenster (PWM_WINDOW_MS) in eine
+# Einschaltzeit umgesetzt, abwechselnd am Fensterende und am Fensteranfang, damit
+# die Einschaltzeiten zweier Fenster zusammenfallen. Kuerzer als PWM_MIN_ON_MS
+# bleibt aus, Pausen kuerzer als PWM_MIN_OFF_MS werden durchgeschaltet, so schaltet
+# das Relais hoechstens einmal je Fenster. Gegen Windup wird nur integriert, solange der
+# Ausgang nicht begrenzt ist oder die Abweichung aus der Begrenzung herausfuehrt.
+# Der D-Anteil wirkt auf den Messwert, damit Sollwertspruenge nicht durchschlagen.
+
+PID_KP           = 0.5       # Tastgrad je Kelvin Regelabweichung
+PID_TI           = 1800      # Nachstellzeit (s)
+PID_TD           = 60        # Vorhaltzeit (s)
+PWM_WINDOW_MS    = const(600000)    # hoechstens 6 Schaltspiele je Stunde
+PWM_MIN_ON_MS    = const(60000)
+PWM_MIN_OFF_MS   = const(60000)
+
+pid_on           = CTRL_PID
+
+class PidPwm:
+
+    # sign = 1: Stellgroesse hebt den Messwert (Heizung), -1: senkt ihn (Ventilator)
+    def __init__(self, sign, window = PWM_WINDOW_MS):
+        self.sign = sign
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.i = 0.0
+        self.u = 0.0
+        self.t_prev = None
+        self.ts = 0
+        self.w0 = None
+        self.on_ms = 0
+        self.late = False            # Einschaltzeit am Fensterende
+
+    # neuer Messwert, Rueckgabe: Relais ein?
+    def step(self, t, sp, now):
+        e = self.sign * (sp - t)
+        dt = time.ticks_diff(now, self.ts) / 1000 if self.t_prev is not None else 0
+        d = -self.sign * (t - self.t_prev) / dt if dt > 0 else 0
+        up = PID_KP * (e + PID_TD * d)
+        i = self.i + e * dt
+        u = up + PID_KP * i / PID_TI
+        if (u > 0 and u < 1) or (u >= 1 and e < 0) or (u <= 0 and e > 0):
+            self.i = i
+        u = up + PID_KP * self.i / PID_TI
+        self.u = min(max(u, 0.0), 1.0)
+        self.t_prev = t
+        self.ts = now
+
+        # neues PWM-Fenster, Einschaltzeit festlegen
+        if self.w0 is None or time.ticks_diff(now, self.w0) >= self.window:
+            self.w0 = now
+            self.late = not self.late
+            on = int(self.u * self.window)
+            if on < PWM_MIN_ON_MS: on = 0
+            elif self.window - on < PWM_MIN_OFF_MS: on = self.window
+            self.on_ms = on
+        el = time.ticks_diff(now, self.w0)
+        if self.late:
+            return el >= self.window - self.on_ms
+        return el < self.on_ms
+
+def cond(c, g):
+    if c[0] == "flag": return g[c[1]]
+    if c[0] == "le": return g[c[1]] <= g[c[2]]
+    return g[c[1]] >= g[c[2]]
+
+# Stellfunktionen, Relais sind low-aktiv
+def out_win(on):
+    wdrive.start(WD_UP if on else WD_DOWN)
+
+def out_relay(pin):
+    return lambda on: pin.value(0 if on else 1)
+
+RULES = (
+    # Fenster, Grenzen nach Jahreszeit (Winter wie Herbst), nicht bei Waermespeicher und Abendzeit
+    Rule("win", "wins_open", "wins_manu", "temp_innen", True, "year_time",
+         ("t_win_f_open", "t_win_s_open", "t_win_h_open", "t_win_h_open"),
+         ("t_win_f_close", "t_win_s_close", "t_win_h_close", "t_win_h_close"),
+         (("flag", "tsave"), ("flag", "wdtime")),
+         # Waermespeicherfunktion: nun muss das Oeffnen pausieren (tsave), bis die Aussentemperatur
+         # wieder auf mehr als t_tsave Grad ueber t_wcut_close steigt (gh_tsave), damit die Fenster
+         # nicht gleich wieder aufgehen. Zur Abendzeit ebenso, wdtime sperrt das Oeffnen.
+         ((("le", "temp_aussen", "t_wcut_close"), EV_WIN_CLOSE_TS, "Schliesse Fenster (Waermespeicher)", "tsave"),
+          (("flag", "wdtime"), EV_WIN_CLOSE_CT, "Schliesse Fenster (Abendzeit)", None)),
+         out_win, (EV_WIN_OPEN, EV_WIN_CLOSE), ("Oeffne Fenster", "Schliesse Fenster")),
+    # Ventilator (Relais5), Grenzen nach Oberlicht (tval: 0 = Tuer auf, 1 = Tuer zu)
+    Rule("vent", "vent_on", "vent_manu", "temp_innen", True, "tval",
+         ("t_vo_on", "t_vc_on"), ("t_vo_off", "t_vc_off"), (), (),
+         out_relay(rel05), (EV_VENT_ON, EV_VENT_OFF), ("Ventilator ein", "Ventilator aus"), PidPwm(-1)),
+    # Heizung (Relais6)
+    Rule("heat", "heat_on", "heat_manu", "temp_innen", False, None,
+         ("t_heat_on",), ("t_heat_off",), (), (),
+         out_relay(rel06), (EV_HEAT_ON, EV_HEAT_OFF), ("Heizung ein", "Heizung aus"), PidPwm(1)),
+)
+
+RULE_WIN = RULES[0]
+
+# Oeffnen/Schliessen-Grenzen der aktuellen Jahreszeit
+def win_limits():
+    return RULE_WIN.limits(globals())
+
+# Pruefe, ob etwa Abendzeit zum Fensterschliessen erreicht
+def gh_wdtime():
+
+    global wdtime
+
+    if it[4] == ct_hour and it[5] >= ct_min : wdtime = True
+    if it[4] == 23 : wdtime = False # Hebe Schliessen um 23Uhr auf
+    if wdtime :
+        if GDEBUG : print("Abendzeit, Fenster bleiben geschlossen.")
+
+# Waermespeicher-Flag loeschen, wenn Aussentemperatur t_tsave Grad hoeher als das Limit t_wcut_close ist
+def gh_tsave():
+
+    global tsave
+
+    if temp_aussen >= t_wcut_close + t_tsave :
+        tsave = False
+    if tsave :
+        if GDEBUG : print("Waermespeicher, Fenster bleiben geschlossen.")
+
+# Alle Steller in einem Durchlauf
+def gh_rules():
+
+    g = globals()
+    now = time.ticks_ms()
+    for r in RULES:
+        if g[r.manu]:
+            if r.pid: r.pid.reset()
+            continue
+
+        t = g[r.sense]
+        t_on, t_off = r.limits(g)
+
+        e = t - (t_on + t_off) / 2
+        if r.e_n == 0 or e < r.e_min: r.e_min = e
+        if r.e_n == 0 or e > r.e_max: r.e_max = e
+        r.e_abs += abs(e)
+        r.e_n += 1
+
+        cause = None
+        for f in r.force:
+            if cond(f[0], g):
+                cause = f
+                break
+
+        # stetig: PWM-Ausgang statt Grenzen, Sperren und Zwang gelten weiter
+        pwm = pid_on and r.pid is not None
+        if pwm:
+            want_on = r.pid.step(t, (t_on + t_off) / 2, now)
+            want_off = not want_on
+        elif r.rising:
+            want_on = t >= t_on
+            want_off = t <= t_off
         else:
-            if temp_innen >= t_vo_on  :
-                if vent_on == False:
-                    print("Schalte Ventilator ein. (Tür auf).")
-                    msg("Ventilator ein", 1)
-                else:
-                    if GDEBUG: print("Ventilator weiterhin an.")
-                vent_on = True
-                rel05.value(0)
-
-            if temp_innen <= t_vo_off :
-                if vent_on == True:
-                    print("Schalte Ventilator aus. (Tür auf).")
-                    msg("Ventilator aus", 1)
-                else:
-                    if GDEBUG: print("Ventilator weiterhin aus.")
-                vent_on = False
-                rel05.value(1)
+            want_on = t <= t_on
+            want_off = t >= t_off
+
+        if want_on:
+            for c in r.block:
+                if cond(c, g):
+                    want_on = False
+                    break
+
+        if cause is not None:
+            # Flag (tsave) auch dann setzen, wenn gerade geoeffnet wuerde,
+            # statt erst zu oeffnen und gleich wieder zu schliessen
+            if cause[3] and (want_on or g[r.state]): g[cause[3]] = True
+            new = False
+        elif want_off:
+            new = False
+        elif want_on:
+            new = True
+        else:
+            continue
+
+        if new == g[r.state]: continue
+
+        g[r.state] = new
+        r.switches += 1
+        r.out(new)
+        # PWM-Takte nicht ins Log (EEPROM), nur der Zustand aendert sich
+        if pwm:
+            ver[VER_ST] += 1
+            if GDEBUG: print("{} PWM {} (Tastgrad {:.2f}).".format(r.name, int(new), r.pid.u))
+            continue
+        if new:
+            ev, txt = r.ev[0], r.txt[0]
+        elif cause is not None:
+            ev, txt = cause[1], cause[2]
+        else:
+            ev, txt = r.ev[1], r.txt[1]
+        print(txt + ".")
+        msg(txt, 1, ev)
 
 #-------------------------------------------------------------------------------
-# Heizung (Relais6)
+# Uhren aktualisieren, Jahreszeit-Ermittlung
 
-def gh_heat():
+# Beide Uhren (interne rtc, externe ertc DS1307) laufen auf gesetzlicher Ortszeit.
+# Der dabei eingestellte UTC-Versatz steht mit im RAM der DS1307 (gepuffert), so
+# dass nach einem Neustart auch eine verpasste Umstellung nachgeholt wird.
+# Der Uhren-Job (job_clock) fragt den NTP-Server ueber einen nicht blockierenden
+# UDP-Socket ab. Die Adresse wird nur einmal beim Verbindungsaufbau im Netz-Job
+# aufgeloest (getaddrinfo blockiert bis zum DNS-Timeout) und danach behalten.
+# Vor dem Stellen misst er die Abweichung beider Uhren und daraus ihre
+# Gangabweichung (ppm). Der naechste Abgleich wird so gelegt, dass die
+# schlechtere Uhr bis dahin hoechstens CLK_MAX_ERR s abweicht. Gemessen wird in ms
+# gegen die NTP-Zeit mit Bruchteil, die Uhren selbst zeigen nur ganze Sekunden
+# (Ablesefehler bis 1 s). Der Abstand wird verdoppelt, hoechstens bis zu dem, den
+# die zuletzt gemessene Gangabweichung erlaubt; gemessen wird sie erst, wenn die
+# Abweichung die Aufloesung uebersteigt oder nach 6 h. Die Umstellung
+# Winterzeit (MEZ)/Sommerzeit (MESZ) erfolgt nach EU-Regel, auch ohne Netz.
+
+NTP_HOST         = "pool.ntp.org"
+NTP_FALLBACK     = ("192.53.103.108", 123)   # ptbtime1.ptb.de, solange die Namensaufloesung fehlt
+NTP_TIMEOUT_MS   = const(3000)
+NTP_POLL_MS      = const(50)
+# Sekunden 1900 (NTP) bis zur Epoche der Firmware (1970 oder 2000)
+NTP_DELTA        = 2208988800 if time.gmtime(0)[0] == 1970 else 3155673600
+CLK_MAX_ERR      = 2               # zulaessige Abweichung bis zum Abgleich in s
+CLK_SYNC_MIN     = 3600            # Abgleich hoechstens stuendlich
+CLK_SYNC_MAX     = 86400           # und mindestens taeglich
+CLK_RES_MS       = 1000            # Aufloesung der Abweichung (Uhren zaehlen ganze Sekunden)
+CLK_PPM_SPAN     = 21600           # Gangabweichung unterhalb der Aufloesung erst ab 6 h Abstand
+CLK_RETRY_MIN    = 60              # nach Fehlschlag, dann verdoppelt
+CLK_RAM_OFF      = const(0)        # UTC-Versatz im DS1307-RAM: Kennung, Stunden
+CLK_RAM_MAGIC    = const(0xC7)
+
+clk_off          = 3600            # aktuell an den Uhren eingestellter UTC-Versatz
+clk_sock         = None
+clk_addr         = None
+clk_t_send       = 0
+clk_next         = 0               # ticks_ms des naechsten Abgleichs
+clk_retry        = CLK_RETRY_MIN
+clk_last         = 0               # NTP-Zeit (UTC) des letzten Abgleichs, 0 = noch keiner
+clk_stat         = {"syncs": 0, "fails": 0, "drift_rtc": 0, "drift_ertc": 0,
+                    "ppm_rtc": 0.0, "ppm_ertc": 0.0, "interval": 0, "dst": False}
+
+# Umstellung am letzten Sonntag im Maerz bzw. Oktober um 01:00 UTC
+def eu_switch(y, m):
+    wd = time.localtime(time.mktime((y, m, 31, 1, 0, 0, 0, 0)))[6]  # 0 = Montag
+    return time.mktime((y, m, 31 - (wd + 1) % 7, 1, 0, 0, 0, 0))
+
+def utc_offset(utc):
+    y = time.localtime(utc)[0]
+    if eu_switch(y, 3) <= utc < eu_switch(y, 10):
+        return 7200
+    return 3600
+
+# Uhrzeit als Sekunden lesen bzw. beide Uhren stellen
+#datetime-Format    localtime-Format
+#dt Jahr         0  lt Jahr
+#dt Monat        1  lt Monat
+#dt Tag          2  lt Tag
+#dt Wochentag    3  lt Stunde
+#dt Stunde       4  lt Minute
+#dt Minute       5  lt Sekunde
+#dt Sekunde      6  lt Wochentag
+#dt Millisekunde 7  lt Millisekunde
+
+def dt_secs(dt):
+    return time.mktime((dt[0], dt[1], dt[2], dt[4], dt[5], dt[6], 0, 0))
+
+def clk_set(secs, off):
+    lt1 = time.localtime(secs)
+    now = (lt1[0], lt1[1], lt1[2], lt1[6], lt1[3], lt1[4], lt1[5], 0)
+    ertc.datetime(now)
+    ertc.memory(CLK_RAM_OFF, bytes((CLK_RAM_MAGIC, off // 3600)))
+    rtc.datetime(now)
+    clock.invalidate()
+
+# Jahreszeit aus dem Monat
+def set_year_time(pr = False):
+
+    global year_time
+
+    mon = int(clock.now()[1])
+    if mon >= 3 and mon <= 5 :
+        year_time = 0
+        if pr: print("[CLK 08] Jahreszeit Frühling (3-5) ermittelt.")
+    if mon >= 6 and mon <= 8 :
+        year_time = 1
+        if pr: print("[CLK 08] Jahreszeit Sommer (6-8) ermittelt.")
+    if mon >= 9 and mon <= 11 :
+        year_time = 2
+        if pr: print("[CLK 08] Jahreszeit Herbst (9-11) ermittelt.")
+    if mon == 12 or mon <= 2 :
+        year_time = 3
+        if pr: print("[CLK 08] Jahreszeit Winter (12-2) ermittelt.")
 
-    global heat_on
-    global temp_innen
-    global t_heat_on, t_heat_off
+# Beim Start Basiszeit von externer RTC holen, NTP folgt im Uhren-Job
+def act_clocks():
 
-    if heat_manu == False:
+    global clk_off
 
-        if temp_innen <= t_heat_on  :
-            if heat_on == False:
-                print("Schalte Heizung ein.")
-                msg("Heizung ein", 1)
-            else:
-                if GDEBUG: print("Heizung weiterhin an.")
-            heat_on = True
-            rel06.value(0)
-
-        if temp_innen >= t_heat_off :
-            if heat_on == True:
-                print("Schalte Heizung aus.")
-                msg("Heizung aus", 1)
-            else:
-                if GDEBUG: print("Heizung weiterhin aus.")
-            heat_on = False
-            rel06.value(1)
+    rtc.datetime(ertc.datetime())
+    clock.invalidate()
 
-#-------------------------------------------------------------------------------
-# Uhren aktualisieren, Jahreszeit-Ermittlung
+    # Versatz, mit dem die DS1307 zuletzt gestellt wurde, ohne Eintrag nach Datum schaetzen
+    buf = ertc.memory(CLK_RAM_OFF, n = 2)
+    if buf[0] == CLK_RAM_MAGIC and buf[1] in (1, 2):
+        clk_off = buf[1] * 3600
+    else:
+        clk_off = utc_offset(time.time() - 3600)
+        print("[CLK 07] Kein UTC-Versatz in der Echtzeituhr, {} h angenommen.".format(clk_off // 3600))
+    clk_stat["dst"] = clk_off == 7200
+    set_year_time(True)
+
+# NTP-Antwort auswerten, Abweichung messen und Uhren stellen
+def clk_sync(data):
+
+    global clk_off, clk_last, clk_next, clk_retry
+
+    secs, frac = struct.unpack_from("!II", data, 40)
+    utc = secs - NTP_DELTA
+    ms = ((frac >> 22) * 1000) >> 10        # Bruchteil in ms, ohne grosse Zahlen
+    off = utc_offset(utc)
+    loc = utc + off + (1 if ms >= 500 else 0)
+
+    # Abweichung beider Uhren in ms (positiv = Uhr geht vor), bei Zeitumstellung ohne
+    # den Sprung. Eine abgelesene Sekunde steht im Mittel fuer ihre Mitte (+500 ms).
+    d_rtc = (time.time() - clk_off - utc) * 1000 + 500 - ms
+    d_ertc = (dt_secs(ertc.datetime()) - clk_off - utc) * 1000 + 500 - ms
+    clk_set(loc, off)
+
+    # Gangabweichung erst ab dem zweiten Abgleich, Zeitspanne seitdem. Nur wenn die
+    # Abweichung die Aufloesung uebersteigt oder die Spanne lang genug ist, sonst
+    # bleibt die zuletzt gemessene.
+    if clk_last:
+        span = utc - clk_last
+        if span >= 600 and (max(abs(d_rtc), abs(d_ertc)) > CLK_RES_MS or span >= CLK_PPM_SPAN):
+            clk_stat["ppm_rtc"] = round(d_rtc * 1000 / span, 1)
+            clk_stat["ppm_ertc"] = round(d_ertc * 1000 / span, 1)
+
+    # Abstand verdoppeln, aber nicht weiter als die bekannte Gangabweichung erlaubt
+    iv = clk_stat["interval"] * 2 if clk_stat["interval"] else CLK_SYNC_MIN
+    worst = max(abs(clk_stat["ppm_rtc"]), abs(clk_stat["ppm_ertc"]))
+    if worst > 0:
+        iv = min(iv, int(CLK_MAX_ERR * 1000000 / worst))
+    iv = min(max(iv, CLK_SYNC_MIN), CLK_SYNC_MAX)
+
+    clk_stat["syncs"] += 1
+    clk_stat["drift_rtc"] = round(d_rtc / 1000, 1)
+    clk_stat["drift_ertc"] = round(d_ertc / 1000, 1)
+    clk_stat["interval"] = iv
+    clk_stat["dst"] = off == 7200
+    clk_off = off
+    clk_last = utc
+    clk_retry = CLK_RETRY_MIN
+    clk_next = time.ticks_add(time.ticks_ms(), iv * 1000)
+    print("Uhren gestellt, Abweichung rtc {} ms, ertc {} ms, naechster Abgleich in {} min.".format(d_rtc, d_ertc, iv // 60))
+
+def clk_fail():
+
+    global clk_next, clk_retry
+
+    clk_stat["fails"] += 1
+    clk_next = time.ticks_add(time.ticks_ms(), clk_retry * 1000)
+    clk_retry = min(clk_retry * 2, CLK_SYNC_MIN)
+    print("[CLK xx] Fehler beim Zeit holen ueber NTP-Server.")
+
+# NTP-Server einmal aufloesen (aus net_up), bei Fehlschlag gilt NTP_FALLBACK
+def ntp_resolve():
+
+    global clk_addr
+
+    if clk_addr is not None: return
+    try:
+        clk_addr = socket.getaddrinfo(NTP_HOST, 123)[0][-1]
+    except OSError as e:
+        print("[CLK xx] {} nicht aufgeloest ({}).".format(NTP_HOST, e))
+
+def clk_close():
+
+    global clk_sock
+
+    try:
+        clk_sock.close()
+    except:
+        pass
+    clk_sock = None
 
-def act_clocks():
+def job_clock():
 
-    global webcon, year_time
+    global clk_off, clk_sock, clk_t_send
 
-    if webcon:
-        # Wenn WLAN und folgend WWW praesent, dann interne und externe
-        # Echtzeituhr nach Internetzeit per NTP-Server stellen
+    # Antwort abwarten, dabei andere Jobs laufen lassen
+    if clk_sock is not None:
         try:
-            ntptime.settime()
-        except:
-            print("[CLK xx] Fehler beim Zeit holen ueber NTP-Server, neuer Versuch (2)...")
-            time.sleep(1)
-            try:
-                ntptime.settime()
-            except:
-                print("[CLK xx] Fehler beim Zeit holen ueber NTP-Server, neuer Versuch (3)...")
-                time.sleep(1)
-                try:
-                    ntptime.settime()
-                except:
-                    print("[CLK xx] Fehler beim Zeit holen ueber NTP-Server, neuer Versuch (4)...")
-                    time.sleep(1)
-                    try:
-                        ntptime.settime()
-                    except:
-                        print("[CLK xx] Fehler beim Zeit holen ueber NTP-Server (outtimed)...")
-
-        UTC_OFFSET = +1 * 60 * 60 # Zeitzone fuer Deutschland (Winterzeit/Normalzeit)
-        lt1 = time.localtime(time.time() + UTC_OFFSET)
-        #datetime-Format    localtime-Format
-        #dt Jahr         0  lt Jahr
-        #dt Monat        1  lt Monat
-        #dt Tag          2  lt Tag
-        #dt Wochentag    3  lt Stunde
-        #dt Stunde       4  lt Minute
-        #dt Minute       5  lt Sekunde
-        #dt Sekunde      6  lt Wochentag
-        #dt Millisekunde 7  lt Millisekunde
-        dt1 = [0, 0, 0, 0, 0, 0, 0, 0]
-        dt1[0] = lt1[0]
-        dt1[1] = lt1[1]
-        dt1[2] = lt1[2]
-        dt1[3] = lt1[6]
-        dt1[4] = lt1[3]
-        dt1[5] = lt1[4]
-        dt1[6] = lt1[5]
-        dt1[7] = lt1[7]
-        now = (dt1[0], dt1[1], dt1[2], dt1[3], dt1[4], dt1[5], dt1[6], dt1[7])
-        ertc.datetime(now)
-        time.sleep(1)
-        rtc.datetime(now)
-        time.sleep(1)
+            data = clk_sock.recv(48)
+        except OSError:
+            if time.ticks_diff(time.ticks_ms(), clk_t_send) < NTP_TIMEOUT_MS:
+                return NTP_POLL_MS
+            clk_close()
+            clk_fail()
+            return None
+        clk_close()
+        if len(data) >= 48:
+            clk_sync(data)
+        else:
+            clk_fail()
+        set_year_time()
+        return None
+
+    # Sommer-/Winterzeit auch ohne Netz umstellen
+    loc = time.time()
+    off = utc_offset(loc - clk_off)
+    if off != clk_off:
+        clk_set(loc + off - clk_off, off)
+        clk_off = off
+        clk_stat["dst"] = off == 7200
+        msg("Sommerzeit" if off == 7200 else "Winterzeit", 1)
+    set_year_time()
+
+    # Abgleich faellig, Anfrage senden
+    if webcon and time.ticks_diff(time.ticks_ms(), clk_next) >= 0:
+        try:
+            # keine Namensaufloesung hier, die wuerde die ganze Schleife anhalten
+            clk_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            clk_sock.setblocking(False)
+            q = bytearray(48)
+            q[0] = 0x1B
+            clk_sock.sendto(q, clk_addr if clk_addr is not None else NTP_FALLBACK)
+            clk_t_send = time.ticks_ms()
+            return NTP_POLL_MS
+        except OSError:
+            if clk_sock is not None: clk_close()
+            clk_fail()
+    return None
 
-    else:
-        # Wenn kein Internet da, dann Basiszeit von externer RTC holen
-        now = ertc.datetime()
-        time.sleep(1)
-        rtc.datetime(now)
-        time.sleep(1)
+#-------------------------------------------------------------------------------
+# LCD-Bildspeicher
 
-    rtimelist=rtc.datetime()
-    mon = int(rtimelist[1])
-    if mon >= 3 and mon <= 5 :
-        year_time = 0
-        print("[CLK 08] Jahreszeit Frühling (3-5) ermittelt.")
-    if mon >= 6 and mon <= 8 :
-        year_time = 1
-        print("[CLK 08] Jahreszeit Sommer (6-8) ermittelt.")
-    if mon >= 9 and mon <= 11 :
-        year_time = 2
-        print("[CLK 08] Jahreszeit Herbst (9-11) ermittelt.")
-    if mon == 12 or mon <= 2 :
-        year_time = 3
-        print("[CLK 08] Jahreszeit Winter (12-2) ermittelt.")
+# Alle Ausgaben gehen zunaechst in einen 4x20-Bildspeicher im RAM. Erst lcd_flush()
+# vergleicht ihn mit dem zuletzt gesendeten Bild und uebertraegt nur die geaenderten
+# Zeichenfolgen, jede mit einem einzigen I2C-Transfer. Kein clear(), kein Flackern.
+
+LCD_ROWS         = const(4)
+LCD_COLS         = const(20)
+
+lcd              = None
+lcd_fb           = bytearray(b" " * (LCD_ROWS * LCD_COLS))  # aktueller Bildinhalt
+lcd_sent         = bytearray(b" " * (LCD_ROWS * LCD_COLS))  # zuletzt gesendeter Bildinhalt
 
 #-------------------------------------------------------------------------------
-# LCD-Ausgabe per x/y-Koordinate mit Loeschung Screen bei Bedarf
+# LCD-Ausgabe per x/y-Koordinate mit Loeschung Screen bei Bedarf (in den Bildspeicher)
 
 def printlcd(lx, ly, lstr, lc):
 
-    if lc == 1 : lcd.clear()
-    lcd.move_to(lx, ly)
-    lcd.putstr(lstr[:20])
-    sleep_ms(300)
+    if lc == 1 :
+        for i in range(LCD_ROWS * LCD_COLS): lcd_fb[i] = 32
+    o = ly * LCD_COLS
+    for c in lstr[:LCD_COLS - lx]:
+        c = ord(c)
+        lcd_fb[o + lx] = c if c < 128 else 63   # nur ASCII, sonst '?'
+        lx += 1
+
+#-------------------------------------------------------------------------------
+# Geaenderte Zeichenfolgen des Bildspeichers zum LCD senden
+
+def lcd_flush():
+
+    if lcd is None: return
+    for ly in range(LCD_ROWS):
+        o = ly * LCD_COLS
+        x = 0
+        while x < LCD_COLS:
+            if lcd_fb[o + x] == lcd_sent[o + x]:
+                x += 1
+                continue
+            x1 = x
+            # Folge bis zum naechsten unveraenderten Paar, einzelne gleiche Zeichen mitnehmen
+            while x < LCD_COLS and (lcd_fb[o + x] != lcd_sent[o + x] or
+                                    (x + 1 < LCD_COLS and lcd_fb[o + x + 1] != lcd_sent[o + x + 1])):
+                x += 1
+            run = lcd_fb[o + x1:o + x]
+            lcd.put_run(x1, ly, run)
+            lcd_sent[o + x1:o + x] = run
 
 #-------------------------------------------------------------------------------
 # Status per LCD, Standard-Bildschirm
 
 def showlcd_stats():
-    global tval, wins_open, vent_on, it
+    global tval, wins_open, vent_on
     global temp_innen, temp_aussen, heat_on
 
     ti = str(temp_innen)
     ta = str(temp_aussen)
     if len(ti) < 4: ti = " "+ti
-    if len(ta) < 4: ti = " "+ta
+    if len(ta) < 4: ta = " "+ta
 
     if wins_open:
         printlcd(0, 0, ti + " T-INN| FNST auf", 1)
@@ -673,7 +1372,8 @@ def showlcd_stats():
         else:
             printlcd(0, 2, "TUER offen| "    + "HEIZ aus", 0)
 
-    printlcd(0, 3, "GZeit {:02}.{:02}.{:02} {:02}:{:02}".format(it[2], it[1], str(it[0])[2:], it[4], it[5]), 0)
+    printlcd(0, 3, clock.lcd(), 0)
+    lcd_flush()
 
 #-------------------------------------------------------------------------------
 # Einstellwerte per LCD
@@ -712,6 +1412,7 @@ def showlcd_params():
     printlcd(6, 1, "|VA {:0}".format(t_vc_off), 0)
     printlcd(6, 2, "|HE {:0}".format(t_heat_on), 0)
     printlcd(6, 3, "|HA {:0}".format(t_heat_off), 0)
+    lcd_flush()
 
 #-------------------------------------------------------------------------------
 # Fehlerspeicher-Bildschirm per LCD
@@ -726,6 +1427,28 @@ def errlcd():
     if len(err_txt[0])<1 and len(err_txt[1])<1 and len(err_txt[2])<1:
         printlcd(0, 2, "       Keine.", 0)
 
+    lcd_flush()
+
+#-------------------------------------------------------------------------------
+# Laufzeitprofil per LCD (Last und die drei groessten Stufen mit Anteil und p99)
+
+def lcd_us(us):
+    if us < 1000: return "{}us".format(us)
+    if us < 100000: return "{:.1f}ms".format(us / 1000)
+    return "{}ms".format(us // 1000)
+
+def showlcd_perf():
+
+    printlcd(0, 0, "PROFIL   Last {:4.1f}%".format(prof.busy / 10), 1)
+    y = 1
+    for st in prof.top(3):
+        printlcd(0, y, "{:7s}{:4.1f}% {:>7s}".format(st.name[:7], st.share / 10, lcd_us(st.p99())), 0)
+        y += 1
+    if y == 1:
+        printlcd(0, 2, "  noch keine Werte", 0)
+
+    lcd_flush()
+
 #-------------------------------------------------------------------------------
 # DS1307-RTC
 
@@ -788,6 +1511,12 @@ class DS1307(object):
         self._halt = bool(val)
         self.i2c.writeto_mem(self.addr, DATETIME_REG, bytearray([reg]))
 
+    def memory(self, ofs, buf=None, n=0):
+        """Read n bytes from or write buf to the battery backed RAM (56 bytes)"""
+        if buf is None:
+            return self.i2c.readfrom_mem(self.addr, RAM_REG + ofs, n)
+        self.i2c.writeto_mem(self.addr, RAM_REG + ofs, buf)
+
     def square_wave(self, sqw=0, out=0):
         """Output square wave on pin SQ at 1Hz, 4.096kHz, 8.192kHz or 32.768kHz,
         or disable the oscillator and output logic level high/low."""
@@ -983,6 +1712,19 @@ class LcdApi:
         for char in string:
             self.putchar(char)
 
+    def put_run(self, cursor_x, cursor_y, data):
+        """Writes a run of character codes starting at the indicated
+        position. The cursor ends up behind the last character.
+        """
+        addr = cursor_x & 0x3f
+        if cursor_y & 1:
+            addr += 0x40    # Lines 1 & 3 add 0x40
+        if cursor_y & 2:    # Lines 2 & 3 add number of columns
+            addr += self.num_columns
+        self.hal_write_run(self.LCD_DDRAM | addr, data)
+        self.cursor_x = cursor_x + len(data)
+        self.cursor_y = cursor_y
+
     def custom_char(self, location, charmap):
         """Write a character to one of the 8 CGRAM locations, available
         as chr(0) through chr(7).
@@ -1025,6 +1767,16 @@ class LcdApi:
         """
         raise NotImplementedError
 
+    def hal_write_run(self, cmd, data):
+        """Write a command followed by a run of data bytes to the LCD.
+
+        This default implementation sends them one by one, a derived HAL
+        class may transfer them in one go.
+        """
+        self.hal_write_command(cmd)
+        for byte in data:
+            self.hal_write_data(byte)
+
     # This is a default implementation of hal_sleep_us which is suitable
     # for most micropython implementations. For platforms which don't
     # support `time.sleep_us()` they should provide their own implementation
@@ -1107,530 +1859,431 @@ class I2cLcd(LcdApi):
         self.i2c.writeto(self.i2c_addr, bytearray([byte | MASK_E]))
         self.i2c.writeto(self.i2c_addr, bytearray([byte]))
 
-#-------------------------------------------------------------------------------
-# EEPROM schreiben
-# Mit Werten vorbelegen (im Betrieb spaeter auskommentieren)
-
-def wepr():
-
-    global mot_duration
-    global t_win_f_open, t_win_f_close
-    global t_win_s_open, t_win_s_close
-    global t_win_h_open, t_win_h_close
-    global t_wcut_close
-    global t_heat_off, t_heat_on
-    global t_vc_off, t_vc_on
-    global t_vo_off, t_vo_on
-    global ct_hour, ct_min
-    global tcorr_in, tcorr_out
-
-    print("Schreibe EEPROM...")
-    led_y.value(0)
-    eeprom.write(1024,chr(int(mot_duration)))
-    time.sleep(1)
-    eeprom.write(1025,chr(int(t_win_f_open)))
-    time.sleep(1)
-    eeprom.write(1026,chr(int(t_win_f_close)))
-    time.sleep(1)
-    eeprom.write(1027,chr(int(t_win_s_open)))
-    time.sleep(1)
-    eeprom.write(1028,chr(int(t_win_s_close)))
-    time.sleep(1)
-    eeprom.write(1029,chr(int(t_win_h_open)))
-    time.sleep(1)
-    eeprom.write(1030,chr(int(t_win_h_close)))
-    time.sleep(1)
-    eeprom.write(1031,chr(int(t_wcut_close)))
-    time.sleep(1)
-    eeprom.write(1032,chr(int(t_heat_off)))
-    time.sleep(1)
-    eeprom.write(1033,chr(int(t_heat_on)))
-    time.sleep(1)
-    eeprom.write(1034,chr(int(t_vc_on)))
-    time.sleep(1)
-    eeprom.write(1035,chr(int(t_vc_off)))
-    time.sleep(1)
-    eeprom.write(1036,chr(int(t_vo_on)))
-    time.sleep(1)
-    eeprom.write(1037,chr(int(t_vo_off)))
-    time.sleep(1)
-    eeprom.write(1038,chr(int(ct_hour)))
-    time.sleep(1)
-    eeprom.write(1039,chr(int(ct_min)))
-    time.sleep(1)
-    s_tcorr_in = tcorr_in + 3.0
-    eeprom.write(1040,chr(int(s_tcorr_in*10)))
-    time.sleep(1)
-    s_tcorr_out = tcorr_out + 3.0
-    eeprom.write(1041,chr(int(s_tcorr_out*10)))
-    time.sleep(1)
-    led_y.value(1)
-    print("...fertig.")
+    def hal_write_run(self, cmd, data):
+        """Writes a command followed by a run of data bytes in a single
+        I2C transfer. All nibbles and enable strobes are packed into one
+        buffer, the PCF8574 latches them byte by byte. At 400 kHz each
+        character takes about 90 usec, well above the 37 usec the HD44780
+        needs to execute it.
+        """
+        bl = self.backlight << SHIFT_BACKLIGHT
+        buf = bytearray(4 * (len(data) + 1))
+        i = 0
+        rs = 0
+        for byte in (cmd,) + tuple(data):
+            hi = rs | bl | (((byte >> 4) & 0x0f) << SHIFT_DATA)
+            lo = rs | bl | ((byte & 0x0f) << SHIFT_DATA)
+            buf[i] = hi | MASK_E
+            buf[i + 1] = hi
+            buf[i + 2] = lo | MASK_E
+            buf[i + 3] = lo
+            i += 4
+            rs = MASK_RS
+        self.i2c.writeto(self.i2c_addr, buf)
 
 #-------------------------------------------------------------------------------
-# Webserver
+# Parameter-Datensatz im EEPROM
 
-# asynchroner Server
-async def serve_client(reader, writer):
-
-  global rel01, rel02, rel03, rel04, rel05, rel06
-  global tval, msg_txt
-  global heat_on, vent_on, wins_open
-  global wins_manu, vent_manu, heat_manu
-  global temp_min_innen
-  global temp_max_innen
-  global temp_innen
-  global msg_txt, err_txt
-
-  global psel
-
-  global mot_duration
-  global t_win_f_open
-  global t_win_f_close
-  global t_win_s_open
-  global t_win_s_close
-  global t_win_h_open
-  global t_win_h_close
-  global t_wcut_close
-  global t_heat_off
-  global t_heat_on
-  global t_vc_on
-  global t_vc_off
-  global t_vo_on
-  global t_vo_off
-  global ct_hour
-  global ct_min
-  global tcorr_in
-  global tcorr_out
-  
-  f_status       = "ZU"        #alternativ "AUF"
-  v_status       = "AUS"       #alternativ "EIN"
-  h_status       = "AUS"       #alternativ "EIN"
-  t_status       = "AUF"       #alternativ "ZU"
-
-  f_hoch         = "HOCH"
-  v_ein          = "EIN"
-  h_ein          = "EIN"
-
-  f_tief         = "TIEF"
-  v_aus          = "AUS"
-  h_aus          = "AUS"
-
-  f_aktiv        = "AKTIV"
-  v_aktiv        = "AKTIV"
-  h_aktiv        = "AKTIV"
-
-  f_red_inst     = "#504444"
-  f_green_inst   = "#445044"
-  f_blue_inst    = "#438596 style='border: 2px solid lightgrey;' "
-
-  red_normal     = "#504444"
-  green_normal   = "#445044"
-  blue_normal    = "#444450"
-
-  f_red_high     = "#997777 style='border: 2px solid lightgrey;' "
-  f_green_high   = "#779977 style='border: 2px solid lightgrey;' "
-  f_blue_high    = "#438596 style='border: 2px solid lightgrey;' "
-
-  v_red_inst     = "#504444"
-  v_green_inst   = "#445044"
-  v_blue_inst    = "#438596 style='border: 2px solid lightgrey;' "
-
-  v_red_high     = "#997777 style='border: 2px solid lightgrey;' "
-  v_green_high   = "#779977 style='border: 2px solid lightgrey;' "
-  v_blue_high    = "#438596 style='border: 2px solid lightgrey;' "
-
-  h_red_inst     = "#504444"
-  h_green_inst   = "#445044"
-  h_blue_inst    = "#438596 style='border: 2px solid lightgrey;' "
-
-  h_red_high     = "#997777 style='border: 2px solid lightgrey;' "
-  h_green_high   = "#779977 style='border: 2px solid lightgrey;' "
-  h_blue_high    = "#438596 style='border: 2px solid lightgrey;' "
+# Alle Parameter liegen als ein gepackter Datensatz im EEPROM:
+#
+#   Version (B) | Folgenummer (H) | Werte in der Reihenfolge von PARAMS | CRC16 (H)
+#
+# Ganzzahlige Parameter belegen ein Byte (B), Temperaturen und Korrekturen ein
+# vorzeichenbehaftetes Wort in Zehntel Grad (h). Der Datensatz wird reihum in einen
+# Ring von Slots geschrieben, gelesen wird der gueltige mit der hoechsten Folgenummer.
+# Bricht ein Schreibvorgang ab (Stromausfall), bleiben die anderen Slots unversehrt,
+# und jeder Slot wird nur bei jedem achten Speichern beschrieben (Verschleiss).
+# Ein Slot belegt zwei volle Seiten, geschrieben wird seitenweise.
 
-  try:
+EPR_LEGACY       = const(1024)   # alte Ablage, ein Byte je Parameter (1024-1041), nur noch lesen
+EPR_CFG          = const(1088)   # erster Slot des Parameter-Datensatzes
+EPR_CFG_SLOT     = const(64)     # Groesse eines Slots (2 Seiten a 32 Bytes)
+EPR_CFG_SLOTS    = const(8)      # Anzahl Slots im Ring (1088-1599)
 
-    # Webclient starten...
+CFG_VERSION      = const(1)
 
-    #print("----------- Webclient connected...")
-    request_line = await reader.readline()
-    if GDEBUG : print("Request:", request_line)
+CFG_QUIET_MS     = const(30000)  # Aenderungen erst nach dieser Ruhezeit ins EEPROM schreiben
 
-    # HTTP Request-Headers ueberspringen
+CFG_FMT = "<BH" + "".join(["B" if p[1] is int else "h" for p in PARAMS])
+CFG_LEN = struct.calcsize(CFG_FMT)
 
-    while await reader.readline() != b"\r\n":
-       pass
+#-------------------------------------------------------------------------------
+# CRC16-CCITT (Polynom 0x1021, Startwert 0xFFFF)
 
-    stateis = ""
-    request = str(request_line)
+def crc16(buf, n):
 
-    # Zufallszahl berechnen
+    crc = 0xFFFF
+    for i in range(n):
+        crc ^= buf[i] << 8
+        for k in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+    return crc
 
-    rand = randint(1, 100000)
+#-------------------------------------------------------------------------------
+# Parameter packen und entpacken
+
+def cfg_pack(seq):
+
+    g = globals()
+    vals = [CFG_VERSION, seq & 0xFFFF]
+    for p in PARAMS:
+        v = g[p[0]]
+        vals.append(int(v) if p[1] is int else int(round(v * 10)))
+    buf = bytearray(CFG_LEN + 2)
+    struct.pack_into(CFG_FMT, buf, 0, *vals)
+    struct.pack_into("<H", buf, CFG_LEN, crc16(buf, CFG_LEN))
+    return buf
+
+# Rueckgabe (Folgenummer, Werte-Dict) oder None bei falscher Version oder CRC
+def cfg_unpack(buf):
+
+    if buf[0] != CFG_VERSION:
+        return None
+    if struct.unpack_from("<H", buf, CFG_LEN)[0] != crc16(buf, CFG_LEN):
+        return None
+    vals = struct.unpack_from(CFG_FMT, buf, 0)
+    res = {}
+    for i in range(len(PARAMS)):
+        p = PARAMS[i]
+        res[p[0]] = vals[i + 2] if p[1] is int else vals[i + 2] / 10
+    return (vals[1], res)
+
+# Folgenummer a neuer als b (16 Bit mit Ueberlauf)
+def seq_newer(a, b):
+    d = (a - b) & 0xFFFF
+    return d > 0 and d < 0x8000
 
-    # Steuerung erkennen
+#-------------------------------------------------------------------------------
+# Parameter-Cache vor dem AT24C32N
 
-    refresh_all = request.find('/refresh/all')
-    minmax_erase = request.find('/minmax/erase')
-    msglog_erase = request.find('/msglog/erase')
-    errlog_erase = request.find('/errlog/erase')
+# Aenderungen an den Parametern (Web-App, /param/set) markieren den Cache nur als
+# geaendert. Geschrieben wird erst nach CFG_QUIET_MS ohne weitere Aenderung oder
+# sofort per commit (Write-Knopf), schnelle Klickfolgen ergeben so nur einen
+# Schreibvorgang. Ist der Datensatz unveraendert, wird gar nicht geschrieben, sonst
+# kommt er in den naechsten Slot des Rings, und davon nur die Seiten, die sich
+# vom bisherigen Inhalt dieses Slots unterscheiden.
 
-    ws_on = request.find('/wins/on')
-    ws_off = request.find('/wins/off')
-    ws_auto = request.find('/winsauto/on')
+class ParamCache:
 
-    vt_on = request.find('/vent/on')
-    vt_off = request.find('/vent/off')
-    vt_auto = request.find('/ventauto/on')
+    def __init__(self, epr, addr, ssize, slots):
+        self.epr = epr
+        self.addr = addr
+        self.ssize = ssize
+        self.slots = slots
+        self.raw = bytearray(ssize * slots)   # Abbild aller Slots im EEPROM
+        self.seq = 0                          # Folgenummer des aktuellen Datensatzes
+        self.slot = slots - 1                 # Slot des aktuellen Datensatzes
+        self.valid = False                    # aktueller Slot enthaelt gueltigen Datensatz
+        self.dirty = False
+        self.t_edit = 0
+        # Aenderungen, Schreibvorgaenge, eingesparte Schreibvorgaenge, geschriebene Seiten/Bytes
+        self.stat = {"edits": 0, "flushes": 0, "saved": 0, "pages": 0, "bytes": 0}
+
+    # Alle Slots mit einem Zugriff lesen, Rueckgabe Werte-Dict des neuesten gueltigen Datensatzes oder None
+    def load(self):
+        self.raw = bytearray(self.epr.read(self.addr, self.ssize * self.slots))
+        best = None
+        for slot in range(self.slots):
+            rec = cfg_unpack(memoryview(self.raw)[slot * self.ssize:])
+            if rec is not None and (best is None or seq_newer(rec[0], best[0])):
+                best = rec
+                self.slot = slot
+        if best is None:
+            return None
+        self.seq = best[0]
+        self.valid = True
+        return best[1]
+
+    # Parameter wurden geaendert
+    def touch(self):
+        if self.dirty:
+            self.stat["saved"] += 1
+        self.dirty = True
+        self.t_edit = time.ticks_ms()
+        self.stat["edits"] += 1
+
+    # Regelmaessig aufrufen, schreibt nach der Ruhezeit
+    def poll(self):
+        if self.dirty and time.ticks_diff(time.ticks_ms(), self.t_edit) >= CFG_QUIET_MS:
+            return self.flush()
+        return False
+
+    # Sofort schreiben, Rueckgabe True wenn geschrieben wurde
+    def flush(self):
+        self.dirty = False
+        seq = (self.seq + 1) & 0xFFFF
+        buf = cfg_pack(seq)
+        o = self.slot * self.ssize
+        if self.valid and self.raw[o + 3:o + CFG_LEN] == buf[3:CFG_LEN]:
+            self.stat["saved"] += 1
+            return False
+
+        slot = (self.slot + 1) % self.slots
+        o = slot * self.ssize
+        bpp = self.epr.bpp
+        for i in range(0, len(buf), bpp):
+            page = buf[i:i + bpp]
+            if self.raw[o + i:o + i + len(page)] != page:
+                self.epr.write(self.addr + o + i, page)
+                self.stat["pages"] += 1
+                self.stat["bytes"] += len(page)
+        if self.epr.read(self.addr + o, len(buf)) != buf:
+            # Slot bleibt ungueltig, beim naechsten Mal erneut versuchen
+            self.raw[o] = 0xFF
+            self.dirty = True
+            err_hndl(1)
+            return False
+        self.raw[o:o + len(buf)] = buf
+        self.seq = seq
+        self.slot = slot
+        self.valid = True
+        self.stat["flushes"] += 1
+        return True
 
-    ht_on = request.find('/heat/on')
-    ht_off = request.find('/heat/off')
-    ht_auto = request.find('/heatauto/on')
+#-------------------------------------------------------------------------------
+# EEPROM schreiben (sofort, ueber den Parameter-Cache)
 
-    # Parameter erkennen
+def wepr():
 
-    p_selfor = request.find('/param/selfor')
-    p_selback = request.find('/param/selback')
-    p_minus = request.find('/param/minus')
-    p_plus = request.find('/param/plus')
-    p_clear = request.find('/param/clear')
-    p_write = request.find('/param/write')
+    print("Schreibe EEPROM...")
+    led_y.value(0)
+    if pcache.flush():
+        print("...fertig (Slot {}, Nr. {}).".format(pcache.slot, pcache.seq))
+    else:
+        print("...nicht noetig oder fehlerhaft.")
+    led_y.value(1)
 
-    # auf Steuerung reagieren
+#-------------------------------------------------------------------------------
+# EEPROM lesen (alle Slots mit einem Zugriff, sonst alte Ablage)
+# apply = False ermittelt nur Folgenummer und Slot, die Parameter bleiben unveraendert
+
+def lepr(apply = True):
+
+    g = globals()
+    vals = pcache.load()
+    if vals is not None:
+        if not apply: return
+        g.update(vals)
+        print("[EPR 11] Parameter-Datensatz Nr. {} gelesen.".format(pcache.seq))
+        return
+
+    # Kein gueltiger Datensatz, alte Ablage (ein Byte je Parameter, Korrektur +3.0 mal 10)
+    if not apply: return
+    ere = eeprom.read(EPR_LEGACY, len(PARAMS))
+    if ere == b"\xff" * len(PARAMS):
+        print("[EPR 11] EEPROM leer, Vorgabewerte bleiben.")
+        return
+    for i in range(len(PARAMS)):
+        p = PARAMS[i]
+        if p[0] in ("tcorr_in", "tcorr_out"):
+            g[p[0]] = round(ere[i] / 10 - 3.0, 1)
+        else:
+            g[p[0]] = p[1](ere[i])
+    print("[EPR 11] Alte Parameter-Ablage gelesen.")
 
-    if refresh_all == 6:
-        print("Website neu laden")
-    if minmax_erase == 6:
-        print("Loesche Min/Max-Temperaturen")
-        temp_min_innen = temp_innen
-        temp_max_innen = temp_innen
-    if msglog_erase == 6:
-        print("Loesche Meldungs-Register")
-        msg_txt[0] = ""
-        msg_txt[1] = ""
-        msg_txt[2] = ""
-        msg_txt[3] = ""
-        msg_txt[4] = ""
-        msg_txt[5] = ""
-        msg_txt[6] = ""
-        msg_txt[7] = ""
-        msg_txt[8] = ""
-        msg_txt[9] = ""
-    if errlog_erase == 6:
-        print("Loesche Fehlerspeicher")
-        err_txt[0] = ""
-        err_txt[1] = ""
-        err_txt[2] = ""
-        led_r.value(1)
-        led_y.value(1)
+#-------------------------------------------------------------------------------
+# Relais-Zaehler im EEPROM
+
+# Je Relais Schaltvorgaenge (I), Einschaltdauer s (I) und Kurzschaltungen (H), davor
+# eine Folgenummer (H), dahinter CRC16. Zwei Slots zu 64 Bytes werden abwechselnd
+# beschrieben, gelesen wird der neueste gueltige. Gespeichert wird stuendlich,
+# wenn sich etwas geaendert hat, der letzte Wechsel bleibt nur im RAM.
+
+EPR_RELAY        = const(1920)
+EPR_RELAY_SLOT   = const(64)
+RELAY_FMT        = "<H" + "IIH" * 6
+RELAY_LEN        = struct.calcsize(RELAY_FMT)
+RELAY_SAVE_MS    = const(3600000)
+
+rel_seq          = 0
+rel_t_save       = 0
+
+def rel_load():
+
+    global rel_seq
+
+    best = None
+    for slot in range(2):
+        buf = eeprom.read(EPR_RELAY + slot * EPR_RELAY_SLOT, RELAY_LEN + 2)
+        if struct.unpack_from("<H", buf, RELAY_LEN)[0] != crc16(buf, RELAY_LEN):
+            continue
+        v = struct.unpack_from(RELAY_FMT, buf)
+        if best is None or seq_newer(v[0], best[0]):
+            best = v
+    if best is None:
+        return False
+    rel_seq = best[0]
+    for i in range(len(RELAYS)):
+        r = RELAYS[i]
+        r.switches = best[1 + i * 3]
+        r.on_ms = best[2 + i * 3] * 1000
+        r.short = best[3 + i * 3]
+    return True
+
+def rel_save():
+
+    global rel_seq, rel_dirty, rel_t_save
+
+    vals = []
+    for r in RELAYS:
+        vals.extend((r.switches, r.on_s(), min(r.short, 0xFFFF)))
+    rel_seq = (rel_seq + 1) & 0xFFFF
+    buf = bytearray(RELAY_LEN + 2)
+    struct.pack_into(RELAY_FMT, buf, 0, rel_seq, *vals)
+    struct.pack_into("<H", buf, RELAY_LEN, crc16(buf, RELAY_LEN))
+    eeprom.write(EPR_RELAY + (rel_seq & 1) * EPR_RELAY_SLOT, buf)
+    rel_dirty = False
+    rel_t_save = time.ticks_ms()
+
+# Regelmaessig aufrufen
+def rel_poll():
+    if rel_dirty and time.ticks_diff(time.ticks_ms(), rel_t_save) >= RELAY_SAVE_MS:
+        rel_save()
 
-    if ws_on == 6:
-        print("Fenster OEFFNEN")
-        # keine sonstige Logik abgefragt, bis an den oberen Endschalter fahren
-        # kein asynchrones sleep hier, fuer saubere Fahrt per mot_duration
-        rel01.value(0)
-        rel02.value(1)
-        rel03.value(0)
-        rel04.value(1)
-        
-        led_g.value(0)           
-        time.sleep(mot_duration)
-
-        rel01.value(1)
-        rel02.value(1)
-        rel03.value(1)
-        rel04.value(1)
-        
-        led_g.value(1)           
-
-        wins_open = True
-        wins_manu = True
-        f_aktiv = "AUS"
-        f_tief = "TIEF"
-        f_hoch = "FEST HOCH"
-        f_red_inst = f_red_high
-        f_green_inst = green_normal
-        f_blue_inst = blue_normal
-        msg("Fenster manuell oeffnen", 1)
-
-    if ws_off == 6:
-        print("Fenster SCHLIESSEN")
-        # keine sonstige Logik abgefragt, bis an den unteren Endschalter fahren
-        # kein asynchrones sleep hier, fuer saubere Fahrt per mot_duration
-        rel01.value(1)
-        rel02.value(0)
-        rel03.value(1)
-        rel04.value(0)
-        
-        led_g.value(0)           
-        time.sleep(mot_duration)
-
-        rel01.value(1)
-        rel02.value(1)
-        rel03.value(1)
-        rel04.value(1)
-
-        led_g.value(1)           
-
-        wins_open = False
-        wins_manu = True
-        f_aktiv = "AUS"
-        f_hoch = "HOCH"
-        f_tief = "FEST TIEF"
-        f_red_inst = red_normal
-        f_green_inst = f_green_high
-        f_blue_inst = blue_normal
-        msg("Fenster manuell schliessen", 1)
-
-    if ws_auto == 6:
-        print("Fensterautomatik EIN")
-        wins_manu = False
-        f_aktiv = "AKTIV"
-        f_tief = "TIEF"
-        f_hoch = "HOCH"
-        f_red_inst = red_normal
-        f_green_inst = green_normal
-        f_blue_inst = f_blue_high
-        msg("Fensterautomatik ein", 1)
-
-    if vt_on == 6:
-        print("Ventilator EIN")
-        rel05.value(0)
-        vent_on = True
-        vent_manu = True
-        v_aktiv = "AUS"
-        v_aus = "AUS"
-        v_ein = "FEST EIN"
-        v_red_inst = v_red_high
-        v_green_inst = green_normal
-        v_blue_inst = blue_normal
-        msg("Ventilator manuell ein", 1)
-
-    if vt_off == 6:
-        print("Ventilator AUS")
-        rel05.value(1)
-        vent_on = False
-        vent_manu = True
-        v_aktiv = "AUS"
-        v_ein = "EIN"
-        v_aus = "FEST AUS"
-        v_red_inst = red_normal
-        v_green_inst = v_green_high
-        v_blue_inst = blue_normal
-        msg("Ventilator manuell aus", 1)
-
-    if vt_auto == 6:
-        print("Ventilatorautomatik EIN")
-        vent_manu = False
-        v_aktiv = "AKTIV"
-        v_ein = "EIN"
-        v_aus = "AUS"
-        v_red_inst = red_normal
-        v_green_inst = green_normal
-        v_blue_inst = v_blue_high
-        msg("Ventilatorautomatik ein", 1)
-
-    if ht_on == 6:
-        print("Heizung EIN")
-        rel06.value(0)
-        heat_on = True
-        heat_manu = True
-        h_aktiv = "AUS"
-        h_aus = "AUS"
-        h_ein = "FEST EIN"
-        h_red_inst = h_red_high
-        h_green_inst = green_normal
-        h_blue_inst = blue_normal
-        msg("Heizung manuell ein", 1)
-
-    if ht_off == 6:
-        print("Heizung AUS")
-        rel06.value(1)
-        heat_on = False
-        heat_manu = True
-        h_aktiv = "AUS"
-        h_ein = "EIN"
-        h_aus = "FEST AUS"
-        h_red_inst = red_normal
-        h_green_inst = h_green_high
-        h_blue_inst = blue_normal
-        msg("Heizung manuell aus", 1)
-
-    if ht_auto == 6:
-        print("Heizungsautomatik EIN")
-        heat_manu = False
-        h_aktiv = "AKTIV"
-        h_ein = "EIN"
-        h_aus = "AUS"
-        h_red_inst = red_normal
-        h_green_inst = green_normal
-        h_blue_inst = h_blue_high
-        msg("Heizungsautomatik ein", 1)
-
-    if wins_open: f_status = "AUF"
-    else: f_status = "ZU"
-    if vent_on: v_status = "EIN"
-    else: v_status = "AUS"
-    if heat_on: h_status = "EIN"
-    else: h_status = "AUS"
-    if tval: t_status = "ZU"
-    else: t_status = "AUF"
-
-    if temp_ok: str_temp_ok = "OK"
-    else : str_temp_ok = "NICHT OK"
-
-    # auf Parameter reagieren
-
-    if p_selfor > -1:
-        psel = psel + 1
-        if psel > 18: psel = 0
-        print("Parameter ausgewaehlt (",psel,")...")
-
-    if p_selback > -1:
-        psel = psel - 1
-        if psel < 0: psel = 18
-        print("Parameter ausgewaehlt (",psel,")...")
-
-    #------
-
-    if p_minus > -1:
-        print("Parameter wird erniedrigt...")
-
-        if psel == 1:
-            mot_duration = mot_duration - 1
-            print("Stelle Motorzeit...")
-        if psel == 2:
-            t_win_f_open = t_win_f_open - 1
-            print("Stelle Fenster offen im Fruehling...")
-        if psel == 3:
-            t_win_f_close = t_win_f_close - 1
-            print("Stelle Fenster zu im Fruehling...")
-        if psel == 4:
-            t_win_s_open = t_win_s_open - 1
-            print("Stelle Fenster offen im Sommer...")
-        if psel == 5:
-            t_win_s_close = t_win_s_close - 1
-            print("Stelle Fenster zu im Sommer...")
-        if psel == 6:
-            t_win_h_open = t_win_h_open - 1
-            print("Stelle Fenster offen im Herbst...")
-        if psel == 7:
-            t_win_h_close = t_win_h_close - 1
-            print("Stelle Fenster zu im Herbst...")
-        if psel == 8:
-            t_wcut_close = t_wcut_close - 1
-            print("Stelle Schliessen auf Grund Aussentemp...")
-        if psel == 9:
-            t_heat_off = t_heat_off - 1
-            print("Stelle Heizung aus...")
-        if psel == 10:
-            t_heat_on = t_heat_on - 1
-            print("Stelle Heizung ein...")
-        if psel == 11:
-            t_vc_on = t_vc_on - 1
-            print("Stelle Venti ein bei Tuer zu...")
-        if psel == 12:
-            t_vc_off = t_vc_off - 1
-            print("Stelle Venti aus bei Tuer zu...")
-        if psel == 13:
-            t_vo_on = t_vo_on - 1
-            print("Stelle Venti ein bei Tuer offen...")
-        if psel == 14:
-            t_vo_off = t_vo_off - 1
-            print("Stelle Venti aus bei Tuer offen...")
-        if psel == 15:
-            ct_hour = ct_hour - 1
-            print("Stelle Stunde zu per Zeit...")
-        if psel == 16:
-            ct_min = ct_min - 1
-            print("Stelle Minute zu per Zeit...")
-        if psel == 17:
-            t_corr_in = t_corr_in - 0.1
-            print("Stelle Korrektur TFuehler innen...")
-        if psel == 18:
-            print("Stelle Korrektur TFuehler aussen...")
-            t_corr_out = t_corr_out - 0.1
-
-    #---
-
-    if p_plus > -1:
-        print("Parameter wird erhoeht...")
-
-        if psel == 1:
-            mot_duration = mot_duration + 1
-            print("Stelle Motorzeit...")
-        if psel == 2:
-            t_win_f_open = t_win_f_open + 1
-            print("Stelle Fenster offen im Fruehling...")
-        if psel == 3:
-            t_win_f_close = t_win_f_close + 1
-            print("Stelle Fenster zu im Fruehling...")
-        if psel == 4:
-            t_win_s_open = t_win_s_open + 1
-            print("Stelle Fenster offen im Sommer...")
-        if psel == 5:
-            t_win_s_close = t_win_s_close + 1
-            print("Stelle Fenster zu im Sommer...")
-        if psel == 6:
-            t_win_h_open = t_win_h_open + 1
-            print("Stelle Fenster offen im Herbst...")
-        if psel == 7:
-            t_win_h_close = t_win_h_close + 1
-            print("Stelle Fenster zu im Herbst...")
-        if psel == 8:
-            t_wcut_close = t_wcut_close + 1
-            print("Stelle Schliessen auf Grund Aussentemp...")
-        if psel == 9:
-            t_heat_off = t_heat_off + 1
-            print("Stelle Heizung aus...")
-        if psel == 10:
-            t_heat_on = t_heat_on + 1
-            print("Stelle Heizung ein...")
-        if psel == 11:
-            t_vc_on = t_vc_on + 1
-            print("Stelle Venti ein bei Tuer zu...")
-        if psel == 12:
-            t_vc_off = t_vc_off + 1
-            print("Stelle Venti aus bei Tuer zu...")
-        if psel == 13:
-            t_vo_on = t_vo_on + 1
-            print("Stelle Venti ein bei Tuer offen...")
-        if psel == 14:
-            t_vo_off = t_vo_off + 1
-            print("Stelle Venti aus bei Tuer offen...")
-        if psel == 15:
-            ct_hour = ct_hour + 1
-            print("Stelle Stunde zu per Zeit...")
-        if psel == 16:
-            ct_min = ct_min + 1
-            print("Stelle Minute zu per Zeit...")
-        if psel == 17:
-            tcorr_in = tcorr_in + 0.1
-            print("Stelle Korrektur TFuehler innen...")
-        if psel == 18:
-            print("Stelle Korrektur TFuehler aussen...")
-            tcorr_out = tcorr_out + 0.1
-
-    #------
-            
-    if p_clear > -1:
-        psel = 0
-        print("Cursor fuer Parameter ruecksetzen...")
-
-    if p_write > -1:
-        wepr()
-        
-    # Hintergruende der Speicherwerte setzen
+#-------------------------------------------------------------------------------
+# Ereignis-Log im EEPROM
 
-    hsw = ["#A3BFAA", "#A3BFAA", "#A3BFAA", "#A3BFAA", "#A3BFAA", "#A3BFAA", "#A3BFAA", "#A3BFAA", "#A3BFAA", "#A3BFAA", "#A3BFAA", "#A3BFAA", "#A3BFAA", "#A3BFAA", "#A3BFAA", "#A3BFAA", "#A3BFAA", "#A3BFAA", "#A3BFAA"]
+# EEPROM-Belegung (AT24C32N, 4096 Bytes):
+#
+#   1024-1041  alte Parameter-Ablage (nur lesen)
+#   1088-1599  Ring der Parameter-Datensaetze (ParamCache)
+#   1920-2047  Relais-Zaehler, zwei Slots im Wechsel
+#   2048-4095  Ereignis-Log
+#
+# Jedes Ereignis ist ein Datensatz fester Laenge (8 Bytes):
+#
+#   Durchlauf (B) | Ereignis-Code (B) | Wert in Zehntel (h) | Zeit time.time() (I)
+#
+# Der Log ist ein Ring, der Durchlauf-Zaehler wird bei jedem Umlauf erhoeht (0-254,
+# 0xFF = leer). Beim Start liegt der Kopf beim ersten Datensatz, dessen Durchlauf
+# von dem des ersten abweicht. Neue Ereignisse sammeln sich im RAM und werden
+# seitenweise geschrieben, spaetestens nach EV_FLUSH_MS.
+
+EPR_EVLOG        = const(2048)
+EPR_EVLOG_SIZE   = const(2048)
+EV_REC           = const(8)
+EV_FLUSH_MS      = const(600000)  # angefangene Seite spaetestens nach 10 min schreiben
+
+EV_TXT = {
+    EV_START: "Start",
+    EV_PARAM: "Parameter gesetzt",
+    EV_DOOR_OPEN: "Tuer auf",
+    EV_DOOR_CLOSE: "Tuer zu",
+    EV_WIN_OPEN: "Oeffne Fenster",
+    EV_WIN_CLOSE: "Schliesse Fenster",
+    EV_WIN_CLOSE_TS: "Schliesse Fenster (Waermespeicher)",
+    EV_WIN_CLOSE_CT: "Schliesse Fenster (Abendzeit)",
+    EV_WIN_MAN_OPEN: "Fenster manuell oeffnen",
+    EV_WIN_MAN_CLOSE: "Fenster manuell schliessen",
+    EV_WIN_AUTO: "Fensterautomatik ein",
+    EV_VENT_ON: "Ventilator ein",
+    EV_VENT_OFF: "Ventilator aus",
+    EV_VENT_MAN_ON: "Ventilator manuell ein",
+    EV_VENT_MAN_OFF: "Ventilator manuell aus",
+    EV_VENT_AUTO: "Ventilatorautomatik ein",
+    EV_HEAT_ON: "Heizung ein",
+    EV_HEAT_OFF: "Heizung aus",
+    EV_HEAT_MAN_ON: "Heizung manuell ein",
+    EV_HEAT_MAN_OFF: "Heizung manuell aus",
+    EV_HEAT_AUTO: "Heizungsautomatik ein",
+    EV_ERR + 1: "I2C-Bus",
+    EV_ERR + 2: "1W/DS18B20",
+    EV_ERR + 3: "Offline",
+    EV_ERR + 4: "Untere Grad-Grenze",
+    EV_ERR + 5: "Obere Grad-Grenze",
+    EV_ERR + 6: "MEM-Error",
+}
+
+class EventLog:
+
+    def __init__(self, epr, addr, size):
+        self.epr = epr
+        self.addr = addr
+        self.n = size // EV_REC        # Anzahl Datensaetze im Ring
+        self.head = 0                  # naechster zu schreibender Datensatz
+        self.pas = 0                   # aktueller Durchlauf
+        self.full = False              # Ring wurde schon einmal gefuellt
+        self.pend = bytearray()        # noch nicht geschriebene Datensaetze
+        self.t_pend = 0
+
+    # Kopf suchen, dazu nur die Durchlauf-Bytes betrachten
+    def load(self):
+        bs = self.epr.bpp * 8
+        p0 = None
+        for blk in range(0, self.n * EV_REC, bs):
+            raw = self.epr.read(self.addr + blk, bs)
+            for o in range(0, bs, EV_REC):
+                if p0 is None:
+                    p0 = raw[0]
+                    if p0 == 0xFF:
+                        return
+                    self.pas = p0
+                elif raw[o] != p0:
+                    self.head = (blk + o) // EV_REC
+                    self.full = raw[o] != 0xFF
+                    return
+        # alle im selben Durchlauf, naechster Umlauf beginnt vorn
+        self.head = 0
+        self.pas = (p0 + 1) % 255
+        self.full = True
+
+    def count(self):
+        return (self.n if self.full else self.head) + len(self.pend) // EV_REC
+
+    def add(self, code, val = 0):
+        if len(self.pend) == 0:
+            self.t_pend = time.ticks_ms()
+        self.pend.extend(struct.pack("<BBhI", self.pas, code, int(round(val * 10)), clock.secs()))
+        # Seitenende erreicht (der Ring endet immer an einer Seitengrenze)
+        if (self.head * EV_REC + len(self.pend)) % self.epr.bpp == 0:
+            self.flush()
+
+    def poll(self):
+        if len(self.pend) and time.ticks_diff(time.ticks_ms(), self.t_pend) >= EV_FLUSH_MS:
+            self.flush()
+
+    def flush(self):
+        if len(self.pend) == 0:
+            return
+        self.epr.write(self.addr + self.head * EV_REC, self.pend)
+        self.head += len(self.pend) // EV_REC
+        self.pend = bytearray()
+        if self.head >= self.n:
+            self.head = 0
+            self.pas = (self.pas + 1) % 255
+            self.full = True
+
+    # Ereignisse ab Position start (0 = neuestes) rueckwaerts, je (Code, Wert, Zeit)
+    def records(self, start, num):
+        np = len(self.pend) // EV_REC
+        page = -1
+        raw = None
+        for k in range(start, min(start + num, self.count())):
+            if k < np:
+                rec = struct.unpack_from("<BBhI", self.pend, (np - 1 - k) * EV_REC)
+            else:
+                i = (self.head - 1 - (k - np)) % self.n
+                o = i * EV_REC
+                if o // self.epr.bpp != page:
+                    page = o // self.epr.bpp
+                    raw = self.epr.read(self.addr + page * self.epr.bpp, self.epr.bpp)
+                rec = struct.unpack_from("<BBhI", raw, o % self.epr.bpp)
+            yield (rec[1], rec[2] / 10, rec[3])
 
-    hsw[psel] = "#C4C044"
+#-------------------------------------------------------------------------------
+# Webseite
 
-    # HTML
+# Die statischen Teile der Seite liegen als eine Bytes-Konstante vor, die beim Start
+# einmalig an den Markern @@ in Fragmente zerlegt wird. Beim Senden werden die Fragmente
+# abwechselnd mit den kleinen dynamischen Feldern aus page_fields() gestreamt,
+# grosse Zwischenstrings entstehen dabei nicht.
 
-    writer.write('HTTP/1.0 200 OK\r\nContent-type: text/html\r\n\r\n')
+HTTP_HTML = b"HTTP/1.0 200 OK\r\nContent-type: text/html\r\n\r\n"
 
-    html = """<!DOCTYPE html>
+PAGE_TPL = b"""<!DOCTYPE html>
 
     <html>
         <style>
@@ -1678,22 +2331,19 @@ async def serve_client(reader, writer):
                     <th><span class='u3'>Tuer</span></th>
                 </tr>
                 <tr>
-                    <td><img src="https://www.smartewelt.de/ghaus/fenst_""" + f_status + """.png" width='80' height='80'></td>
-                    <td><img src="https://www.smartewelt.de/ghaus/venti_""" + v_status + """.png" width='80' height='80'></td>
-                    <td><img src="https://www.smartewelt.de/ghaus/heiz_""" + h_status + """.png" width='80' height='80'></td>
-                    <td><img src="https://www.smartewelt.de/ghaus/tuer_""" + t_status + """.png" width='80' height='80'></td>
+                    <td><img src="https://www.smartewelt.de/ghaus/fenst_@@.png" width='80' height='80'></td>
+                    <td><img src="https://www.smartewelt.de/ghaus/venti_@@.png" width='80' height='80'></td>
+                    <td><img src="https://www.smartewelt.de/ghaus/heiz_@@.png" width='80' height='80'></td>
+                    <td><img src="https://www.smartewelt.de/ghaus/tuer_@@.png" width='80' height='80'></td>
                 </tr>
                 <tr>
-                    <td><span class='stext'>""" + f_status + """</span></td>
-                    <td><span class='stext'>""" + v_status + """</span></td>
-                    <td><span class='stext'>""" + h_status + """</span></td>
-                    <td><span class='stext'>""" + t_status + """</span></td>
+                    <td><span class='stext'>@@</span></td>
+                    <td><span class='stext'>@@</span></td>
+                    <td><span class='stext'>@@</span></td>
+                    <td><span class='stext'>@@</span></td>
                 </tr>
             </table>
-            """
-    writer.write(html)
 
-    html = """<!DOCTYPE html>
             <br/>
             <br/>
             <span class='u2a'>Aktuelle Werte</span>
@@ -1712,10 +2362,38 @@ async def serve_client(reader, writer):
                     <th><span class='u3a'>Aussen</span></th>
                 </tr>
                 <tr>
-                    <td><span class='a1text'><b>""" + str(temp_innen) + """</b></span></td>
-                    <td><span class='a2text'>""" + str(temp_min_innen) + "/" + str(temp_max_innen) + """</span></td>
-                    <td><span class='atext'>""" + str_temp_ok + """</span></td>
-                    <td><span class='atext'>""" + str(temp_aussen) + """</span></td>
+                    <td><span class='a1text'><b>@@</b></span></td>
+                    <td><span class='a2text'>@@/@@</span></td>
+                    <td><span class='atext'>@@</span></td>
+                    <td><span class='atext'>@@</span></td>
+                </tr>
+            </table>
+
+            <br/>
+            <img src='/chart' width='95%'>
+
+            <table width='95%' cellspacing='12' class='table'>
+                <col style='width:25%'>
+                <col style='width:25%'>
+                <col style='width:25%'>
+                <col style='width:25%'>
+                <tr>
+                    <th><span class='u3a'>Relais</span></th>
+                    <th><span class='u3a'>Schaltungen</span></th>
+                    <th><span class='u3a'>Laufzeit</span></th>
+                    <th><span class='u3a'>zu kurz</span></th>
+                </tr>
+                <tr>
+                    <td><span class='atext'>Ventilator</span></td>
+                    <td><span class='atext'>@@</span></td>
+                    <td><span class='atext'>@@ h</span></td>
+                    <td><span class='atext'>@@</span></td>
+                </tr>
+                <tr>
+                    <td><span class='atext'>Heizung</span></td>
+                    <td><span class='atext'>@@</span></td>
+                    <td><span class='atext'>@@ h</span></td>
+                    <td><span class='atext'>@@</span></td>
                 </tr>
             </table>
 
@@ -1724,11 +2402,6 @@ async def serve_client(reader, writer):
             <span class='u2a' id='a01'>Schalten</span>
             <br/>
             <br/>
-            """
-
-    writer.write(html)
-
-    html = """<!DOCTYPE html>
 
             <table width='95%' cellspacing='42' class='table'>
                 <col style='width:33%'>
@@ -1740,26 +2413,21 @@ async def serve_client(reader, writer):
                     <th><span class='u3'>Heizung</span></th>
                 </tr>
                 <tr>
-                    <td bgcolor=""" + f_red_inst + """><a href='/wins/on#a01'>Fenster <b>""" + f_hoch + """</b></a></td>
-                    <td bgcolor=""" + v_red_inst + """><a href='/vent/on#a01'>Ventilator <b>""" + v_ein + """</b></a></td>
-                    <td bgcolor=""" + h_red_inst + """><a href='/heat/on#a01'>Heizung <b>""" + h_ein + """</b></a></td>
+                    <td bgcolor=@@><a href='/wins/on#a01'>Fenster <b>@@</b></a></td>
+                    <td bgcolor=@@><a href='/vent/on#a01'>Ventilator <b>@@</b></a></td>
+                    <td bgcolor=@@><a href='/heat/on#a01'>Heizung <b>@@</b></a></td>
                 </tr>
                 <tr>
-                    <td bgcolor=""" + f_green_inst + """><a href='/wins/off#a01'>Fenster <b>""" + f_tief + """</b></a></td>
-                    <td bgcolor=""" + v_green_inst + """><a href='/vent/off#a01'>Ventilator <b>""" + v_aus + """</b></a></td>
-                    <td bgcolor=""" + h_green_inst + """><a href='/heat/off#a01'>Heizung <b>""" + h_aus + """</b></a></td>
+                    <td bgcolor=@@><a href='/wins/off#a01'>Fenster <b>@@</b></a></td>
+                    <td bgcolor=@@><a href='/vent/off#a01'>Ventilator <b>@@</b></a></td>
+                    <td bgcolor=@@><a href='/heat/off#a01'>Heizung <b>@@</b></a></td>
                 </tr>
                 <tr>
-                    <td bgcolor=""" + f_blue_inst + """><a href='/winsauto/on#a01'>Auto <b>""" + f_aktiv + """</b></a></td>
-                    <td bgcolor=""" + v_blue_inst + """><a href='/ventauto/on#a01'>Auto <b>""" + v_aktiv + """</b></a></td>
-                    <td bgcolor=""" + h_blue_inst + """><a href='/heatauto/on#a01'>Auto <b>""" + h_aktiv + """</b></a></td>
+                    <td bgcolor=@@><a href='/winsauto/on#a01'>Auto <b>@@</b></a></td>
+                    <td bgcolor=@@><a href='/ventauto/on#a01'>Auto <b>@@</b></a></td>
+                    <td bgcolor=@@><a href='/heatauto/on#a01'>Auto <b>@@</b></a></td>
                 </tr>
             </table>
-            """
-
-    writer.write(html)
-
-    html = """<!DOCTYPE html>
 
             <br/>
             <br/>
@@ -1777,7 +2445,17 @@ async def serve_client(reader, writer):
                     </td>
                     <td>
                     <textarea id='t1' name='t1' rows='12' cols='46' class='mbox' readonly='True'>
-                    """ + '\n' + msg_txt[0] + '\n' + msg_txt[1] + '\n' +  msg_txt[2] + '\n' +  msg_txt[3] + '\n' +  msg_txt[4] + '\n' +  msg_txt[5] + '\n' +  msg_txt[6] + '\n' +  msg_txt[7] + '\n' +  msg_txt[8] + '\n' +  msg_txt[9] + """
+                    
+@@
+@@
+@@
+@@
+@@
+@@
+@@
+@@
+@@
+@@
                     </textarea>
                     </td>
                     <td>
@@ -1790,7 +2468,10 @@ async def serve_client(reader, writer):
                     </td>
                     <td>
                     <textarea id='t2' name='t2' rows='5' cols='39' class='ebox' readonly='True'>
-                    """ + '\n' + err_txt[0] + '\n' + err_txt[1] + '\n' +  err_txt[2] + """
+                    
+@@
+@@
+@@
                     </textarea>
                     </td>
                     <td>
@@ -1804,11 +2485,6 @@ async def serve_client(reader, writer):
             <span class='u2d'>L&ouml;schen</span>
             <br/>
             <br/>
-            """
-
-    writer.write(html)
-
-    html = """<!DOCTYPE html>
 
             <table width='95%' cellspacing='28' class='table'>
                 <col style='width:25%'>
@@ -1849,11 +2525,6 @@ async def serve_client(reader, writer):
                     </td>
                 </tr>
             </table>
-                """
-
-    writer.write(html)
-
-    html = """<!DOCTYPE html>
 
             <br/>
             <br/>
@@ -1869,70 +2540,60 @@ async def serve_client(reader, writer):
                 <col style='width:16.6%'>
                 <col style='width:16.6%'>
                 <tr>
-                    <td class='tdp' bgcolor=""" + str(hsw[1]) + """>Motor Zeit</td>
-                    <td class='tdp' bgcolor=""" + str(hsw[2]) + """>OT Fruehl</td>
-                    <td class='tdp' bgcolor=""" + str(hsw[3]) + """>UT Fruehl</td>
-                    <td class='tdp' bgcolor=""" + str(hsw[4]) + """>OT Sommer</td>
-                    <td class='tdp' bgcolor=""" + str(hsw[5]) + """>UT Sommer</td>
-                    <td class='tdp' bgcolor=""" + str(hsw[6]) + """>OT Herbst</td>
+                    <td class='tdp' bgcolor=@@>Motor Zeit</td>
+                    <td class='tdp' bgcolor=@@>OT Fruehl</td>
+                    <td class='tdp' bgcolor=@@>UT Fruehl</td>
+                    <td class='tdp' bgcolor=@@>OT Sommer</td>
+                    <td class='tdp' bgcolor=@@>UT Sommer</td>
+                    <td class='tdp' bgcolor=@@>OT Herbst</td>
                 </tr>
                 <tr>
-                    <td class='tdt' >""" + str(mot_duration) + """</td>
-                    <td class='tdt' >""" + str(t_win_f_open) + """</td>
-                    <td class='tdt' >""" + str(t_win_f_close) + """</td>
-                    <td class='tdt' >""" + str(t_win_s_open) + """</td>
-                    <td class='tdt' >""" + str(t_win_s_close) + """</td>
-                    <td class='tdt' >""" + str(t_win_h_open) + """</td>
+                    <td class='tdt' >@@</td>
+                    <td class='tdt' >@@</td>
+                    <td class='tdt' >@@</td>
+                    <td class='tdt' >@@</td>
+                    <td class='tdt' >@@</td>
+                    <td class='tdt' >@@</td>
                 </tr>
-                """
-
-    writer.write(html)
-
-    html = """<!DOCTYPE html>
                 <tr>
-                    <td class='tdp' bgcolor=""" + str(hsw[7]) + """>UT Herbst</td>
-                    <td class='tdp' bgcolor=""" + str(hsw[8]) + """>Schl Auss</td>
-                    <td class='tdp' bgcolor=""" + str(hsw[9]) + """>Heiz Aus</td>
-                    <td class='tdp' bgcolor=""" + str(hsw[10]) + """>Heiz Ein</td>
-                    <td class='tdp' bgcolor=""" + str(hsw[11]) + """>VEin TZu</td>
-                    <td class='tdp' bgcolor=""" + str(hsw[12]) + """>VAus TZu</td>
+                    <td class='tdp' bgcolor=@@>UT Herbst</td>
+                    <td class='tdp' bgcolor=@@>Schl Auss</td>
+                    <td class='tdp' bgcolor=@@>Heiz Aus</td>
+                    <td class='tdp' bgcolor=@@>Heiz Ein</td>
+                    <td class='tdp' bgcolor=@@>VEin TZu</td>
+                    <td class='tdp' bgcolor=@@>VAus TZu</td>
                 </tr>
                 <tr>
-                    <td class='tdt' >""" + str(t_win_h_close) + """</td>
-                    <td class='tdt' >""" + str(t_wcut_close) + """</td>
-                    <td class='tdt' >""" + str(t_heat_off) + """</td>
-                    <td class='tdt' >""" + str(t_heat_on) + """</td>
-                    <td class='tdt' >""" + str(t_vc_on) + """</td>
-                    <td class='tdt' >""" + str(t_vc_off) + """</td>
+                    <td class='tdt' >@@</td>
+                    <td class='tdt' >@@</td>
+                    <td class='tdt' >@@</td>
+                    <td class='tdt' >@@</td>
+                    <td class='tdt' >@@</td>
+                    <td class='tdt' >@@</td>
                 </tr>
-                """
-
-    writer.write(html)
-
-    html = """<!DOCTYPE html>
                 <tr>
-                    <td class='tdp' bgcolor=""" + str(hsw[13]) + """>VEin TAuf</a></td>
-                    <td class='tdp' bgcolor=""" + str(hsw[14]) + """>VAus TAuf</a></td>
-                    <td class='tdp' bgcolor=""" + str(hsw[15]) + """>AZeit Std</a></td>
-                    <td class='tdp' bgcolor=""" + str(hsw[16]) + """>AZeit Min</a></td>
-                    <td class='tdp' bgcolor=""" + str(hsw[17]) + """>Korr Inn</a></td>
-                    <td class='tdp' bgcolor=""" + str(hsw[18]) + """>Korr Auss</a></td>
+                    <td class='tdp' bgcolor=@@>VEin TAuf</td>
+                    <td class='tdp' bgcolor=@@>VAus TAuf</td>
+                    <td class='tdp' bgcolor=@@>AZeit Std</td>
+                    <td class='tdp' bgcolor=@@>AZeit Min</td>
+                    <td class='tdp' bgcolor=@@>Korr Inn</td>
+                    <td class='tdp' bgcolor=@@>Korr Auss</td>
                 </tr>
                 <tr>
-                    <td class='tdt' >""" + str(t_vo_on) + """</td>
-                    <td class='tdt' >""" + str(t_vo_off) + """</td>
-                    <td class='tdt' >""" + str(ct_hour) + """</td>
-                    <td class='tdt' >""" + str(ct_min) + """</td>
-                    <td class='tdt' >""" + str(tcorr_in)[:4] + """</td>
-                    <td class='tdt' >""" + str(tcorr_out)[:4] + """</td>
+                    <td class='tdt' >@@</td>
+                    <td class='tdt' >@@</td>
+                    <td class='tdt' >@@</td>
+                    <td class='tdt' >@@</td>
+                    <td class='tdt' >@@</td>
+                    <td class='tdt' >@@</td>
                 </tr>
                 <tr>
-                    <td bgcolor='#4E934E'><a href="/param/selback""" + str(rand) + """#a04"><b><<</b></a></td>
-                    <td bgcolor='#4E934E'><a href="/param/selfor""" + str(rand) + """#a04"><b>>></b></a></td>
-                    <td bgcolor='#5062B2'><a href="/param/minus""" + str(rand) + """#a04"><b>--</b></a></td>
-                    <td bgcolor='#5062B2'><a href="/param/plus""" + str(rand) + """#a04"><b>++</b></a></td>
-                    <td bgcolor='#888'><a href="/param/clear""" + str(rand) + """#a04"><b>Clear</b></a></td>
-                    <td bgcolor='#AF833E'><a href="/param/write""" + str(rand) + """#a04"><b>Write</b></a></td>
+                    <td bgcolor='#4E934E'><a href="/param/selback?r=@@#a04"><b><<</b></a></td>
+                    <td bgcolor='#4E934E'><a href="/param/selfor?r=@@#a04"><b>>></b></a></td>
+                    <td bgcolor='#5062B2'><a href="/param/minus?r=@@#a04"><b>--</b></a></td>
+                    <td bgcolor='#5062B2'><a href="/param/plus?r=@@#a04"><b>++</b></a></td>
+                    <td bgcolor='#888'><a href="/param/clear?r=@@#a04"><b>Clear</b></a></td>
+                    <td bgcolor='#AF833E'><a href="/param/write?r=@@#a04"><b>Write</b></a></td>
                 </tr>
 
             </table>
@@ -1942,27 +2603,905 @@ async def serve_client(reader, writer):
 
          </body>
       </html>
-    """
+"""
+
+PAGE_FRAGS = PAGE_TPL.split(b"@@")
+del PAGE_TPL
+
+# Hintergruende der Schaltflaechen
+BTN_RED          = "#504444"
+BTN_GREEN        = "#445044"
+BTN_BLUE         = "#444450"
+BTN_RED_HIGH     = "#997777 style='border: 2px solid lightgrey;' "
+BTN_GREEN_HIGH   = "#779977 style='border: 2px solid lightgrey;' "
+BTN_BLUE_HIGH    = "#438596 style='border: 2px solid lightgrey;' "
 
-    writer.write(html)
+# Hintergruende der Speicherwerte
+PSEL_NORMAL      = "#A3BFAA"
+PSEL_HIGH        = "#C4C044"
 
+# Statistik Webserver: Anzahl Seiten, Renderzeit (us) und Heap-Zuwachs (Bytes), jeweils letzter und max. Wert
+web_stat = {"n": 0, "us": 0, "us_max": 0, "heap": 0, "heap_max": 0}
+
+#-------------------------------------------------------------------------------
+# Schaltflaechen (Hand/Automatik) aus dem Stell-Status ableiten
+
+def page_buttons(manu, on, t_on, t_off):
+
+    # Rueckgabe: Hintergrund und Text fuer Ein/Hoch, Aus/Tief und Automatik
+    if not manu:
+        return (BTN_RED, t_on, BTN_GREEN, t_off, BTN_BLUE_HIGH, "AKTIV")
+    if on:
+        return (BTN_RED_HIGH, "FEST " + t_on, BTN_GREEN, t_off, BTN_BLUE, "AUS")
+    return (BTN_RED, t_on, BTN_GREEN_HIGH, "FEST " + t_off, BTN_BLUE, "AUS")
+
+#-------------------------------------------------------------------------------
+# Dynamische Felder der Webseite, in der Reihenfolge der Marker im Template
+
+def page_fields():
+
+    f_status = "AUF" if wins_open else "ZU"
+    v_status = "EIN" if vent_on else "AUS"
+    h_status = "EIN" if heat_on else "AUS"
+    t_status = "ZU" if tval else "AUF"
+
+    # Status
+    yield f_status
+    yield v_status
+    yield h_status
+    yield t_status
+    yield f_status
+    yield v_status
+    yield h_status
+    yield t_status
+
+    # Aktuelle Werte
+    yield str(temp_innen)
+    yield str(temp_min_innen)
+    yield str(temp_max_innen)
+    yield "OK" if temp_ok else "NICHT OK"
+    yield str(temp_aussen)
+
+    # Relais-Zaehler
+    for r in (rel05, rel06):
+        yield str(r.switches)
+        yield "{:.1f}".format(r.on_s() / 3600)
+        yield str(r.short)
+
+    # Schalten, zeilenweise Fenster/Ventilator/Heizung
+    fb = page_buttons(wins_manu, wins_open, "HOCH", "TIEF")
+    vb = page_buttons(vent_manu, vent_on, "EIN", "AUS")
+    hb = page_buttons(heat_manu, heat_on, "EIN", "AUS")
+    for i in range(0, 6, 2):
+        for b in (fb, vb, hb):
+            yield b[i]
+            yield b[i + 1]
+
+    # Meldungen/Fehler
+    for t in msg_txt:
+        yield t
+    for t in err_txt:
+        yield t
+
+    # Speicherwerte, ausgewaehlter Parameter hervorgehoben
+    for i in range(1, 7):
+        yield PSEL_HIGH if psel == i else PSEL_NORMAL
+    yield str(mot_duration)
+    yield str(t_win_f_open)
+    yield str(t_win_f_close)
+    yield str(t_win_s_open)
+    yield str(t_win_s_close)
+    yield str(t_win_h_open)
+    for i in range(7, 13):
+        yield PSEL_HIGH if psel == i else PSEL_NORMAL
+    yield str(t_win_h_close)
+    yield str(t_wcut_close)
+    yield str(t_heat_off)
+    yield str(t_heat_on)
+    yield str(t_vc_on)
+    yield str(t_vc_off)
+    for i in range(13, 19):
+        yield PSEL_HIGH if psel == i else PSEL_NORMAL
+    yield str(t_vo_on)
+    yield str(t_vo_off)
+    yield str(ct_hour)
+    yield str(ct_min)
+    yield str(tcorr_in)[:4]
+    yield str(tcorr_out)[:4]
+
+    # Zufallszahl gegen Browser-Cache der Parameter-Links
+    rand = str(randint(1, 100000))
+    for i in range(6):
+        yield rand
+
+#-------------------------------------------------------------------------------
+# Webseite streamen, Renderzeit und Heap-Zuwachs festhalten
+
+async def send_page(writer):
+
+    t0 = time.ticks_us()
+    m0 = mem_alloc()
+    peak = 0
+
+    writer.write(HTTP_HTML)
+    fields = page_fields()
+    n = 0
+    for frag in PAGE_FRAGS:
+        writer.write(frag)
+        for f in fields:
+            writer.write(f.encode())
+            break
+        await writer.drain()
+        # Heap nur gelegentlich abfragen, mem_alloc() durchlaeuft den ganzen Heap
+        n += 1
+        if n & 7 == 0:
+            peak = max(peak, mem_alloc() - m0)
+    peak = max(peak, mem_alloc() - m0)
+
+    us = time.ticks_diff(time.ticks_us(), t0)
+    web_stat["n"] += 1
+    web_stat["us"] = us
+    web_stat["us_max"] = max(web_stat["us_max"], us)
+    web_stat["heap"] = peak
+    web_stat["heap_max"] = max(web_stat["heap_max"], peak)
+    if GDEBUG : print("Seite in {} us, Heap +{} Bytes".format(us, peak))
+
+#-------------------------------------------------------------------------------
+# JSON-API
+
+# Kompakte Abfragen fuer das Monitoring statt der ganzen Webseite:
+#
+#   /api/status  - Temperaturen, Min/Max, Stati von Fenster, Ventilator, Heizung, Tuer
+#   /api/params  - alle im EEPROM gespeicherten Parameter
+#   /api/log     - Meldungs- und Fehlerspeicher
+#
+# Jede Antwort traegt ein ETag aus Start-Kennung und Versionszaehler. Schickt der
+# Client es per If-None-Match zurueck und hat sich nichts geaendert, gibt es nur ein 304.
+
+def api_status():
+    return {
+        "temp_innen": temp_innen,
+        "temp_aussen": temp_aussen,
+        "temp_min_innen": temp_min_innen,
+        "temp_max_innen": temp_max_innen,
+        "temp_ok": temp_ok,
+        "wins_open": wins_open,
+        "wins_pos": round(wdrive.position(), 2),
+        "wins_move": wdrive.state,
+        "vent_on": vent_on,
+        "heat_on": heat_on,
+        "tval": tval,
+        "wins_manu": wins_manu,
+        "vent_manu": vent_manu,
+        "heat_manu": heat_manu,
+        "tsave": tsave,
+        "wdtime": wdtime,
+        "year_time": year_time,
+        "webcon": webcon,
+    }
+
+def api_params():
+    g = globals()
+    return {p[0]: g[p[0]] for p in PARAMS}
+
+def api_log():
+    return {"msg_txt": msg_txt, "err_txt": err_txt}
+
+HTTP_JSON = b"HTTP/1.0 200 OK\r\nContent-Type: application/json\r\nCache-Control: no-cache\r\nETag: "
+HTTP_304 = b"HTTP/1.0 304 Not Modified\r\nETag: "
+HTTP_JSON_OK = b"HTTP/1.0 200 OK\r\nContent-Type: application/json\r\n\r\n"
+HTTP_JSON_400 = b"HTTP/1.0 400 Bad Request\r\nContent-Type: application/json\r\n\r\n"
+
+# vi - Versionszaehler, tag - Kennbuchstabe fuer das ETag, f - Datenfunktion
+async def send_json(writer, vi, tag, f, etag_in):
+
+    etag = '"{}{}-{}"'.format(tag, boot_id, ver[vi]).encode()
+    if etag == etag_in:
+        writer.write(HTTP_304)
+        writer.write(etag)
+        writer.write(b"\r\n\r\n")
+    else:
+        writer.write(HTTP_JSON)
+        writer.write(etag)
+        writer.write(b"\r\n\r\n")
+        writer.write(json.dumps(f()).encode())
     await writer.drain()
-    await writer.wait_closed()
-    
-    html = ""
-    
-    #print("----------- disconnected.")
-    
+
+#-------------------------------------------------------------------------------
+# HTTP-Anfrage lesen und zerlegen
+
+# Die Anfrage-Zeile wird einmal in Methode, Pfad und Query-Parameter zerlegt,
+# "GET /param/set?name=t_vc_on&value=37 HTTP/1.1" ergibt
+# method "GET", path "/param/set", query {"name": "t_vc_on", "value": "37"}.
+# Von den Headern werden nur If-None-Match und Content-Length ausgewertet.
+
+REQ_BODY_MAX     = const(512)
+
+class Request:
+
+    def __init__(self, method, path, query):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.etag = None     # If-None-Match
+        self.clen = 0        # Content-Length
+        self.body = None     # Inhalt bei POST (max. REQ_BODY_MAX Bytes)
+
+# %XX und + in Query-Parametern dekodieren
+def url_unquote(qs):
+
+    qs = qs.replace("+", " ")
+    if "%" not in qs:
+        return qs
+    parts = qs.split("%")
+    res = bytearray(parts[0].encode())
+    for part in parts[1:]:
+        try:
+            res.append(int(part[:2], 16))
+            res.extend(part[2:].encode())
+        except ValueError:
+            res.extend(b"%" + part.encode())
+    return res.decode()
+
+def parse_query(qs):
+
+    query = {}
+    for kv in qs.split("&"):
+        if not kv: continue
+        kv = kv.split("=", 1)
+        query[url_unquote(kv[0])] = url_unquote(kv[1]) if len(kv) > 1 else ""
+    return query
+
+async def read_request(reader):
+
+    parts = (await reader.readline()).decode().split()
+    req = None
+    if len(parts) > 1:
+        target = parts[1].split("?", 1)
+        req = Request(parts[0], target[0], parse_query(target[1]) if len(target) > 1 else {})
+
+    # Header lesen
+    while True:
+        h = await reader.readline()
+        if h == b"\r\n" or h == b"":
+            break
+        if req is None:
+            continue
+        h = h.lower()
+        if h.startswith(b"if-none-match:"):
+            req.etag = h[14:].strip()
+        elif h.startswith(b"content-length:"):
+            req.clen = int(h[15:].strip())
+
+    if req is not None and req.method == "POST" and req.clen > 0:
+        req.body = await reader.readexactly(min(req.clen, REQ_BODY_MAX))
+    return req
+
+#-------------------------------------------------------------------------------
+# Handler fuer Steuerung und Seite
+
+# Jeder Handler bekommt writer und Request und sendet seine Antwort selbst,
+# Schaltaktionen enden mit der Webseite.
+
+async def h_page(writer, req):
+
+    print("Website neu laden")
+    await send_page(writer)
+
+async def h_minmax_erase(writer, req):
+
+    global temp_min_innen, temp_max_innen
+
+    print("Loesche Min/Max-Temperaturen")
+    temp_min_innen = temp_innen
+    temp_max_innen = temp_innen
+    ver[VER_ST] += 1
+    await send_page(writer)
+
+async def h_msglog_erase(writer, req):
+
+    print("Loesche Meldungs-Register")
+    for i in range(len(msg_txt)):
+        msg_txt[i] = ""
+    ver[VER_LOG] += 1
+    await send_page(writer)
+
+async def h_errlog_erase(writer, req):
+
+    print("Loesche Fehlerspeicher")
+    for i in range(len(err_txt)):
+        err_txt[i] = ""
+    led_r.value(1)
+    led_y.value(1)
+    ver[VER_LOG] += 1
+    await send_page(writer)
+
+async def h_wins_on(writer, req):
+
+    global wins_open, wins_manu
+
+    print("Fenster OEFFNEN")
+    # keine sonstige Logik abgefragt, volle Motorlaufzeit bis an den oberen Endschalter
+    # die Fahrt laeuft im Hintergrund, der Webserver antwortet sofort
+    wdrive.start(WD_UP, True)
+    wins_open = True
+    wins_manu = True
+    msg("Fenster manuell oeffnen", 1, EV_WIN_MAN_OPEN)
+    await send_page(writer)
+
+async def h_wins_off(writer, req):
+
+    global wins_open, wins_manu
+
+    print("Fenster SCHLIESSEN")
+    # keine sonstige Logik abgefragt, volle Motorlaufzeit bis an den unteren Endschalter
+    # die Fahrt laeuft im Hintergrund, der Webserver antwortet sofort
+    wdrive.start(WD_DOWN, True)
+    wins_open = False
+    wins_manu = True
+    msg("Fenster manuell schliessen", 1, EV_WIN_MAN_CLOSE)
+    await send_page(writer)
+
+async def h_wins_auto(writer, req):
+
+    global wins_manu
+
+    print("Fensterautomatik EIN")
+    wins_manu = False
+    msg("Fensterautomatik ein", 1, EV_WIN_AUTO)
+    await send_page(writer)
+
+async def h_vent_on(writer, req):
+
+    global vent_on, vent_manu
+
+    print("Ventilator EIN")
+    rel05.value(0)
+    vent_on = True
+    vent_manu = True
+    msg("Ventilator manuell ein", 1, EV_VENT_MAN_ON)
+    await send_page(writer)
+
+async def h_vent_off(writer, req):
+
+    global vent_on, vent_manu
+
+    print("Ventilator AUS")
+    rel05.value(1)
+    vent_on = False
+    vent_manu = True
+    msg("Ventilator manuell aus", 1, EV_VENT_MAN_OFF)
+    await send_page(writer)
+
+async def h_vent_auto(writer, req):
+
+    global vent_manu
+
+    print("Ventilatorautomatik EIN")
+    vent_manu = False
+    msg("Ventilatorautomatik ein", 1, EV_VENT_AUTO)
+    await send_page(writer)
+
+async def h_heat_on(writer, req):
+
+    global heat_on, heat_manu
+
+    print("Heizung EIN")
+    rel06.value(0)
+    heat_on = True
+    heat_manu = True
+    msg("Heizung manuell ein", 1, EV_HEAT_MAN_ON)
+    await send_page(writer)
+
+async def h_heat_off(writer, req):
+
+    global heat_on, heat_manu
+
+    print("Heizung AUS")
+    rel06.value(1)
+    heat_on = False
+    heat_manu = True
+    msg("Heizung manuell aus", 1, EV_HEAT_MAN_OFF)
+    await send_page(writer)
+
+async def h_heat_auto(writer, req):
+
+    global heat_manu
+
+    print("Heizungsautomatik EIN")
+    heat_manu = False
+    msg("Heizungsautomatik ein", 1, EV_HEAT_AUTO)
+    await send_page(writer)
+
+#-------------------------------------------------------------------------------
+# Handler fuer die Speicherwerte
+
+async def h_param_selfor(writer, req):
+
+    global psel
+
+    psel = psel + 1
+    if psel > 18: psel = 0
+    print("Parameter ausgewaehlt (",psel,")...")
+    await send_page(writer)
+
+async def h_param_selback(writer, req):
+
+    global psel
+
+    psel = psel - 1
+    if psel < 0: psel = 18
+    print("Parameter ausgewaehlt (",psel,")...")
+    await send_page(writer)
+
+# Ausgewaehlten Parameter um einen Schritt (d = 1 oder -1) veraendern, in den Grenzen der Tabelle
+def param_step(d):
+
+    if psel < 1 or psel > len(PARAMS):
+        return
+    name, typ, lo, hi, step, txt = PARAMS[psel - 1]
+    g = globals()
+    # gleiche Pruefung wie param_set, auch die Ein/Aus-Paare
+    err, new = param_check({name: g[name] + d * step})
+    if err is not None:
+        print(err)
+        return
+    print("Stelle {}...".format(txt))
+    g[name] = new[name]
+    ver[VER_PAR] += 1
+    pcache.touch()
+
+#-------------------------------------------------------------------------------
+# Parameter direkt setzen
+
+# /param/set?name=t_vc_on&value=37 oder mehrere auf einmal /param/set?t_vc_on=37&t_vc_off=35,
+# alternativ per POST mit denselben Feldern als Formular oder als JSON-Objekt.
+# Alle Werte werden erst geprueft (Bereich, Ein/Aus-Paare) und nur dann gemeinsam
+# uebernommen, wenn keiner fehlerhaft ist. Mit save=1 wird anschliessend das EEPROM geschrieben.
+
+INF = float("inf")
+
+# Rueckgabe (Fehlertext, None) oder (None, Dict der gerundeten Werte)
+def param_check(vals):
+
+    g = globals()
+    new = {}
+    for p in PARAMS:
+        name = p[0]
+        if name not in vals:
+            continue
+        x = vals[name]
+        # JSON true/false sind keine Zahlen, auch wenn int() und float() sie nehmen
+        if isinstance(x, bool):
+            return "{}: kein Zahlenwert".format(name), None
+        try:
+            v = p[1](x)
+        except (ValueError, TypeError, OverflowError):
+            return "{}: kein Zahlenwert".format(name), None
+        # Ganzzahl-Parameter nicht stillschweigend abschneiden (JSON 37.9)
+        if p[1] is int and isinstance(x, float) and x != v:
+            return "{}: keine ganze Zahl".format(name), None
+        # nan und inf bestehen jeden Vergleich, die Grenzen allein halten sie nicht auf
+        if v != v or v in (INF, -INF):
+            return "{}: kein Zahlenwert".format(name), None
+        if v < p[2] or v > p[3]:
+            return "{}: ausserhalb {}..{}".format(name, p[2], p[3]), None
+        new[name] = round(v, 1) if p[1] is float else v
+
+    if len(new) == 0:
+        return "keine Parameter", None
+
+    for on, off in PARAM_PAIRS:
+        if on in new or off in new:
+            if new.get(on, g[on]) <= new.get(off, g[off]):
+                return "{} muss groesser {} sein".format(on, off), None
+
+    return None, new
+
+def param_set(vals):
+
+    g = globals()
+    err, new = param_check(vals)
+    if err is not None:
+        return err
+
+    for name in new:
+        g[name] = new[name]
+    ver[VER_PAR] += 1
+    pcache.touch()
+    print("Parameter gesetzt: {}".format(new))
+    msg("Parameter gesetzt ({})".format(len(new)), 1, EV_PARAM, len(new))
+    # neue Schwellen gleich anwenden
+    sched.kick("ctrl")
+    return None
+
+async def h_param_minus(writer, req):
+
+    print("Parameter wird erniedrigt...")
+    param_step(-1)
+    await send_page(writer)
+
+async def h_param_plus(writer, req):
+
+    print("Parameter wird erhoeht...")
+    param_step(1)
+    await send_page(writer)
+
+async def h_param_clear(writer, req):
+
+    global psel
+
+    psel = 0
+    print("Cursor fuer Parameter ruecksetzen...")
+    await send_page(writer)
+
+async def h_param_write(writer, req):
+
+    wepr()
+    await send_page(writer)
+
+async def h_param_set(writer, req):
+
+    vals = req.query
+    try:
+        if req.body:
+            if req.body[:1] == b"{":
+                vals = json.loads(req.body)
+            else:
+                vals = parse_query(req.body.decode())
+    except (ValueError, UnicodeError):
+        vals = None
+    # Einzelwert als name/value, die uebrigen Felder (save) bleiben erhalten
+    if isinstance(vals, dict) and "name" in vals and "value" in vals:
+        if isinstance(vals["name"], str):
+            vals = dict(vals)
+            vals[vals.pop("name")] = vals.pop("value")
+        else:
+            vals = None
+
+    if not isinstance(vals, dict):
+        err = "Anfrage fehlerhaft"
+    else:
+        err = param_set(vals)
+    if err is None and vals.get("save") in ("1", 1, True):
+        wepr()
+
+    if err is None:
+        writer.write(HTTP_JSON_OK)
+        writer.write(json.dumps(api_params()).encode())
+    else:
+        writer.write(HTTP_JSON_400)
+        writer.write(json.dumps({"err": err}).encode())
+    await writer.drain()
+
+#-------------------------------------------------------------------------------
+# Handler der JSON-API
+
+async def h_api_status(writer, req):
+    await send_json(writer, VER_ST, "s", api_status, req.etag)
+
+async def h_api_params(writer, req):
+    await send_json(writer, VER_PAR, "p", api_params, req.etag)
+
+async def h_api_log(writer, req):
+    await send_json(writer, VER_LOG, "l", api_log, req.etag)
+
+EV_PAGE_MAX      = const(100)    # Ereignisse je Abfrage
+
+# Ereignis-Log seitenweise, neueste zuerst, /api/events?page=0&n=20 (n 1..EV_PAGE_MAX)
+# Die Datensaetze werden einzeln aus dem EEPROM gelesen und gestreamt.
+async def h_api_events(writer, req):
+
+    # Argumente vor dem Kopf pruefen, danach kann kein 400 mehr folgen
+    try:
+        page = int(req.query.get("page", 0))
+        n = int(req.query.get("n", 20))
+    except ValueError:
+        page = n = -1
+    if page < 0 or n < 1 or n > EV_PAGE_MAX:
+        writer.write(HTTP_400)
+        await writer.drain()
+        return
+
+    writer.write(HTTP_JSON_OK)
+    writer.write('{{"total": {}, "page": {}, "n": {}, "events": ['.format(evlog.count(), page, n).encode())
+    sep = ""
+    for code, val, t in evlog.records(page * n, n):
+        lt = time.localtime(t)
+        writer.write('{}{{"t": "{:04}-{:02}-{:02} {:02}:{:02}:{:02}", "ev": {}, "txt": "{}", "v": {}}}'.format(
+            sep, lt[0], lt[1], lt[2], lt[3], lt[4], lt[5], code, EV_TXT.get(code, "?"), val).encode())
+        sep = ", "
+        await writer.drain()
+    writer.write(b"]}")
+    await writer.drain()
+
+# Statistik des Parameter-Caches, ohne ETag
+async def h_api_eeprom(writer, req):
+    writer.write(HTTP_JSON_OK)
+    writer.write(json.dumps({"seq": pcache.seq, "slot": pcache.slot, "dirty": pcache.dirty, "stat": pcache.stat}).encode())
+    await writer.drain()
+
+# Temperaturverlauf, /api/hist?res=1|15&n=..&fmt=json|bin
+# JSON: t0 (Beginn aeltester Bucket), step (s), je Sensor Listen min/max/mittel in
+# Zehntel Grad, null ohne Messung. bin: Kopf "<IHH" (t0, step, n), danach n Buckets
+# mit je sechs int16 little endian (innen min/max/mittel, aussen min/max/mittel).
+# Beides wird direkt aus dem Ring gestreamt, der letzte Bucket ist der laufende.
+HTTP_BIN_OK = b"HTTP/1.0 200 OK\r\nContent-Type: application/octet-stream\r\n\r\n"
+HIST_CHUNK       = const(60)        # Buckets je Schreiben (bin: 720 Bytes)
+
+async def h_api_hist(writer, req):
+
+    try:
+        h = HIST[int(req.query.get("res", 1))]
+        # auf 0..Ringgroesse begrenzen, bevor der Kopf gesendet ist
+        num = max(0, min(int(req.query.get("n", h.n)), h.n))
+    except (ValueError, KeyError):
+        writer.write(HTTP_400)
+        await writer.drain()
+        return
+
+    if h.cur is None: num = 0
+    t0, p = h.start(num) if num else (0, 0)
+    buf = h.buf
+
+    # Ring ab p direkt aus der Bytes-Sicht, ueber das Ende auf den Anfang, je HIST_CHUNK Buckets
+    if req.query.get("fmt") == "bin":
+        writer.write(HTTP_BIN_OK)
+        writer.write(struct.pack("<IHH", t0, h.step, num))
+        await writer.drain()
+        k = 0
+        while k < num:
+            o = (p + k) % h.n
+            c = min(HIST_CHUNK, num - k, h.n - o)
+            writer.write(h.raw[o * 12:(o + c) * 12])
+            await writer.drain()
+            k += c
+        return
+
+    writer.write(HTTP_JSON_OK)
+    writer.write('{{"t0": {}, "step": {}, "n": {}'.format(t0, h.step, num).encode())
+    for j, key in enumerate(("in_min", "in_max", "in_avg", "out_min", "out_max", "out_avg")):
+        writer.write(', "{}": ['.format(key).encode())
+        for a in range(0, num, HIST_CHUNK):
+            v = [buf[((p + k) % h.n) * 6 + j] for k in range(a, min(a + HIST_CHUNK, num))]
+            writer.write(((", " if a else "") + ", ".join("null" if x == HIST_NONE else str(x) for x in v)).encode())
+            await writer.drain()
+        writer.write(b"]")
+    writer.write(b"}")
+    await writer.drain()
+
+# Temperaturverlauf der letzten 24 h als SVG, direkt aus dem Minuten-Ring
+# Die Punkte werden einzeln geschrieben und alle CHART_CHUNK Punkte gesendet,
+# der Speicherbedarf haengt damit nicht von der Anzahl der Punkte ab.
+# Luecken im Verlauf unterbrechen die Linie. Dazu die Oeffnen/Schliessen-Grenzen
+# der aktuellen Jahreszeit als gestrichelte Referenzlinien.
+HTTP_SVG = b"HTTP/1.0 200 OK\r\nContent-Type: image/svg+xml\r\nCache-Control: no-cache\r\n\r\n"
+CHART_W          = const(720)
+CHART_H          = const(300)
+CHART_CHUNK      = const(64)
+
+async def h_chart(writer, req):
+
+    h = HIST[1]
+    buf = h.buf
+    num = h.n if h.cur is not None else 0
+    t0, p = h.start(num) if num else (0, 0)
+    w_open, w_close = win_limits()
+
+    # Wertebereich (Zehntel) ueber Messwerte und Grenzen, auf 5 Grad gerundet
+    lo = int(min(w_close, t_wcut_close) * 10)
+    hi = int(w_open * 10)
+    for k in range(num):
+        o = ((p + k) % h.n) * 6
+        for v in (buf[o + 2], buf[o + 5]):
+            if v != HIST_NONE:
+                if v < lo: lo = v
+                if v > hi: hi = v
+    lo = (lo // 50) * 50
+    hi = (hi // 50 + 1) * 50
+    sy = CHART_H / (hi - lo)
+    sx = CHART_W / max(num - 1, 1)
+
+    writer.write(HTTP_SVG)
+    writer.write('<svg xmlns="http://www.w3.org/2000/svg" viewBox="-40 -10 {} {}" font-size="12" font-family="sans-serif">'.format(CHART_W + 50, CHART_H + 30).encode())
+    writer.write('<rect width="{}" height="{}" fill="#fff" stroke="#999"/>'.format(CHART_W, CHART_H).encode())
+
+    # Raster alle 5 Grad und alle 3 Stunden
+    for v in range(lo, hi + 1, 50):
+        y = CHART_H - (v - lo) * sy
+        writer.write('<line x1="0" x2="{}" y1="{:.1f}" y2="{:.1f}" stroke="#ddd"/><text x="-5" y="{:.1f}" text-anchor="end">{}</text>'.format(CHART_W, y, y, y + 4, v // 10).encode())
+    for k in range(0, num, 180):
+        lt = time.localtime(t0 + k * h.step)
+        x = k * sx
+        writer.write('<line x1="{:.1f}" x2="{:.1f}" y1="0" y2="{}" stroke="#ddd"/><text x="{:.1f}" y="{}" text-anchor="middle">{:02}:{:02}</text>'.format(x, x, CHART_H, x, CHART_H + 15, lt[3], lt[4]).encode())
+
+    # Referenzlinien
+    for v, col in ((w_open, "#c60"), (w_close, "#06c")):
+        y = CHART_H - (v * 10 - lo) * sy
+        writer.write('<line x1="0" x2="{}" y1="{:.1f}" y2="{:.1f}" stroke="{}" stroke-dasharray="6 4"/>'.format(CHART_W, y, y, col).encode())
+    await writer.drain()
+
+    # Mittelwerte innen (rot) und aussen (blau)
+    for j, col in ((2, "#d00"), (5, "#00d")):
+        line = False
+        for k in range(num):
+            v = buf[((p + k) % h.n) * 6 + j]
+            if v == HIST_NONE:
+                if line: writer.write(b'"/>')
+                line = False
+            else:
+                if not line:
+                    writer.write('<polyline fill="none" stroke="{}" points="'.format(col).encode())
+                    line = True
+                writer.write('{:.1f},{:.1f} '.format(k * sx, CHART_H - (v - lo) * sy).encode())
+            if k % CHART_CHUNK == CHART_CHUNK - 1:
+                await writer.drain()
+        if line: writer.write(b'"/>')
+    writer.write(b"</svg>")
+    await writer.drain()
+
+# Regelung je Steller: Schaltspiele, Regelabweichung, Tastgrad, ohne ETag
+# /api/ctrl?pid=0|1 schaltet den Modus um und setzt die Statistik zurueck
+async def h_api_ctrl(writer, req):
+
+    global pid_on
+
+    m = req.query.get("pid")
+    if m in ("0", "1"):
+        pid_on = m == "1"
+        for r in RULES:
+            r.stat_reset()
+            if r.pid: r.pid.reset()
+        msg("Regelung " + ("stetig (PID)" if pid_on else "Zweipunkt"), 1)
+    writer.write(HTTP_JSON_OK)
+    writer.write(json.dumps({"pid": pid_on, "rules": {r.name: r.stats() for r in RULES}}).encode())
+    await writer.drain()
+
+# Relais-Zaehler, ohne ETag
+async def h_api_relays(writer, req):
+    writer.write(HTTP_JSON_OK)
+    writer.write(json.dumps({r.name: r.stats() for r in RELAYS}).encode())
+    await writer.drain()
+
+# Uhrenabgleich, ohne ETag
+async def h_api_clock(writer, req):
+    d = {"time": clock.iso(), "reads": clock.reads,
+         "next": max(time.ticks_diff(clk_next, time.ticks_ms()) // 1000, 0)}
+    d.update(clk_stat)
+    writer.write(HTTP_JSON_OK)
+    writer.write(json.dumps(d).encode())
+    await writer.drain()
+
+# WLAN-Zustand, ohne ETag
+async def h_api_net(writer, req):
+    d = {"up": webcon, "uptime": net_uptime(), "backoff": net_backoff}
+    d.update(net_stat)
+    writer.write(HTTP_JSON_OK)
+    writer.write(json.dumps(d).encode())
+    await writer.drain()
+
+# Laufzeitprofil, ohne ETag; ?on=0|1 schaltet, ?reset=1 setzt die Zaehler zurueck
+async def h_api_perf(writer, req):
+
+    global prof_on
+
+    m = req.query.get("on")
+    if m in ("0", "1") and prof_on != (m == "1"):
+        prof_on = m == "1"
+        prof.reset()
+        msg("Profil " + ("ein" if prof_on else "aus"), 1)
+    elif req.query.get("reset") == "1":
+        prof.reset()
+    writer.write(HTTP_JSON_OK)
+    writer.write(json.dumps({"on": prof_on, "busy": prof.busy, "span_ms": prof.span,
+                             "stages": {k: st.stats() for k, st in prof.stages.items()}}).encode())
+    await writer.drain()
+
+# Job-Statistik des Schedulers, ohne ETag
+async def h_api_sched(writer, req):
+    writer.write(HTTP_JSON_OK)
+    writer.write(json.dumps({j.name: j.stats() for j in sched.jobs}).encode())
+    await writer.drain()
+
+#-------------------------------------------------------------------------------
+# Routen-Tabelle, (Methode, Pfad) -> Handler
+
+# Ein Dict-Zugriff je Anfrage, neue Endpunkte kosten die anderen nichts.
+
+ROUTES = {
+    ("GET", "/"):                   h_page,
+    ("GET", "/refresh/all"):        h_page,
+    ("GET", "/minmax/erase"):       h_minmax_erase,
+    ("GET", "/msglog/erase"):       h_msglog_erase,
+    ("GET", "/errlog/erase"):       h_errlog_erase,
+    ("GET", "/wins/on"):            h_wins_on,
+    ("GET", "/wins/off"):           h_wins_off,
+    ("GET", "/winsauto/on"):        h_wins_auto,
+    ("GET", "/vent/on"):            h_vent_on,
+    ("GET", "/vent/off"):           h_vent_off,
+    ("GET", "/ventauto/on"):        h_vent_auto,
+    ("GET", "/heat/on"):            h_heat_on,
+    ("GET", "/heat/off"):           h_heat_off,
+    ("GET", "/heatauto/on"):        h_heat_auto,
+    ("GET", "/param/selfor"):       h_param_selfor,
+    ("GET", "/param/selback"):      h_param_selback,
+    ("GET", "/param/minus"):        h_param_minus,
+    ("GET", "/param/plus"):         h_param_plus,
+    ("GET", "/param/clear"):        h_param_clear,
+    ("GET", "/param/write"):        h_param_write,
+    ("GET", "/param/set"):          h_param_set,
+    ("POST", "/param/set"):         h_param_set,
+    ("GET", "/api/status"):         h_api_status,
+    ("GET", "/api/params"):         h_api_params,
+    ("GET", "/api/log"):            h_api_log,
+    ("GET", "/api/eeprom"):         h_api_eeprom,
+    ("GET", "/api/events"):         h_api_events,
+    ("GET", "/api/sched"):          h_api_sched,
+    ("GET", "/api/perf"):           h_api_perf,
+    ("GET", "/api/net"):            h_api_net,
+    ("GET", "/api/clock"):          h_api_clock,
+    ("GET", "/api/hist"):           h_api_hist,
+    ("GET", "/chart"):              h_chart,
+    ("GET", "/api/ctrl"):           h_api_ctrl,
+    ("GET", "/api/relays"):         h_api_relays,
+}
+
+HTTP_400 = b"HTTP/1.0 400 Bad Request\r\n\r\n"
+HTTP_404 = b"HTTP/1.0 404 Not Found\r\n\r\n"
+
+#-------------------------------------------------------------------------------
+# Webserver (Anfrage zerlegen und an den Handler aus der Routen-Tabelle geben)
+
+async def serve_client(reader, writer):
+
+  try:
+
+    # Webclient starten...
+
+    #print("----------- Webclient connected...")
+    # kaputte Anfrage (Kodierung, Content-Length, Inhalt zu kurz) wird mit 400 beantwortet
+    try:
+        req = await read_request(reader)
+    except (ValueError, UnicodeError, EOFError):
+        req = None
+    if GDEBUG and req : print("Request:", req.method, req.path, req.query)
+
+    if req is None:
+        writer.write(HTTP_400)
+        await writer.drain()
+    else:
+        h = ROUTES.get((req.method, req.path))
+        if h is None:
+            writer.write(HTTP_404)
+            await writer.drain()
+        elif prof_on:
+            pw = ProfWriter(writer)
+            t = time.ticks_us()
+            await h(pw, req)
+            # Start um die Wartezeit verschoben, es bleibt die Arbeit im Handler
+            prof.lap(h.__name__, time.ticks_add(t, pw.wait))
+        else:
+            await h(writer, req)
+
   except MemoryError as e:
     print(e)
     err_hndl(6)
 
+  finally:
+    # Verbindung in jedem Fall schliessen, auch wenn ein Handler abbricht
+    try:
+        writer.close()
+        await writer.wait_closed()
+    except OSError:
+        pass
+    #print("----------- disconnected.")
+
 #-------------------------------------------------------------------------------
 # Verbindung zum heimischen WLAN und damit Internet herstellen
 
 def wconnect(pr = True):
     
-    global webcon, efl
+    global webcon, efl, wlan, net_t_up
     
     if not pr: print("Netzwerk neu kontaktieren...")
     
@@ -1984,6 +3523,7 @@ def wconnect(pr = True):
         if pr: msg("Keine Netzwerkverbindung.", 0)
         #              |                    |
         if pr: printlcd(0, 1, "WARNUNG: Kein WLAN!", 0)
+        if pr: lcd_flush()
         efl = True
         webcon = False
     else:
@@ -1992,329 +3532,696 @@ def wconnect(pr = True):
         if pr: msg("Verbunden an " + status[0], 0)
         #              |                    |
         if pr: printlcd(0, 1, "WLAN - Verbunden.", 0)
+        if pr: lcd_flush()
         webcon = True
+        net_t_up = time.ticks_ms()
 
 #-------------------------------------------------------------------------------
-# main
-#-------------------------------------------------------------------------------
+# WLAN-Ueberwachung
 
-led_r.value(0)
-time.sleep(2)
+# Laeuft als Job im Scheduler (job_net) und blockiert nie: der Verbindungsaufbau
+# wird angestossen und wlan.status() alle NET_WAIT_MS abgefragt. Scheitert er,
+# wird mit exponentiell wachsender Pause (plus Zufallsanteil, damit nicht alle
+# Geraete nach einem Router-Neustart gleichzeitig anfragen) neu versucht.
+# Kommt die Verbindung zurueck, wird der Webserver neu aufgesetzt.
 
-print("")
-print(shstr2)
-print(shstr3)
-print("")
+NET_POLL_MS      = const(5000)     # Abfrage bei stehender Verbindung
+NET_WAIT_MS      = const(500)      # Abfrage waehrend des Verbindungsaufbaus
+NET_CONN_MS      = const(15000)    # max. Dauer eines Verbindungsaufbaus
+NET_BACKOFF_MIN  = const(5000)
+NET_BACKOFF_MAX  = const(600000)   # hoechstens 10 min Pause
+
+wlan             = None
+web_srv          = None
+net_t_up         = 0               # ticks_ms seit Verbindung steht
+net_t_conn       = None            # ticks_ms des laufenden Verbindungsaufbaus
+net_backoff      = NET_BACKOFF_MIN
+net_stat         = {"rssi": 0, "reconnects": 0, "attempts": 0, "fails": 0, "drops": 0}
+
+# Webserver aufsetzen, der alte wird vorher geschlossen
+async def web_start():
+
+    global web_srv
+
+    if web_srv is not None:
+        web_srv.close()
+        await web_srv.wait_closed()
+    web_srv = await asyncio.start_server(serve_client, "0.0.0.0", 80)
+
+def net_up():
+
+    global webcon, net_t_up, net_t_conn, net_backoff
+
+    webcon = True
+    net_t_up = time.ticks_ms()
+    net_t_conn = None
+    net_backoff = NET_BACKOFF_MIN
+    net_stat["reconnects"] += 1
+    ver[VER_ST] += 1
+    print("Verbunden an " + wlan.ifconfig()[0] + ".")
+    msg("Verbunden an " + wlan.ifconfig()[0], 1)
+    ntp_resolve()
+    asyncio.create_task(web_start())
+
+def net_down():
+
+    global webcon
 
-# Initialisieren
-led_r.value(1)
-led_y.value(0)
-
-# Interne Echtzeituhr initialisieren
-rtc = RTC()
-
-# GPIO 0 und 1 als I2C-Bus verwenden und scannen
-print("[I2C 01] Scanne nach Geräten auf I2C-Bus...")
-sda=machine.Pin(0)
-scl=machine.Pin(1)
-i2c=machine.I2C(0, sda=sda, scl=scl, freq=400000)
-i2cdevs = i2c.scan()
-i2cdevs_len = len(i2cdevs)
-print("[I2C 02] ...{} von {} gefunden.".format(i2cdevs_len, NUM_I2C))
-msg("{} von {} I2C-Geraeten gefunden.".format(i2cdevs_len, NUM_I2C), 0)
-
-if i2cdevs_len < NUM_I2C:
-    err_hndl(1)
-    print("[I2C 03] ERROR - Display nicht bereit.")
-    msg("Display (I2C) nicht bereit.", 0)
-    efl = True
-else:
-    msg("Display (I2C) bereit.", 0)
-    print("[I2C 03] Display bereit.")
-    # LCD-Display initialisieren, Gruesse uebermitteln
-    lcd = I2cLcd(i2c, 0x27, 4, 20)
-    time.sleep(4)
-    printlcd(0, 0, shstr1, 1)
-    printlcd(0, 1, shstr2, 0)
-    printlcd(0, 2, shstr3, 0)
-    printlcd(0, 3, shstr4, 0)
-    time.sleep(5)  
-    printlcd(0, 0, "I2C-Geraete - OK.", 1)
-
-# WLAN aktivieren, mit Internet verbinden
-wconnect()
-
-if(WEB_PERMIT):
-    print("[WEB xx] Webzugang manuell ausgesetzt.")
     webcon = False
+    net_stat["drops"] += 1
+    ver[VER_ST] += 1
+    err_hndl(3)
 
-if webcon:
-    print('[WEB 06] Setze Webserver auf...')
-    asyncio.create_task(asyncio.start_server(serve_client, "0.0.0.0", 80))
-stateis = ""
-
-# Tuerstatus
-tval = tuer.value()
-
-# Externe Echtzeituhr initialisieren
-print("[CLK 07] Initialisiere Echtzeituhr...")
-ertc = DS1307(i2c)
-time.sleep(1)
-ertc.halt(False) # Oszillator einschalten
-time.sleep(1)
-
-# Uhren stellen und Jahreszeit ermitteln
-act_clocks()
-printlcd(0, 2, "Echtzeituhr - OK.", 0)
-msg("Echtzeituhr (I2C) gestellt.", 0)
-print("[CLK 09] ...Echtzeituhr gestellt.")
-
-# EEPROM auf Echtzeituhr initialisieren
-print("[EPR 10] Initialisiere EEPROM...")
-eeprom = AT24C32N(i2c)
-time.sleep(1)
-
-if WRITE_EEPROM :
-    wepr()
+# Verbindungszeit in s, 0 ohne Verbindung
+def net_uptime():
+    return time.ticks_diff(time.ticks_ms(), net_t_up) // 1000 if webcon else 0
 
-print("[EPR 11] Lese EEPROM...")
-if GDEBUG :
-    print(eeprom.read(1024, 40))
-
-ere = eeprom.read(1024, 1)
-mot_duration = int(ere[0])
-if GDEBUG : print("mot_duration: {}".format(mot_duration))
-
-ere = eeprom.read(1025, 1)
-t_win_f_open = int(ere[0])
-if GDEBUG : print("t_win_f_open: {}".format(t_win_f_open))
-
-ere = eeprom.read(1026, 1)
-t_win_f_close = int(ere[0])
-if GDEBUG : print("t_win_f_close: {}".format(t_win_f_close))
-
-ere = eeprom.read(1027, 1)
-t_win_s_open = int(ere[0])
-if GDEBUG : print("t_win_s_open: {}".format(t_win_s_open))
-
-ere = eeprom.read(1028, 1)
-t_win_s_close = int(ere[0])
-if GDEBUG : print("t_win_s_close: {}".format(t_win_s_close))
-
-ere = eeprom.read(1029, 1)
-t_win_h_open = int(ere[0])
-if GDEBUG : print("t_win_h_open: {}".format(t_win_h_open))
-
-ere = eeprom.read(1030, 1)
-t_win_h_close = int(ere[0])
-if GDEBUG : print("t_win_h_close: {}".format(t_win_h_close))
-
-ere = eeprom.read(1031, 1)
-t_wcut_close = int(ere[0])
-if GDEBUG : print("t_wcut_close: {}".format(t_wcut_close))
-
-ere = eeprom.read(1032, 1)
-t_heat_off = int(ere[0])
-if GDEBUG : print("t_heat_off: {}".format(t_heat_off))
-
-ere = eeprom.read(1033, 1)
-t_heat_on = int(ere[0])
-if GDEBUG : print("t_heat_on: {}".format(t_heat_on))
-
-ere = eeprom.read(1034, 1)
-t_vc_on = int(ere[0])
-if GDEBUG : print("t_vc_on: {}".format(t_vc_on))
-
-ere = eeprom.read(1035, 1)
-t_vc_off = int(ere[0])
-if GDEBUG : print("t_vc_off: {}".format(t_vc_off))
-
-ere = eeprom.read(1036, 1)
-t_vo_on = int(ere[0])
-if GDEBUG : print("t_vo_on: {}".format(t_vo_on))
-
-ere = eeprom.read(1037, 1)
-t_vo_off = int(ere[0])
-if GDEBUG : print("t_vo_off: {}".format(t_vo_off))
-
-ere = eeprom.read(1038, 1)
-ct_hour = int(ere[0])
-if GDEBUG : print("ct_hour: {}".format(ct_hour))
-
-ere = eeprom.read(1039, 1)
-ct_min = int(ere[0])
-if GDEBUG : print("ct_min: {}".format(ct_min))
-
-ere = eeprom.read(1040, 1)
-s_t_corr_in = float(int(ere[0]))/10
-t_corr_in = s_t_corr_in - 3.0
-if GDEBUG : print("t_corr_in: {:1}".format(t_corr_in))
-
-ere = eeprom.read(1041, 1)
-s_t_corr_out = float(int(ere[0]))/10
-t_corr_out = s_t_corr_out - 3.0
-if GDEBUG : print("t_corr_out: {:1}".format(t_corr_out))
-
-# OneWire-Bus an GPIO17 anlegen und nach DS18B20-Sensoren suchen
-print("[TMP 12] Scanne nach Tempsensoren auf 1Wire-Bus...")
-ow = onewire.OneWire(Pin(17))
-ow.scan()
-ds = ds18x20.DS18X20(ow)
-roms = ds.scan()
-roms_len = len(roms)
-print("[TMP 13] ...{} von {} gefunden.".format(roms_len, NUM_1W))
-msg("{} von {} Tempsensoren (1W) gefunden.".format(roms_len, NUM_1W), 0)
-if roms_len < NUM_1W:
-    err_hndl(2)
-    printlcd(0, 3, "1W-Sensoren - NOK.", 0)
-    print("[TMP 14] ERROR - 1W-Sensoren - NOK.")
-    efl = True
-else:
-    printlcd(0, 3, "1W-Sensoren - OK.", 0)
-    print("[TMP 14] 1W-Sensoren - OK.")
-time.sleep(1)
-if efl:
-    print("[RNL 15] Runlevel bedingt erreicht.")
-else:
-    print("[RNL 15] Runlevel erreicht.")
-
-# Min/Max-Werte initialisieren
-read_temp(False)
-temp_min_innen = temp_innen
-temp_max_innen = temp_innen
-time.sleep(1)
+def job_net():
 
-#-------------------------------------------------------------------------------
+    global net_t_conn, net_backoff
 
-print("")
-#print("-------------------------------------------")
-print("Starte...")
-msg("Starte...", 1)
-lcd.clear()
-printlcd(0, 0, "Starte...", 1)
-#print("-------------------------------------------")
-print("")
-time.sleep(4)
-lcd.clear()
-led_y.value(1)
-led_g.value(0)
+    st = wlan.status()
+    if st == 3:
+        if not webcon: net_up()
+        try:
+            net_stat["rssi"] = wlan.status("rssi")
+        except:
+            pass
+        return NET_POLL_MS
+
+    if webcon: net_down()
+
+    # neuen Verbindungsaufbau anstossen
+    if net_t_conn is None:
+        print("Netzwerk neu kontaktieren...")
+        net_stat["attempts"] += 1
+        net_t_conn = time.ticks_ms()
+        wlan.active(True)
+        wlan.connect(ssid, password)
+        return NET_WAIT_MS
+
+    # laeuft noch
+    if st >= 0 and time.ticks_diff(time.ticks_ms(), net_t_conn) < NET_CONN_MS:
+        return NET_WAIT_MS
+
+    # gescheitert, Pause verdoppeln
+    net_t_conn = None
+    net_stat["fails"] += 1
+    d = net_backoff + randint(0, net_backoff // 4)
+    net_backoff = min(net_backoff * 2, NET_BACKOFF_MAX)
+    print("Keine Netzwerkverbindung, neuer Versuch in {} s.".format(d // 1000))
+    return d
 
 #-------------------------------------------------------------------------------
-# Main loop
+# main
+#-------------------------------------------------------------------------------
 
-async def main():
+# Start: Hardware initialisieren, Uhren stellen, EEPROM lesen, Sensoren suchen.
+# Laeuft nicht mehr beim Import, damit das Modul auch ohne Pico (gw2_sim) ladbar ist.
 
-    global wins_open, vent_on, heat_on, tval, tuer, msg_txt, err_txt, it, gc
+def boot():
 
-    while True:
-        
-        #-------------------------------------------------
+    global rtc, clock, sda, scl, i2c, i2cdevs, i2cdevs_len, efl, lcd, webcon, stateis, tval
+    global ertc, eeprom, pcache, evlog, rel_t_save, ow, ds, roms, roms_len, tsamples
+    global temp_min_innen, temp_max_innen
 
-        # Counter
-        gc = gc + 1
-        print("[",gc,"]")
-        # ein Durchlauf ohne Fensterheber ist etwa 1 Minute
-        # nach 7 Tagen ruecksetzen und Fehlerspeicher wie LEDs loeschen
-        if gc > 60 * 24 * 7 :
-            gc = 0
-            
-            err_txt[0] = ""
-            err_txt[1] = ""
-            err_txt[2] = ""
-        
-            led_r.value(1)
-            led_y.value(1)
-            led_g.value(1)
+    led_r.value(0)
+    time.sleep(2)
 
-        await asyncio.sleep(2)
+    print("")
+    print(shstr2)
+    print(shstr3)
+    print("")
 
-        #-------------------------------------------------
+    # Initialisieren
+    led_r.value(1)
+    led_y.value(0)
 
-        # Zeitstempel holen
-        it = rtc.datetime()
-        print("GHaus-RTC: {:02}.{:02}.{:04} {:02}:{:02}:{:02}".format(it[2], it[1], it[0], it[4], it[5], it[6]))
+    # Interne Echtzeituhr initialisieren
+    rtc = RTC()
+    clock = Clock(rtc)
+
+    # GPIO 0 und 1 als I2C-Bus verwenden und scannen
+    print("[I2C 01] Scanne nach Geräten auf I2C-Bus...")
+    sda=Pin(0)
+    scl=Pin(1)
+    i2c=I2C(0, sda=sda, scl=scl, freq=400000)
+    i2cdevs = i2c.scan()
+    i2cdevs_len = len(i2cdevs)
+    print("[I2C 02] ...{} von {} gefunden.".format(i2cdevs_len, NUM_I2C))
+    msg("{} von {} I2C-Geraeten gefunden.".format(i2cdevs_len, NUM_I2C), 0)
+
+    if i2cdevs_len < NUM_I2C:
+        err_hndl(1)
+        print("[I2C 03] ERROR - Display nicht bereit.")
+        msg("Display (I2C) nicht bereit.", 0)
+        efl = True
+    else:
+        msg("Display (I2C) bereit.", 0)
+        print("[I2C 03] Display bereit.")
+        # LCD-Display initialisieren, Gruesse uebermitteln
+        lcd = I2cLcd(i2c, 0x27, 4, 20)
+        time.sleep(4)
+        printlcd(0, 0, shstr1, 1)
+        printlcd(0, 1, shstr2, 0)
+        printlcd(0, 2, shstr3, 0)
+        printlcd(0, 3, shstr4, 0)
+        lcd_flush()
+        time.sleep(5)  
+        printlcd(0, 0, "I2C-Geraete - OK.", 1)
+        lcd_flush()
+
+    # WLAN aktivieren, mit Internet verbinden
+    wconnect()
+
+    if(WEB_PERMIT):
+        print("[WEB xx] Webzugang manuell ausgesetzt.")
+        webcon = False
 
-        #-------------------------------------------------
+    stateis = ""
 
-        # Tuerstand holen
-        tval = not(tuer.value())
+    # Tuerstatus
+    tval = not(tuer.value())
 
-        # Stell-Stati (FVHT) im Log anzeigen
-        print("Fenst:{} Venti:{} Heiz:{} Tuer:{} ".format(int(wins_open), int(vent_on), int(heat_on), int(not(tval))))
+    # Externe Echtzeituhr initialisieren
+    print("[CLK 07] Initialisiere Echtzeituhr...")
+    ertc = DS1307(i2c)
+    time.sleep(1)
+    ertc.halt(False) # Oszillator einschalten
+    time.sleep(1)
 
-        #-------------------------------------------------
+    # Uhren stellen und Jahreszeit ermitteln
+    act_clocks()
+    printlcd(0, 2, "Echtzeituhr - OK.", 0)
+    lcd_flush()
+    msg("Echtzeituhr (I2C) gestellt.", 0)
+    print("[CLK 09] ...Echtzeituhr gestellt.")
+
+    # EEPROM auf Echtzeituhr initialisieren
+    print("[EPR 10] Initialisiere EEPROM...")
+    eeprom = AT24C32N(i2c)
+    pcache = ParamCache(eeprom, EPR_CFG, EPR_CFG_SLOT, EPR_CFG_SLOTS)
+    evlog = EventLog(eeprom, EPR_EVLOG, EPR_EVLOG_SIZE)
+    if rel_load(): print("[EPR 10] Relais-Zaehler gelesen.")
+    rel_t_save = time.ticks_ms()
+    evlog.load()
+    print("[EPR 10] Ereignis-Log mit {} Eintraegen.".format(evlog.count()))
+    time.sleep(1)
 
-        # Temperatur holen
-        read_temp()
+    if WRITE_EEPROM :
+        lepr(False)
+        wepr()
 
-        #-------------------------------------------------
+    print("[EPR 11] Lese EEPROM...")
+    lepr()
+    if GDEBUG : print(api_params())
+
+    # OneWire-Bus an GPIO17 anlegen und nach DS18B20-Sensoren suchen
+    print("[TMP 12] Scanne nach Tempsensoren auf 1Wire-Bus...")
+    ow = onewire.OneWire(Pin(17))
+    ow.scan()
+    ds = ds18x20.DS18X20(ow)
+    roms = ds.scan()
+    roms_len = len(roms)
+    tsamples = [[0.0, 0] for rom in roms]
+    print("[TMP 13] ...{} von {} gefunden.".format(roms_len, NUM_1W))
+    msg("{} von {} Tempsensoren (1W) gefunden.".format(roms_len, NUM_1W), 0)
+    if roms_len < NUM_1W:
+        err_hndl(2)
+        printlcd(0, 3, "1W-Sensoren - NOK.", 0)
+        lcd_flush()
+        print("[TMP 14] ERROR - 1W-Sensoren - NOK.")
+        efl = True
+    else:
+        printlcd(0, 3, "1W-Sensoren - OK.", 0)
+        lcd_flush()
+        print("[TMP 14] 1W-Sensoren - OK.")
+    ds_resolution(SENS_RES)
+    time.sleep(1)
+    if efl:
+        print("[RNL 15] Runlevel bedingt erreicht.")
+    else:
+        print("[RNL 15] Runlevel erreicht.")
 
-        # aktuelle Werte auf LCD anzeigen (1)
-        showlcd_stats()
-        await asyncio.sleep(18)
+    # Min/Max-Werte initialisieren
+    ds_sample()
+    temp_min_innen = temp_innen
+    temp_max_innen = temp_innen
+    time.sleep(1)
 
-        #-------------------------------------------------
+    #-------------------------------------------------------------------------------
 
-        # Einstellparameter auf LCD zeigen
-        showlcd_params()
-        await asyncio.sleep(5)
+    print("")
+    #print("-------------------------------------------")
+    print("Starte...")
+    msg("Starte...", 1, EV_START)
+    printlcd(0, 0, "Starte...", 1)
+    lcd_flush()
+    #print("-------------------------------------------")
+    print("")
+    time.sleep(4)
+    printlcd(0, 0, "", 1)
+    lcd_flush()
+    led_y.value(1)
+    led_g.value(0)
 
-        #-------------------------------------------------
+#-------------------------------------------------------------------------------
+# Laufzeitprofil
+
+# Stufen sind die Jobs des Schedulers, Teilschritte darin (LCD-Seiten, Messwerte und
+# Regeln in job_ctrl) und die Web-Handler. Je Stufe feste Zaehler: Anzahl, Summe,
+# Min/Max und ein Histogramm mit Zweierpotenz-Klassen in us, daraus das p99 (Obergrenze
+# der Klasse). Nach PROF_WINDOW Laeufen werden Anzahl, Summe und Histogramm halbiert,
+# Min/Max gelten fuer das laufende und das vorige Fenster. Der Anteil an der Laufzeit
+# (Promille) wird je Minute in job_tick abgeschlossen, Teilschritte zaehlen nicht
+# zur Last, die steckt schon im Job. Bei Web-Handlern zaehlt nur die eigene Arbeit,
+# die Zeit in drain() (dort laufen andere Tasks und Jobs) wird abgezogen (ProfWriter).
+# Abgeschaltet kostet es je Stufe nur die Abfrage von prof_on.
+
+PROF_BINS        = const(24)        # Klassen bis 2^23 us (8 s)
+PROF_WINDOW      = const(256)
+
+prof_on          = PROF
+
+class Stage:
+
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent
+        self.hist = array("I", [0] * PROF_BINS)
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.sum = 0
+        self.min = 0
+        self.max = 0
+        self.min_prev = -1
+        self.max_prev = 0
+        self.acc = 0
+        self.share = 0
+        for i in range(PROF_BINS): self.hist[i] = 0
+
+    def add(self, us):
+        if self.n >= PROF_WINDOW:
+            self.n >>= 1
+            self.sum >>= 1
+            for i in range(PROF_BINS): self.hist[i] >>= 1
+            self.min_prev = self.min
+            self.max_prev = self.max
+            self.min = self.max = us
+        elif self.n == 0 or us < self.min:
+            self.min = us
+        if us > self.max: self.max = us
+        self.n += 1
+        self.sum += us
+        self.acc += us
+        b = 0
+        v = us
+        while v and b < PROF_BINS - 1:
+            v >>= 1
+            b += 1
+        self.hist[b] += 1
+
+    def p99(self):
+        k = self.n - self.n // 100
+        for b in range(PROF_BINS):
+            k -= self.hist[b]
+            if k <= 0: return min(1 << b, max(self.max, self.max_prev))
+        return self.max
+
+    def stats(self):
+        mn = self.min if self.min_prev < 0 else min(self.min, self.min_prev)
+        return {"n": self.n, "min": mn, "avg": self.sum // self.n if self.n else 0,
+                "max": max(self.max, self.max_prev), "p99": self.p99(),
+                "share": self.share, "in": self.parent}
+
+class Profiler:
+
+    def __init__(self):
+        self.stages = {}
+        self.reset()
+
+    def reset(self):
+        for st in self.stages.values(): st.reset()
+        self.t_span = time.ticks_ms()
+        self.span = 0
+        self.busy = 0
+
+    # Laufzeit seit t0 (ticks_us) der Stufe zuschreiben, Rueckgabe ist der neue Startpunkt
+    def lap(self, name, t0, parent = None):
+        t1 = time.ticks_us()
+        st = self.stages.get(name)
+        if st is None:
+            st = self.stages[name] = Stage(name, parent)
+        st.add(time.ticks_diff(t1, t0))
+        return t1
+
+    # Anteile der abgelaufenen Zeitspanne festhalten
+    def roll(self):
+        now = time.ticks_ms()
+        ms = time.ticks_diff(now, self.t_span)
+        if ms <= 0: return
+        self.t_span = now
+        self.span = ms
+        busy = 0
+        for st in self.stages.values():
+            st.share = st.acc // ms
+            st.acc = 0
+            if st.parent is None: busy += st.share
+        self.busy = busy
+
+    # die n Stufen mit dem groessten Anteil, ohne Teilschritte
+    def top(self, n):
+        l = sorted([st for st in self.stages.values() if st.parent is None], key = lambda st: -st.share)
+        return l[:n]
+
+prof = Profiler()
+
+# Schreiber fuer profilierte Anfragen, summiert die Wartezeit in drain()
+class ProfWriter:
+
+    def __init__(self, w):
+        self.w = w
+        self.wait = 0
+
+    def write(self, buf):
+        self.w.write(buf)
+
+    async def drain(self):
+        t = time.ticks_us()
+        await self.w.drain()
+        self.wait += time.ticks_diff(time.ticks_us(), t)
 
-        # Aktion (FVH) notwendig?
+#-------------------------------------------------------------------------------
+# Scheduler
+
+# Jeder Job hat eigene Periode, Prioritaet (0 = am wichtigsten) und Frist in ms.
+# Der Scheduler startet immer den faelligen Job mit der hoechsten Prioritaet.
+# Liefert ein Job eine Zahl zurueck, ist das die Wartezeit bis zum naechsten Lauf
+# (z.B. Wandlungszeit der Sensoren oder Standzeit einer LCD-Seite), sonst gilt
+# die Periode. Statistik je Job: Laeufe, Jitter (Startverzug gegenueber der
+# Faelligkeit) max und Summe, Fristverletzungen und laengste Laufzeit.
+
+class Job:
+
+    def __init__(self, name, fn, period, prio, deadline):
+        self.name = name
+        self.fn = fn
+        self.period = period
+        self.prio = prio
+        self.deadline = deadline
+        self.due = time.ticks_ms()
+        self.runs = 0
+        self.jit_max = 0
+        self.jit_sum = 0
+        self.over = 0
+        self.t_max = 0
+
+    def stats(self):
+        return {"period": self.period, "prio": self.prio, "deadline": self.deadline,
+                "runs": self.runs, "jit_max": self.jit_max,
+                "jit_avg": self.jit_sum // self.runs if self.runs else 0,
+                "over": self.over, "t_max": self.t_max}
+
+class Scheduler:
+
+    def __init__(self):
+        self.jobs = []
+        self.wake = asyncio.Event()
+
+    def add(self, name, fn, period, prio, deadline, delay = 0):
+        j = Job(name, fn, period, prio, deadline)
+        j.due = time.ticks_add(j.due, delay)
+        self.jobs.append(j)
+        return j
+
+    def job(self, name):
+        for j in self.jobs:
+            if j.name == name: return j
+        return None
+
+    # Job sofort faellig machen (z.B. nach Tuer- oder Parameteraenderung)
+    def kick(self, name):
+        j = self.job(name)
+        if j is not None:
+            j.due = time.ticks_ms()
+            self.wake.set()
+
+    async def run(self):
+        while True:
+            now = time.ticks_ms()
+            pick = None
+            wait = 60000
+            for j in self.jobs:
+                d = time.ticks_diff(j.due, now)
+                if d <= 0:
+                    if pick is None or j.prio < pick.prio: pick = j
+                elif d < wait:
+                    wait = d
+            if pick is None:
+                self.wake.clear()
+                try:
+                    await asyncio.wait_for_ms(self.wake.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
 
-        # Grenzwerte und Min/Max ueberpruefen
-        ex_vals()
+            jit = time.ticks_diff(now, pick.due)
+            if prof_on: t0 = time.ticks_us()
+            try:
+                r = pick.fn()
+            except Exception as e:
+                print("Job {}: {}".format(pick.name, e))
+                r = None
+            if prof_on: prof.lap(pick.name, t0)
+            t1 = time.ticks_ms()
+            dt = time.ticks_diff(t1, now)
+
+            pick.runs += 1
+            pick.jit_sum += jit
+            if jit > pick.jit_max: pick.jit_max = jit
+            if dt > pick.t_max: pick.t_max = dt
+            if jit + dt > pick.deadline: pick.over += 1
+
+            if r is not None:
+                pick.due = time.ticks_add(t1, r)
+            else:
+                # fester Takt, nach langem Verzug aber nicht nachholen
+                pick.due = time.ticks_add(pick.due, pick.period)
+                if time.ticks_diff(pick.due, t1) < 0: pick.due = time.ticks_add(t1, pick.period)
 
-        # Fensteroeffnung
-        gh_win()
+            # Webserver und Fensterheber zwischen den Jobs laufen lassen
+            await asyncio.sleep_ms(0)
 
-        # Ventilator
-        gh_vent()
+sched = Scheduler()
 
-        # Heizung
-        gh_heat()
+#-------------------------------------------------------------------------------
+# Jobs
+
+# Periode, Prioritaet und Frist je Job in ms
+SENS_PRIO        = const(0)
+CTRL_PERIOD      = const(5000)      # Regelung reagiert binnen Sekunden
+CTRL_PRIO        = const(1)
+TICK_PERIOD      = const(60000)     # Zaehler, Uhrzeit, Debug-Ausgaben
+TICK_PRIO        = const(2)
+LCD_PRIO         = const(3)
+FLUSH_PERIOD     = const(10000)
+FLUSH_PRIO       = const(4)
+NET_PRIO         = const(5)
+CLK_PERIOD       = const(60000)     # Sommerzeit, Jahreszeit, NTP-Abgleich faellig?
+CLK_PRIO         = const(6)
+
+# LCD-Seiten mit Standzeit in ms, wie bisher im Wechsel, die Profil-Seite nur bei prof_on
+LCD_PAGES = ((showlcd_stats, 18000), (showlcd_params, 5000), (showlcd_stats, 17000), (errlcd, 5000),
+             (showlcd_perf, 5000))
+lcd_page = 0
+
+# Tempsensoren: erst Wandlung anstossen, nach der Wandlungszeit die Werte holen
+ds_busy = False
+
+def job_sense():
+
+    global ds_busy
+
+    try:
+        if not ds_busy:
+            ds.convert_temp()
+            ds_busy = True
+            return ds_conv_ms()
+        ds_busy = False
+        ds_publish()
+    except Exception as e:
+        ds_busy = False
+        print(e)
+        err_hndl(2)
+    # Rest der Periode
+    return SENS_PERIOD * 1000 - ds_conv_ms()
+
+# Aktion (FVH) notwendig?
+def job_ctrl():
+
+    global it
+
+    p = prof_on
+    if p: t = time.ticks_us()
+
+    it = clock.now()
+
+    # Tuerstand kommt vom Tuer-Task (door_task)
+
+    # Temperatur aus dem Messwert-Puffer holen
+    read_temp(False)
+
+    # Grenzwerte und Min/Max ueberpruefen
+    ex_vals()
+    if p: t = prof.lap("read_temp", t, "ctrl")
+
+    gh_wdtime()
+    gh_rules()
+    gh_tsave()
+    if p: prof.lap("gh_rules", t, "ctrl")
+
+def job_tick():
+
+    global gc, it
+
+    # Counter, ein Takt ist 1 Minute
+    # nach 7 Tagen ruecksetzen und Fehlerspeicher wie LEDs loeschen
+    gc = gc + 1
+    print("[",gc,"]")
+    if gc > 60 * 24 * 7 :
+        gc = 0
 
-        await asyncio.sleep(4)
+        err_txt[0] = ""
+        err_txt[1] = ""
+        err_txt[2] = ""
 
-        #-------------------------------------------------
+        led_r.value(1)
+        led_y.value(1)
+        led_g.value(1)
 
-        # Debug-Ausgaben der Logs ins Terminal bei Bedarf
-        if GDEBUG: showlogs()
+    # Zeitstempel holen
+    it = clock.now()
+    print("GHaus-RTC: " + clock.long())
+
+    # Stell-Stati (FVHT) im Log anzeigen
+    print("Fenst:{} Venti:{} Heiz:{} Tuer:{} ".format(int(wins_open), int(vent_on), int(heat_on), int(not(tval))))
+    print("Innen-Temp: {}".format(temp_innen))
+    print("Außen-Temp: {}".format(temp_aussen))
+
+    # Debug-Ausgaben der Logs und Job-Statistik ins Terminal bei Bedarf
+    if GDEBUG:
+        showlogs()
+        for j in sched.jobs:
+            print("Job {}: {}".format(j.name, j.stats()))
+
+    if prof_on: prof.roll()
+
+    print("")
+    print("----")
+    print("")
+
+# LCD-Seiten reihum, Rueckgabe ist die Standzeit der Seite
+def job_lcd():
+
+    global lcd_page
+
+    f, ms = LCD_PAGES[lcd_page]
+    lcd_page = (lcd_page + 1) % len(LCD_PAGES)
+    if f is showlcd_perf and not prof_on:
+        f, ms = LCD_PAGES[lcd_page]
+        lcd_page = (lcd_page + 1) % len(LCD_PAGES)
+    if prof_on:
+        t = time.ticks_us()
+        f()
+        prof.lap(f.__name__, t, "lcd")
+    else:
+        f()
+    return ms
 
-        # Terminalausgaben abschliessen
-        print("")
-        print("----")
-        print("")
+# geaenderte Parameter nach der Ruhezeit ins EEPROM, angefangene Log-Seite sichern
+def job_flush():
+    pcache.poll()
+    evlog.poll()
+    rel_poll()
 
-        #-------------------------------------------------
+#-------------------------------------------------------------------------------
+# Tuerkontakt (Oberlicht) per Interrupt
 
-        # Tuerstand holen
-        tval = not(tuer.value())
+# Die ISR setzt nur ein Flag, Entprellen und Auswerten laufen im Tuer-Task.
+# Der Pegel muss DOOR_DEBOUNCE_MS lang stabil sein, dann wird tval gesetzt,
+# die Aenderung gemeldet und die Regelung (Ventilator-Schwellen) sofort angestossen.
 
-        # aktuelle Werte auf LCD anzeigen (2)
-        showlcd_stats()
-        await asyncio.sleep(17)
+DOOR_DEBOUNCE_MS = const(50)
 
-        #-------------------------------------------------
+door_flag = asyncio.ThreadSafeFlag()
 
-        # Fehler-Bildschirm auf LCD anzeigen
-        errlcd()
-        await asyncio.sleep(5)
+def door_irq(pin):
+    door_flag.set()
 
-        #-------------------------------------------------
+async def door_task():
 
-        # Falls nicht im WLAN und nicht permitted, hier versuchen
-        # wieder Verbindung aufzunehmen, still und nur mit Wiederholungsmeldung in der Konsole
-        if webcon == False and WEB_PERMIT == False:
-            wconnect(False)
+    global tval
 
-        led_g.value(1)
+    while True:
+        await door_flag.wait()
+
+        # warten, bis der Kontakt nicht mehr prellt
+        tv = not(tuer.value())
+        while True:
+            await asyncio.sleep_ms(DOOR_DEBOUNCE_MS)
+            t2 = not(tuer.value())
+            if t2 == tv: break
+            tv = t2
+
+        if tv != tval:
+            tval = tv
+            ver[VER_ST] += 1
+            if tval:
+                print("Tuer zu.")
+                msg("Tuer zu", 1, EV_DOOR_CLOSE)
+            else:
+                print("Tuer auf.")
+                msg("Tuer auf", 1, EV_DOOR_OPEN)
+            sched.kick("ctrl")
 
-try:
-    asyncio.run(main())
-finally:
-    asyncio.new_event_loop()
+#-------------------------------------------------------------------------------
+# Main loop
+
+async def main():
+
+    if webcon:
+        print('[WEB 06] Setze Webserver auf...')
+        asyncio.create_task(web_start())
+
+    # Jobs nach Prioritaet, die Regelung erst nach dem ersten Messwert
+    sched.add("sense", job_sense, SENS_PERIOD * 1000, SENS_PRIO, SENS_PERIOD * 1000)
+    sched.add("ctrl",  job_ctrl,  CTRL_PERIOD,  CTRL_PRIO,  1000, SENS_PERIOD * 1000)
+    sched.add("tick",  job_tick,  TICK_PERIOD,  TICK_PRIO,  5000)
+    sched.add("lcd",   job_lcd,   5000,         LCD_PRIO,   2000)
+    sched.add("flush", job_flush, FLUSH_PERIOD, FLUSH_PRIO, 5000)
+    sched.add("clock", job_clock, CLK_PERIOD,   CLK_PRIO,   5000)
+
+    # WLAN-Ueberwachung, nicht bei manuell ausgesetztem Webzugang
+    if not WEB_PERMIT:
+        sched.add("net", job_net, NET_POLL_MS, NET_PRIO, 1000, NET_POLL_MS)
+
+    # Tuerkontakt auf beide Flanken, Stand vom Start gilt bis zur ersten Flanke
+    asyncio.create_task(door_task())
+    tuer.irq(door_irq, Pin.IRQ_RISING | Pin.IRQ_FALLING)
+
+    await sched.run()
+
+def run():
+    boot()
+    try:
+        asyncio.run(main())
+    finally:
+        asyncio.new_event_loop()
+
+if __name__ == "__main__":
+    run()
 
 #-------------------------------------------------------------------------------
 # physical end 
@@ -0,0 +1,349 @@
+#------------------------------------------------------------------------------#
+#                                                                              #
+# Project:           Greenhouse control with Raspberry Pi Pico W               #
+# Module:            gw2_season.py (Saison im Zeitraffer)                      #
+#                                                                              #
+# Laesst die unveraenderte Regelung aus gw2_pico.py auf simulierter Hardware   #
+# (gw2_sim) gegen ein einfaches Waermemodell des Gewaechshauses laufen, in     #
+# Minutenschritten auf virtueller Zeit. Eine Saison dauert Sekunden.           #
+#                                                                              #
+# Aufruf:   python gw2_season.py [--start 2025-03-01] [--days 245] [--seed 1]  #
+#                  [--weather datei.csv] [--csv verlauf.csv] [--every 15]      #
+#                  [--actions schaltungen.csv] [--set name=wert] [--pid]       #
+#                                                                              #
+#------------------------------------------------------------------------------#
+
+import sys, time, math, random, bisect, calendar, asyncio, contextlib
+
+import gw2_sim
+
+#-------------------------------------------------------------------------------
+# Wetter
+
+# Synthetisch (Mitteldeutschland, 51 Grad Nord, 10 Grad Ost): Monatsmittel der
+# Lufttemperatur, Tagesgang mit Minimum bei Sonnenaufgang und Maximum um 15 Uhr,
+# Abweichung von Tag zu Tag als AR(1)-Prozess, Bewoelkung je Tag. Die Einstrahlung
+# auf die Horizontale kommt aus dem Sonnenstand (Haurwitz, klarer Himmel) und wird
+# mit der Bewoelkung gemindert (Kasten-Czeplak). Mit gleichem seed gleiches Wetter.
+
+MONTH_T          = (0.5, 1.5, 5.0, 9.0, 13.5, 16.5, 18.5, 18.0, 14.5, 10.0, 5.0, 1.5)
+MONTH_A          = (2.5, 3.5, 5.0, 6.0, 6.5, 6.5, 6.5, 6.5, 6.0, 4.5, 3.0, 2.5)  # halbe Tagesspanne
+
+class Weather:
+
+    def __init__(self, seed = 1, lat = 51.0, lon = 10.0):
+        self.rnd = random.Random(seed)
+        self.lat = math.radians(lat)
+        self.lon = lon
+        self.days = {}
+        self.last = None
+
+    # Abweichung und Bewoelkung je Tag, fortlaufend erzeugt
+    def day(self, d):
+        if d not in self.days:
+            if self.last is None or d < self.last:
+                a = self.rnd.gauss(0, 2.5)
+            else:
+                a = self.days[self.last][0]
+                for k in range(self.last, d):
+                    a = 0.8 * a + self.rnd.gauss(0, 1.5)
+            c = min(1.0, max(0.0, self.rnd.betavariate(1.2, 1.2) + 0.04 * a * (1 if self.rnd.random() < 0.5 else -1)))
+            self.days[d] = (a, c)
+            if self.last is None or d > self.last: self.last = d
+        return self.days[d]
+
+    def mean(self, utc):
+        t = time.gmtime(int(utc))
+        x = t[1] - 1 + (t[2] - 15) / 30.4
+        m0 = int(math.floor(x)) % 12
+        f = x - math.floor(x)
+        return MONTH_T[m0] + (MONTH_T[(m0 + 1) % 12] - MONTH_T[m0]) * f, \
+               MONTH_A[m0] + (MONTH_A[(m0 + 1) % 12] - MONTH_A[m0]) * f, t[7]
+
+    def solar(self, utc, doy, cloud):
+        h = (utc % 86400) / 3600 + self.lon / 15
+        dec = math.radians(23.44) * math.sin(2 * math.pi * (284 + doy) / 365)
+        s = math.sin(self.lat) * math.sin(dec) + math.cos(self.lat) * math.cos(dec) * math.cos(math.radians(15 * (h - 12)))
+        if s <= 0.01: return 0.0
+        return 1098 * s * math.exp(-0.057 / s) * (1 - 0.75 * cloud ** 3.4)
+
+    # Aussentemperatur (Grad) und Einstrahlung (W/m2) zur UTC-Zeit
+    def at(self, utc):
+        d = int(utc // 86400)
+        f = (utc % 86400) / 86400
+        a0, c = self.day(d)
+        a1 = self.day(d + 1)[0]
+        mean, amp, doy = self.mean(utc)
+        h = f * 24 + self.lon / 15
+        amp *= 1 - 0.5 * c
+        t = mean + a0 + (a1 - a0) * f + amp * math.cos(2 * math.pi * (h - 15) / 24)
+        return t, self.solar(utc, doy, c)
+
+# Aufgezeichnet: CSV mit UTC-Sekunden, Aussentemperatur, Einstrahlung je Zeile
+# (beliebiges Raster, dazwischen linear), Kopfzeile und #-Zeilen werden uebersprungen.
+class WeatherCsv:
+
+    def __init__(self, path):
+        self.t = []
+        self.v = []
+        with open(path) as f:
+            for line in f:
+                p = line.strip().split(",")
+                if len(p) < 3 or line.startswith("#"): continue
+                try:
+                    self.t.append(float(p[0]))
+                    self.v.append((float(p[1]), float(p[2])))
+                except ValueError:
+                    continue
+        if not self.t: raise ValueError("{}: keine Wetterdaten".format(path))
+
+    def at(self, utc):
+        i = bisect.bisect_right(self.t, utc)
+        if i == 0: return self.v[0]
+        if i == len(self.t): return self.v[-1]
+        t0, t1 = self.t[i - 1], self.t[i]
+        f = (utc - t0) / (t1 - t0)
+        (a0, s0), (a1, s1) = self.v[i - 1], self.v[i]
+        return a0 + (a1 - a0) * f, s0 + (s1 - s0) * f
+
+#-------------------------------------------------------------------------------
+# Gewaechshaus als ein Waermeknoten
+
+# C dT/dt = Solargewinn + Heizung - (UA Huelle + UA Luftwechsel) * (T - Taussen)
+# Luftwechsel je Stunde: Undichtigkeit, voll offene Fenster (anteilig nach Stellung),
+# offene Tuer, dazu der Volumenstrom des Ventilators. Geloest exakt je Schritt
+# (Sprungantwort), damit auch grosse Schritte stabil bleiben.
+# Vorgaben fuer ein kleines Hobby-Gewaechshaus, 3 x 4 m, Einfachglas.
+
+AIR_J_M3K        = 1200.0    # Waermekapazitaet Luft je m3
+
+class Greenhouse:
+
+    def __init__(self, t0 = 10.0, floor = 12.0, glass = 40.0, u = 5.8, cap = 1.5e6, gain = 0.35,
+                 vol = 30.0, ach = 1.0, win_ach = 20.0, door_ach = 10.0, fan_m3h = 600.0, heat_w = 2000.0):
+        self.t = t0
+        self.floor = floor
+        self.ua = glass * u
+        self.cap = cap
+        self.gain = gain          # wirksamer Anteil der Einstrahlung (Transmission x Absorption)
+        self.vol = vol
+        self.ach = ach
+        self.win_ach = win_ach
+        self.door_ach = door_ach
+        self.fan_m3h = fan_m3h
+        self.heat_w = heat_w
+        self.e_heat = 0.0         # Heizenergie in J
+
+    def step(self, dt, t_out, solar, win, fan, heat, door):
+        m3h = self.vol * (self.ach + win * self.win_ach + door * self.door_ach) + fan * self.fan_m3h
+        ua = self.ua + AIR_J_M3K * m3h / 3600
+        q = self.floor * self.gain * solar + heat * self.heat_w
+        teq = t_out + q / ua
+        self.t = teq + (self.t - teq) * math.exp(-dt * ua / self.cap)
+        self.e_heat += heat * self.heat_w * dt
+        return self.t
+
+#-------------------------------------------------------------------------------
+# Tuer (Oberlicht): an warmen Tagen tagsueber offen
+
+DOOR_OPEN_T      = 16.0
+DOOR_HOURS       = (9, 19)
+
+def door_auto(lt, t_out):
+    return DOOR_HOURS[0] <= lt[3] < DOOR_HOURS[1] and t_out >= DOOR_OPEN_T
+
+#-------------------------------------------------------------------------------
+# Auswertung je Monat
+
+class Month:
+
+    def __init__(self, key):
+        self.key = key
+        self.n = 0
+        self.t_min = None
+        self.t_max = None
+        self.t_sum = 0.0
+        self.below = 0
+        self.above = 0
+        self.sw = {"win": 0, "vent": 0, "heat": 0}
+        self.heat_min = 0
+
+    def row(self, step):
+        h = step / 3600
+        return "{}  {:6.1f} {:6.1f} {:6.1f}  {:7.1f} {:7.1f}  {:5d} {:5d} {:5d}  {:7.1f}".format(
+            self.key, self.t_min, self.t_max, self.t_sum / self.n, self.below * h, self.above * h,
+            self.sw["win"], self.sw["vent"], self.sw["heat"], self.heat_min * step / 3600)
+
+class NullOut:
+
+    def write(self, s):
+        return len(s)
+
+    def flush(self):
+        pass
+
+#-------------------------------------------------------------------------------
+# Zeitraffer
+
+STEP_S           = 60         # ein Regelschritt je Minute
+
+STATES = (("win", "wins_open"), ("vent", "vent_on"), ("heat", "heat_on"))
+
+async def replay(gw, board, weather, house, t_end, every = 15, trace = None, actions = None, door = True):
+
+    st = board.st
+    door_pin = board.pins[15]
+    gw.tuer.irq(gw.door_irq, gw.Pin.IRQ_RISING | gw.Pin.IRQ_FALLING)
+    asyncio.create_task(gw.door_task())
+
+    months = []
+    last = {k: gw.__dict__[v] for k, v in STATES}
+    n = 0
+    t_prev = board.utc()
+    while t_prev < t_end:
+        u = board.utc()
+        t_out, sun = weather.at(u)
+
+        # Stellglieder wirken bis jetzt, Relais aktiv low
+        win = gw.wdrive.position()
+        fan = gw.rel05.value() == 0
+        heat = gw.rel06.value() == 0
+        opn = not gw.tval
+        t_in = house.step(u - t_prev, t_out, sun, win, fan, heat, opn)
+        t_prev = u
+
+        # Fuehler messen den wahren Wert, die Korrektur ist ihr Fehler
+        board.sensors[0].temp = t_in - gw.tcorr_in
+        board.sensors[1].temp = t_out - gw.tcorr_out
+
+        lt = time.gmtime(int(board.local()))
+        if door and door_auto(lt, t_out) != opn: door_pin.drive(not opn)
+
+        # Messen wie job_sense (Wandlung ohne Warten), dann regeln
+        gw.job_sense()
+        st.sleep(gw.ds_conv_ms() / 1000)
+        gw.job_sense()
+        gw.job_ctrl()
+        if n % 10 == 0: gw.job_flush()
+        if n % 60 == 0: gw.job_clock()
+
+        key = "{:04d}-{:02d}".format(lt[0], lt[1])
+        if not months or months[-1].key != key: months.append(Month(key))
+        m = months[-1]
+        m.n += 1
+        m.t_sum += t_in
+        if m.t_min is None or t_in < m.t_min: m.t_min = t_in
+        if m.t_max is None or t_in > m.t_max: m.t_max = t_in
+        if t_in < gw.ex_unten: m.below += 1
+        if t_in > gw.ex_oben: m.above += 1
+        if heat: m.heat_min += 1
+        for k, v in STATES:
+            s = gw.__dict__[v]
+            if s != last[k]:
+                last[k] = s
+                m.sw[k] += 1
+                if actions is not None:
+                    actions.write("{:04d}-{:02d}-{:02d} {:02d}:{:02d},{},{},{:.1f},{:.1f}\n".format(
+                        lt[0], lt[1], lt[2], lt[3], lt[4], k, int(s), t_in, t_out))
+
+        if trace is not None and n % every == 0:
+            trace.write("{:04d}-{:02d}-{:02d} {:02d}:{:02d},{:.2f},{:.2f},{:.0f},{:.2f},{},{},{},{:.1f}\n".format(
+                lt[0], lt[1], lt[2], lt[3], lt[4], t_in, t_out, sun, gw.wdrive.position(),
+                int(gw.vent_on), int(gw.heat_on), int(opn), gw.temp_innen))
+        n += 1
+        await asyncio.sleep(STEP_S - gw.ds_conv_ms() / 1000)
+    return months, n
+
+#-------------------------------------------------------------------------------
+
+def parse_date(s):
+    y, m, d = s.split("-")
+    return calendar.timegm((int(y), int(m), int(d), 0, 0, 0, 0, 0, 0))
+
+def main(argv):
+
+    start = parse_date("2025-03-01")
+    days = 245
+    seed = 1
+    wpath = csv = apath = None
+    every = 15
+    pid = False
+    door = True
+    sets = {}
+    i = 1
+    try:
+        while i < len(argv):
+            a = argv[i]
+            v = argv[i + 1] if i + 1 < len(argv) else None
+            if a == "--start": start = parse_date(v)
+            elif a == "--days": days = float(v)
+            elif a == "--seed": seed = int(v)
+            elif a == "--weather": wpath = v
+            elif a == "--csv": csv = v
+            elif a == "--every": every = int(v)
+            elif a == "--actions": apath = v
+            elif a == "--set":
+                k, x = v.split("=", 1)
+                sets[k] = x
+            elif a == "--pid":
+                pid = True
+                i -= 1
+            elif a == "--nodoor":
+                door = False
+                i -= 1
+            else:
+                raise ValueError(a)
+            i += 2
+    except (ValueError, TypeError):
+        print("Aufruf: python gw2_season.py [--start JJJJ-MM-TT] [--days n] [--seed n] [--weather datei.csv]")
+        print("        [--csv verlauf.csv] [--every min] [--actions schaltungen.csv] [--set name=wert] [--pid] [--nodoor]")
+        return 2
+
+    weather = WeatherCsv(wpath) if wpath else Weather(seed)
+    loop = gw2_sim.VirtualLoop()
+    asyncio.set_event_loop(loop)
+    # Start um Mitternacht Ortszeit, ohne WLAN (kein NTP, Webserver aus)
+    board = gw2_sim.Board(utc = start - gw2_sim.eu_offset(start), source = loop.time)
+    board.wlan.ap = False
+    gw2_sim.install(board)
+
+    house = Greenhouse(t0 = weather.at(board.utc())[0])
+    t0 = time.monotonic()
+    with contextlib.redirect_stdout(NullOut()):
+        gw = gw2_sim.load()
+        board.pins[15].level = 0                # Tuer zu
+        board.sensors[0].temp = house.t - gw.tcorr_in
+        board.sensors[1].temp = house.t - gw.tcorr_out
+        gw.boot()
+        gw.pid_on = pid
+        err = gw.param_set(sets) if sets else None
+    if err:
+        print(err)
+        return 2
+
+    trace = open(csv, "w") if csv else None
+    acts = open(apath, "w") if apath else None
+    if trace: trace.write("zeit,t_innen,t_aussen,sonne,fenster,venti,heizung,tuer,t_regler\n")
+    if acts: acts.write("zeit,steller,ein,t_innen,t_aussen\n")
+    try:
+        with contextlib.redirect_stdout(NullOut()):
+            months, n = loop.run_until_complete(replay(gw, board, weather, house, board.utc() + days * 86400,
+                                                       every, trace, acts, door))
+    finally:
+        if trace: trace.close()
+        if acts: acts.close()
+
+    print("{} Schritte ({:.0f} Tage) in {:.1f} s".format(n, n * STEP_S / 86400, time.monotonic() - t0))
+    print("Band {} .. {} Grad (ex_unten/ex_oben), Stunden ausserhalb unten/oben".format(gw.ex_unten, gw.ex_oben))
+    print("Monat      T min  T max  T mitt  h unten  h oben  Fenst Venti  Heiz  Heiz h")
+    for m in months:
+        print(m.row(STEP_S))
+    print("Heizenergie {:.1f} kWh".format(house.e_heat / 3600000))
+    print("Relais    Schaltungen  Ein (h)  Kurz")
+    for r in gw.RELAYS:
+        s = r.stats()
+        print("{:8s}  {:11d}  {:7.1f}  {:4d}".format(r.name, s["switches"], s["on_s"] / 3600, s["short"]))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
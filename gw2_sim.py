@@ -0,0 +1,970 @@
+#------------------------------------------------------------------------------#
+#                                                                              #
+# Project:           Greenhouse control with Raspberry Pi Pico W               #
+# Module:            gw2_sim.py (Simulation der Hardware unter CPython)        #
+#                                                                              #
+# Stellt machine, onewire, ds18x20, network, micropython, uctypes und         #
+# uasyncio als simulierte Module bereit, damit gw2_pico.py auf dem PC (Linux)  #
+# laeuft.                                                                      #
+# Der I2C-Bus arbeitet byte-genau mit DS1307, AT24C32N und PCF8574/HD44780     #
+# und zaehlt Transaktionen und Buszeit.                                        #
+#                                                                              #
+# Aufruf:   python gw2_sim.py [Sekunden]                                       #
+#                                                                              #
+#------------------------------------------------------------------------------#
+
+import sys, types, time, asyncio, selectors, struct, calendar, importlib, ctypes
+import gc as _gc
+import tracemalloc
+
+#-------------------------------------------------------------------------------
+# Simulierte Zeit
+
+# Monotone Zeit in s = Zeitquelle + Vorlauf. Blockierendes Warten (time.sleep,
+# sleep_ms) wartet nicht, sondern stellt nur den Vorlauf weiter, ebenso die
+# Buszeit der I2C-Transfers. Die Zeitquelle laesst sich austauschen (z.B. gegen
+# die Uhr einer Ereignisschleife mit virtueller Zeit).
+
+TICKS_PERIOD     = 1 << 30       # ticks_ms/ticks_us laufen wie auf dem Pico bei 2^30 ueber
+TICKS_HALF       = TICKS_PERIOD >> 1
+
+NTP_DELTA        = 2208988800    # 1900-01-01 bis 1970-01-01 in s
+
+class SimTime:
+
+    def __init__(self, source = time.monotonic):
+        self.source = source
+        self.t0 = source()
+        self.warp = 0.0
+        self.sleeps = 0
+
+    def mono(self):
+        return self.source() - self.t0 + self.warp
+
+    def sleep(self, s):
+        if s > 0: self.warp += s
+        self.sleeps += 1
+
+    def ticks_ms(self):
+        return int(self.mono() * 1000) % TICKS_PERIOD
+
+    def ticks_us(self):
+        return int(self.mono() * 1000000) % TICKS_PERIOD
+
+def ticks_diff(a, b):
+    return ((a - b + TICKS_HALF) % TICKS_PERIOD) - TICKS_HALF
+
+def ticks_add(a, d):
+    return (a + d) % TICKS_PERIOD
+
+def bcd(v):
+    return (v // 10) << 4 | (v % 10)
+
+def dec(v):
+    return (v >> 4) * 10 + (v & 0x0F)
+
+# MicroPython rechnet ohne Zeitzone: mktime nimmt 8 Werte, localtime = gmtime
+def mp_mktime(t):
+    return calendar.timegm((t[0], t[1], t[2], t[3], t[4], t[5], 0, 0, 0))
+
+def mp_gmtime(secs):
+    return tuple(time.gmtime(int(secs)))[:8]
+
+# Mitteleuropaeische Zeit mit Sommerzeit (letzter Sonntag im Maerz/Oktober, 1:00 UTC)
+def eu_offset(utc):
+    y = time.gmtime(int(utc))[0]
+    def last_sunday(m):
+        wd = time.gmtime(calendar.timegm((y, m, 31, 1, 0, 0, 0, 0, 0)))[6]
+        return calendar.timegm((y, m, 31 - (wd + 1) % 7, 1, 0, 0, 0, 0, 0))
+    return 7200 if last_sunday(3) <= utc < last_sunday(10) else 3600
+
+#-------------------------------------------------------------------------------
+# I2C-Bus
+
+# Jeder Transfer wird mit seinen Bits gezaehlt: Start, Adressbyte und je Datenbyte
+# 9 Bit (8 + ACK), Stopp. Ein Speicherzugriff (readfrom_mem) besteht aus Schreiben
+# der Speicheradresse, wiederholtem Start und Lesen in einer Transaktion.
+# Antwortet kein Geraet (oder das EEPROM schreibt noch), gibt es OSError(5) wie
+# auf dem Pico. Mit stall = True laeuft die simulierte Zeit um die Buszeit weiter.
+
+I2C_EIO          = 5
+
+class SimI2CBus:
+
+    def __init__(self, st):
+        self.st = st
+        self.devs = {}
+        self.names = {}
+        self.freq = 100000
+        self.stall = True
+        self.reset_stats()
+
+    def attach(self, addr, dev, name):
+        self.devs[addr] = dev
+        self.names[addr] = name
+        self.per[addr] = [0, 0, 0.0]
+
+    def reset_stats(self):
+        self.xfers = 0
+        self.nbytes = 0
+        self.nacks = 0
+        self.us = 0.0
+        self.per = {a: [0, 0, 0.0] for a in self.devs}
+
+    def _account(self, addr, nbytes, bits):
+        us = bits * 1000000 / self.freq
+        self.xfers += 1
+        self.nbytes += nbytes
+        self.us += us
+        if addr in self.per:
+            p = self.per[addr]
+            p[0] += 1
+            p[1] += nbytes
+            p[2] += us
+        if self.stall: self.st.warp += us / 1000000
+
+    def _dev(self, addr):
+        d = self.devs.get(addr)
+        if d is None or not d.ack():
+            self.nacks += 1
+            self._account(addr, 0, 11)
+            raise OSError(I2C_EIO)
+        return d
+
+    def scan(self):
+        found = []
+        for a in range(0x08, 0x78):
+            self._account(a, 0, 11)
+            d = self.devs.get(a)
+            if d is not None and d.ack(): found.append(a)
+        return found
+
+    def write(self, addr, data):
+        d = self._dev(addr)
+        d.write(bytes(data))
+        self._account(addr, len(data), 11 + 9 * len(data))
+
+    def read(self, addr, n):
+        d = self._dev(addr)
+        buf = d.read(n)
+        self._account(addr, n, 11 + 9 * n)
+        return buf
+
+    def write_read(self, addr, wdata, n):
+        d = self._dev(addr)
+        d.write(bytes(wdata))
+        buf = d.read(n)
+        self._account(addr, len(wdata) + n, 21 + 9 * (len(wdata) + n))
+        return buf
+
+#-------------------------------------------------------------------------------
+# DS1307: 64 Register (0-6 Uhrzeit BCD, 7 Control, 8-63 RAM), Zeiger mit Ueberlauf
+
+# Die Uhr zaehlt ab dem letzten Stellen mit eigener Gangabweichung (ppm). Vor jedem
+# Lesen werden die Zeitregister aus dem Zaehler aufgefuellt (wie beim Chip zum START),
+# ein Schreibzugriff auf 0-6 stellt die Uhr neu. CH (Bit 7 in Register 0) haelt sie an.
+# Nur 24-Stunden-Modus.
+
+class DS1307Sim:
+
+    def __init__(self, board, ppm = 0.0):
+        self.board = board
+        self.ppm = ppm
+        self.reg = bytearray(64)
+        self.reg[7] = 0x03
+        self.ptr = 0
+        self.halted = False
+        self.sets = 0
+        self._start(int(board.local()), time.gmtime(int(board.local()))[6] + 1)
+
+    def ack(self):
+        return True
+
+    def _start(self, secs, wd):
+        self.base = secs
+        self.m0 = self.board.st.mono()
+        self.wd0 = wd
+        self.day0 = secs // 86400
+
+    def secs(self):
+        if self.halted: return self.base
+        return self.base + (self.board.st.mono() - self.m0) * (1 + self.ppm / 1000000)
+
+    def _latch(self):
+        s = int(self.secs())
+        t = time.gmtime(s)
+        r = self.reg
+        r[0] = bcd(t[5]) | (0x80 if self.halted else 0)
+        r[1] = bcd(t[4])
+        r[2] = bcd(t[3])
+        r[3] = (self.wd0 - 1 + s // 86400 - self.day0) % 7 + 1
+        r[4] = bcd(t[2])
+        r[5] = bcd(t[1])
+        r[6] = bcd(t[0] % 100)
+
+    def _load(self):
+        r = self.reg
+        self.halted = bool(r[0] & 0x80)
+        secs = calendar.timegm((2000 + dec(r[6]), dec(r[5] & 0x1F), dec(r[4] & 0x3F),
+                                dec(r[2] & 0x3F), dec(r[1] & 0x7F), dec(r[0] & 0x7F), 0, 0, 0))
+        self._start(secs, r[3] & 0x07)
+        self.sets += 1
+
+    def write(self, data):
+        if not data: return
+        self.ptr = data[0] & 0x3F
+        if len(data) == 1: return
+        self._latch()
+        clock = False
+        for b in data[1:]:
+            self.reg[self.ptr] = b
+            if self.ptr < 7: clock = True
+            self.ptr = (self.ptr + 1) & 0x3F
+        if clock: self._load()
+
+    def read(self, n):
+        self._latch()
+        buf = bytearray(n)
+        for i in range(n):
+            buf[i] = self.reg[self.ptr]
+            self.ptr = (self.ptr + 1) & 0x3F
+        return bytes(buf)
+
+#-------------------------------------------------------------------------------
+# AT24C32N: 4096 Bytes, 16-Bit-Adresse, Seiten zu 32 Bytes
+
+# Schreiben innerhalb einer Seite laeuft am Seitenende auf den Seitenanfang um
+# (wie beim Chip), jeder Schreibzyklus wird je Seite gezaehlt (Verschleiss).
+# Waehrend der Schreibzeit T_WR quittiert der Baustein seine Adresse nicht.
+# Sequentielles Lesen laeuft ueber die ganze Speichergrenze um.
+
+class AT24C32Sim:
+
+    SIZE = 4096
+    PAGE = 32
+    T_WR = 0.005
+
+    def __init__(self, board):
+        self.board = board
+        self.mem = bytearray(b"\xff" * self.SIZE)
+        self.ptr = 0
+        self.busy = 0.0
+        self.cycles = 0
+        self.wear = [0] * (self.SIZE // self.PAGE)
+
+    def ack(self):
+        return self.board.st.mono() >= self.busy
+
+    def write(self, data):
+        if len(data) < 2: return
+        self.ptr = ((data[0] << 8) | data[1]) % self.SIZE
+        if len(data) == 2: return
+        p = self.ptr
+        for b in data[2:]:
+            self.mem[p] = b
+            p = (p & ~(self.PAGE - 1)) | ((p + 1) & (self.PAGE - 1))
+        self.ptr = p
+        self.wear[p // self.PAGE] += 1
+        self.cycles += 1
+        self.busy = self.board.st.mono() + self.T_WR
+
+    def read(self, n):
+        buf = bytearray(n)
+        for i in range(n):
+            buf[i] = self.mem[self.ptr]
+            self.ptr = (self.ptr + 1) % self.SIZE
+        return bytes(buf)
+
+    # Speicherabbild zwischen zwei Laeufen aufheben
+    def load(self, path):
+        try:
+            with open(path, "rb") as f:
+                self.mem[:] = f.read(self.SIZE).ljust(self.SIZE, b"\xff")
+        except OSError:
+            pass
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.mem)
+
+#-------------------------------------------------------------------------------
+# PCF8574 mit HD44780 im 4-Bit-Betrieb
+
+# Belegung wie I2cLcd: P0 = RS, P1 = RW, P2 = E, P3 = Hintergrundlicht, P4-P7 = D4-D7.
+# Der Controller uebernimmt D4-D7 mit der fallenden Flanke von E. Nach dem Einschalten
+# ist er im 8-Bit-Betrieb (nur D4-D7 angeschlossen, D0-D3 = 0), ein Function Set mit
+# DL = 0 schaltet auf 4 Bit, danach ergeben je zwei Nibbles (erst das obere) ein Byte.
+# Ausgewertet werden Clear, Home, Entry Mode, Display Control, Function Set und
+# Set DDRAM Address, die Zeilen liegen bei 0x00, 0x40, 0x14, 0x54.
+
+class LcdSim:
+
+    def __init__(self, lines = 4, cols = 20):
+        self.lines = lines
+        self.cols = cols
+        self.ddram = bytearray(b" " * 0x80)
+        self.port = 0xFF
+        self.ac = 0
+        self.inc = True
+        self.mode8 = True
+        self.hi = None
+        self.on = False
+        self.backlight = False
+        self.strobes = 0
+        self.cmds = 0
+        self.chars = 0
+        self.clears = 0
+
+    def ack(self):
+        return True
+
+    def write(self, data):
+        for b in data:
+            if self.port & 0x04 and not b & 0x04: self._strobe(b)
+            self.port = b
+        self.backlight = bool(self.port & 0x08)
+
+    def read(self, n):
+        return bytes([self.port]) * n
+
+    def _strobe(self, b):
+        self.strobes += 1
+        if b & 0x02: return
+        nib = b >> 4
+        if self.mode8:
+            self._exec(b & 0x01, nib << 4)
+        elif self.hi is None:
+            self.hi = nib
+        else:
+            self._exec(b & 0x01, (self.hi << 4) | nib)
+            self.hi = None
+
+    def _exec(self, rs, v):
+        if rs:
+            self.ddram[self.ac] = v
+            self.chars += 1
+            self._step()
+            return
+        self.cmds += 1
+        if v & 0x80:
+            self.ac = v & 0x7F
+        elif v & 0x40:
+            pass                    # CGRAM, nicht nachgebildet
+        elif v & 0x20:
+            self.mode8 = bool(v & 0x10)
+            self.hi = None
+        elif v & 0x10:
+            pass                    # Cursor/Display schieben, nicht nachgebildet
+        elif v & 0x08:
+            self.on = bool(v & 0x04)
+        elif v & 0x04:
+            self.inc = bool(v & 0x02)
+        elif v & 0x02:
+            self.ac = 0
+        elif v & 0x01:
+            self.ddram[:] = b" " * 0x80
+            self.ac = 0
+            self.inc = True
+            self.clears += 1
+
+    # zweizeiliger Adressraum: 0x00-0x27 und 0x40-0x67
+    def _step(self):
+        if self.inc:
+            self.ac = 0x40 if self.ac == 0x27 else 0x00 if self.ac == 0x67 else self.ac + 1
+        else:
+            self.ac = 0x67 if self.ac == 0x00 else 0x27 if self.ac == 0x40 else self.ac - 1
+
+    # sichtbarer Inhalt, je Zeile ein String
+    def text(self):
+        rows = []
+        for y in range(self.lines):
+            a = (0x40 if y & 1 else 0) + (self.cols if y & 2 else 0)
+            rows.append(self.ddram[a:a + self.cols].decode("latin-1"))
+        return rows
+
+#-------------------------------------------------------------------------------
+# machine
+
+_board = None
+
+class Pin:
+
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode = -1, pull = -1, value = None):
+        self.id = id
+        self.mode = mode
+        self.pull = pull
+        self.level = value if value is not None else (1 if pull == Pin.PULL_UP else 0)
+        self.handler = None
+        self.trigger = 0
+        self.writes = 0
+        _board.pins[id] = self
+
+    def value(self, v = None):
+        if v is None: return self.level
+        self.level = 1 if v else 0
+        self.writes += 1
+
+    def __call__(self, v = None):
+        return self.value(v)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def toggle(self):
+        self.value(not self.level)
+
+    def irq(self, handler = None, trigger = IRQ_FALLING | IRQ_RISING, hard = False):
+        self.handler = handler
+        self.trigger = trigger
+        return self
+
+    # Pegel von aussen (Schalter, Kontakt) setzen, loest ggf. den Interrupt aus.
+    # Muss im Thread der Ereignisschleife laufen (ThreadSafeFlag ist hier ein Event).
+    def drive(self, v):
+        v = 1 if v else 0
+        if v == self.level: return
+        self.level = v
+        edge = Pin.IRQ_RISING if v else Pin.IRQ_FALLING
+        if self.handler is not None and self.trigger & edge: self.handler(self)
+
+class I2C:
+
+    def __init__(self, id = 0, scl = None, sda = None, freq = 400000, timeout = 50000):
+        self.bus = _board.bus
+        self.bus.freq = freq
+
+    def scan(self):
+        return self.bus.scan()
+
+    def writeto(self, addr, buf, stop = True):
+        self.bus.write(addr, buf)
+        return len(buf)
+
+    def writevto(self, addr, vector, stop = True):
+        buf = b"".join(bytes(b) for b in vector)
+        self.bus.write(addr, buf)
+        return len(buf)
+
+    def readfrom(self, addr, nbytes, stop = True):
+        return self.bus.read(addr, nbytes)
+
+    def readfrom_into(self, addr, buf, stop = True):
+        buf[:] = self.bus.read(addr, len(buf))
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize = 8):
+        self.bus.write(addr, memaddr.to_bytes(addrsize // 8, "big") + bytes(buf))
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize = 8):
+        return self.bus.write_read(addr, memaddr.to_bytes(addrsize // 8, "big"), nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize = 8):
+        buf[:] = self.readfrom_mem(addr, memaddr, len(buf), addrsize)
+
+# Interne Uhr des RP2040, nach dem Einschalten 2021-01-01 00:00:00, eigene Gangabweichung
+class SimRTC:
+
+    def __init__(self, board, ppm = 0.0):
+        self.board = board
+        self.ppm = ppm
+        self.sets = 0
+        self.set_secs(calendar.timegm((2021, 1, 1, 0, 0, 0, 0, 0, 0)))
+
+    def set_secs(self, secs):
+        self.base = secs
+        self.m0 = self.board.st.mono()
+
+    def secs(self):
+        return self.base + (self.board.st.mono() - self.m0) * (1 + self.ppm / 1000000)
+
+    def datetime(self, dt = None):
+        if dt is None:
+            t = time.gmtime(int(self.secs()))
+            return (t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0)
+        self.set_secs(calendar.timegm((dt[0], dt[1], dt[2], dt[4], dt[5], dt[6], 0, 0, 0)))
+        self.sets += 1
+
+def RTC(id = 0):
+    return _board.rtc
+
+#-------------------------------------------------------------------------------
+# 1-Wire mit DS18B20
+
+# Die Wandlung uebernimmt die Temperatur (Zahl oder Funktion der UTC-Zeit) auf die
+# eingestellte Aufloesung abgeschnitten, das Ergebnis steht erst nach der Wandlungszeit
+# im Scratchpad, vorher liefert es den alten Wert (nach dem Einschalten 85 Grad).
+# Mit faults = n sind die naechsten n Scratchpads fehlerhaft (CRC).
+# Buszeit je Reset 960 us, je Byte 8 Zeitschlitze a 70 us.
+
+OW_RESET_US      = 960
+OW_BYTE_US       = 560
+
+def _crc8_byte(c):
+    for i in range(8):
+        c = (c >> 1) ^ 0x8C if c & 0x01 else c >> 1
+    return c
+
+CRC8_TAB         = bytes(_crc8_byte(c) for c in range(256))   # Dallas/Maxim, Polynom 0x31 gespiegelt
+
+def crc8(data):
+    crc = 0
+    for b in data:
+        crc = CRC8_TAB[crc ^ b]
+    return crc
+
+class DS18B20Sim:
+
+    def __init__(self, rom, temp):
+        self.rom = bytes(rom[:7]) + bytes([crc8(rom[:7])])
+        self.temp = temp
+        self.raw = 0x0550
+        self.th = 0x4B
+        self.tl = 0x46
+        self.cfg = 0x7F
+        self.pend = None
+        self.ready = 0.0
+        self.convs = 0
+        self.faults = 0
+
+    def res(self):
+        return 9 + ((self.cfg >> 5) & 3)
+
+    def convert(self, board):
+        t = self.temp(board.utc()) if callable(self.temp) else self.temp
+        raw = int(t * 16 // 1) & ~((1 << (12 - self.res())) - 1)
+        self.pend = max(min(raw, 0x07D0), -0x0370) & 0xFFFF
+        self.ready = board.st.mono() + (0.75 / (1 << (12 - self.res())))
+        self.convs += 1
+
+    def scratch(self, board):
+        if self.pend is not None and board.st.mono() >= self.ready:
+            self.raw = self.pend
+            self.pend = None
+        buf = bytearray([self.raw & 0xFF, self.raw >> 8, self.th, self.tl, self.cfg, 0xFF, 0x0C, 0x10])
+        buf.append(crc8(buf))
+        if self.faults > 0:
+            self.faults -= 1
+            buf[0] ^= 0x01
+        return buf
+
+class OneWireError(Exception):
+    pass
+
+class OneWire:
+
+    SEARCH_ROM = 0xF0
+    MATCH_ROM = 0x55
+    SKIP_ROM = 0xCC
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.resets = 0
+        self.nbytes = 0
+        self.us = 0
+
+    def _xfer(self, nbytes):
+        self.resets += 1
+        self.nbytes += nbytes
+        us = OW_RESET_US + nbytes * OW_BYTE_US
+        self.us += us
+        _board.st.warp += us / 1000000
+
+    def reset(self, required = False):
+        self._xfer(0)
+        if required and not _board.sensors: raise OneWireError
+        return bool(_board.sensors)
+
+    # Suche: je Sensor 64 Bit mit je drei Zeitschlitzen (Bit, Komplement, Richtung)
+    def scan(self):
+        for s in _board.sensors:
+            self._xfer(1 + 24)
+        return [bytearray(s.rom) for s in _board.sensors]
+
+    crc8 = staticmethod(crc8)
+
+class DS18X20:
+
+    def __init__(self, onewire):
+        self.ow = onewire
+
+    def _sensor(self, rom):
+        for s in _board.sensors:
+            if s.rom == bytes(rom): return s
+        raise OneWireError
+
+    def scan(self):
+        return [rom for rom in self.ow.scan() if rom[0] in (0x10, 0x22, 0x28)]
+
+    def convert_temp(self):
+        self.ow._xfer(2)
+        for s in _board.sensors:
+            s.convert(_board)
+
+    def read_scratch(self, rom):
+        self.ow._xfer(10 + 9)
+        buf = self._sensor(rom).scratch(_board)
+        if crc8(buf):
+            raise Exception("CRC error")
+        return buf
+
+    def write_scratch(self, rom, buf):
+        self.ow._xfer(10 + 3)
+        s = self._sensor(rom)
+        s.th, s.tl, s.cfg = buf[0], buf[1], (buf[2] & 0x60) | 0x1F
+
+    def read_temp(self, rom):
+        buf = self.read_scratch(rom)
+        t = buf[1] << 8 | buf[0]
+        if t & 0x8000:
+            t = -((t ^ 0xFFFF) + 1)
+        return t / 16
+
+#-------------------------------------------------------------------------------
+# WLAN und NTP
+
+# Der Verbindungsaufbau dauert conn_s, danach steht die Verbindung, solange der
+# Router erreichbar ist (ap). Faellt er aus, liefert status() 0 wie nach einem
+# Verbindungsabbruch, ein neues connect() scheitert mit -2 (kein AP gefunden).
+
+STAT_IDLE           = 0
+STAT_CONNECTING     = 1
+STAT_WRONG_PASSWORD = -3
+STAT_NO_AP_FOUND    = -2
+STAT_CONNECT_FAIL   = -1
+STAT_GOT_IP         = 3
+
+class WLANSim:
+
+    def __init__(self, board):
+        self.board = board
+        self.ap = True
+        self.conn_s = 2.0
+        self.rssi = -60
+        self.ip = "192.168.178.99"
+        self.up = False
+        self.link = False
+        self.t_conn = None
+        self.connects = 0
+
+    def active(self, v = None):
+        if v is None: return self.up
+        self.up = bool(v)
+        if not self.up: self.disconnect()
+
+    def connect(self, ssid = None, key = None):
+        self.t_conn = self.board.st.mono()
+        self.link = False
+        self.connects += 1
+
+    def disconnect(self):
+        self.t_conn = None
+        self.link = False
+
+    def status(self, param = None):
+        if param == "rssi": return self.rssi
+        if self.link:
+            if self.ap: return STAT_GOT_IP
+            self.disconnect()
+        if self.t_conn is None: return STAT_IDLE
+        if self.board.st.mono() - self.t_conn < self.conn_s: return STAT_CONNECTING
+        if not self.ap: return STAT_NO_AP_FOUND
+        self.link = True
+        return STAT_GOT_IP
+
+    def isconnected(self):
+        return self.status() == STAT_GOT_IP
+
+    def ifconfig(self):
+        return (self.ip, "255.255.255.0", "192.168.178.1", "192.168.178.1")
+
+    def config(self, *args, **kw):
+        return self.rssi if "rssi" in args else None
+
+def WLAN(iface = 0):
+    return _board.wlan
+
+# Nicht blockierender UDP-Socket, der NTP-Anfragen nach delay mit der wahren UTC beantwortet
+class NtpSock:
+
+    def __init__(self, board):
+        self.board = board
+        self.t_ready = None
+
+    def setblocking(self, flag):
+        pass
+
+    def settimeout(self, t):
+        pass
+
+    def sendto(self, buf, addr):
+        if not self.board.wlan.link: raise OSError(113)
+        self.board.ntp_requests += 1
+        if self.board.ntp_ok: self.t_ready = self.board.st.mono() + self.board.ntp_delay
+        return len(buf)
+
+    def recv(self, n):
+        if self.t_ready is None or self.board.st.mono() < self.t_ready: raise OSError(11)
+        self.t_ready = None
+        secs = self.board.utc() + NTP_DELTA
+        buf = bytearray(48)
+        buf[0] = 0x24
+        struct.pack_into("!II", buf, 40, int(secs), int((secs % 1) * 4294967296))
+        return bytes(buf[:n])
+
+    def close(self):
+        pass
+
+def socket_module(board):
+    m = types.ModuleType("socket")
+    m.AF_INET = 2
+    m.SOCK_STREAM = 1
+    m.SOCK_DGRAM = 2
+    # blockiert wie lwIP: Antwortzeit des DNS-Servers, ohne Antwort bis zum Timeout
+    def getaddrinfo(host, port, *args):
+        board.dns_requests += 1
+        if not board.wlan.link or not board.dns_ok:
+            board.st.sleep(board.dns_timeout)
+            raise OSError(-2)
+        board.st.sleep(board.dns_delay)
+        return [(2, 2, 0, "", ("162.159.200.1", port))]
+    m.getaddrinfo = getaddrinfo
+    m.socket = lambda af = 2, type = 1, proto = 0: NtpSock(board)
+    return m
+
+#-------------------------------------------------------------------------------
+# uasyncio
+
+# Das asyncio von CPython mit den Erweiterungen von MicroPython. Der Webserver
+# lauscht statt auf Port 80 auf board.http_port (ohne root-Rechte nutzbar).
+
+class ThreadSafeFlag:
+
+    def __init__(self):
+        self._ev = asyncio.Event()
+
+    def set(self):
+        self._ev.set()
+
+    def clear(self):
+        self._ev.clear()
+
+    async def wait(self):
+        await self._ev.wait()
+        self._ev.clear()
+
+def uasyncio_module():
+    m = types.ModuleType("uasyncio")
+    m.__dict__.update((k, v) for k, v in asyncio.__dict__.items() if not k.startswith("__"))
+    m.sleep_ms = lambda ms: asyncio.sleep(ms / 1000)
+    m.wait_for_ms = lambda aw, ms: asyncio.wait_for(aw, ms / 1000)
+    m.ThreadSafeFlag = ThreadSafeFlag
+    def start_server(cb, host, port, backlog = 5):
+        return asyncio.start_server(cb, host, _board.http_port if port == 80 else port, backlog = backlog)
+    m.start_server = start_server
+    return m
+
+#-------------------------------------------------------------------------------
+# Ereignisschleife mit virtueller Zeit
+
+# Statt im Selektor auf den naechsten Timer zu warten, springt die Uhr der Schleife
+# um die Wartezeit vor. asyncio.sleep, wait_for und damit alle Tasks laufen so ohne
+# echtes Warten, Stunden vergehen in Millisekunden. Als Zeitquelle der Platine
+# (Board(source = loop.time)) laufen auch ticks_ms, die Uhren und der Bus mit.
+
+class WarpSelector:
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.sel = selectors.DefaultSelector()
+
+    def select(self, timeout = None):
+        ev = self.sel.select(0)
+        if not ev and timeout: self.loop.vt += timeout
+        return ev
+
+    def __getattr__(self, name):
+        return getattr(self.sel, name)
+
+class VirtualLoop(asyncio.SelectorEventLoop):
+
+    def __init__(self):
+        self.vt = 0.0
+        super().__init__(WarpSelector(self))
+        # Timer gelten als faellig bis zur Aufloesung nach der aktuellen Zeit. Mit 1 ns
+        # (monotonic) ginge das ab gut 194 Tagen (2^24 s) in der Rundung unter und die
+        # Schleife liefe auf der Stelle, 1 us reicht fuer Jahrhunderte.
+        self._clock_resolution = 1e-6
+
+    def time(self):
+        return self.vt
+
+#-------------------------------------------------------------------------------
+# Platine
+
+# Alles, was am Pico haengt, mit den Stellschrauben fuer die Simulation:
+#   board.sensors[i].temp      Temperatur (Zahl oder Funktion der UTC-Zeit)
+#   board.pins[15].drive(v)    Tuerkontakt
+#   board.wlan.ap              Router erreichbar
+#   board.ntp_ok, ntp_delay    NTP-Server antwortet, nach s
+#   board.rtc.ppm, ertc.ppm    Gangabweichung der Uhren
+
+class Board:
+
+    def __init__(self, utc = None, ppm_rtc = 0.0, ppm_ertc = 0.0, source = time.monotonic):
+        self.st = SimTime(source)
+        self.utc0 = time.time() if utc is None else utc
+        self.pins = {}
+        self.bus = SimI2CBus(self.st)
+        self.rtc = SimRTC(self, ppm_rtc)
+        self.ertc = DS1307Sim(self, ppm_ertc)
+        self.eeprom = AT24C32Sim(self)
+        self.lcd = LcdSim(4, 20)
+        self.bus.attach(0x27, self.lcd, "LCD")
+        self.bus.attach(0x50, self.eeprom, "EEPROM")
+        self.bus.attach(0x68, self.ertc, "DS1307")
+        self.sensors = [DS18B20Sim(b"\x28\x01\x02\x03\x04\x05\x06", 20.0),
+                        DS18B20Sim(b"\x28\x11\x12\x13\x14\x15\x16", 10.0)]
+        self.wlan = WLANSim(self)
+        self.ntp_ok = True
+        self.ntp_delay = 0.05
+        self.ntp_requests = 0
+        self.dns_ok = True
+        self.dns_delay = 0.03
+        self.dns_timeout = 10.0
+        self.dns_requests = 0
+        self.http_port = 8080
+
+    # wahre Zeit (UTC und Ortszeit) in s
+    def utc(self):
+        return self.utc0 + self.st.mono()
+
+    def local(self):
+        u = self.utc()
+        return u + eu_offset(u)
+
+    def report(self):
+        b = self.bus
+        out = ["LCD (Licht {}):".format("an" if self.lcd.backlight else "aus")]
+        out += ["  |" + row + "|" for row in self.lcd.text()]
+        out.append("I2C {} kHz: {} Transaktionen, {} Bytes, {:.1f} ms Buszeit, {} NACK".format(
+            b.freq // 1000, b.xfers, b.nbytes, b.us / 1000, b.nacks))
+        for a in sorted(b.per):
+            p = b.per[a]
+            out.append("  0x{:02x} {:7s} {:7d} Transaktionen {:8d} Bytes {:9.1f} ms".format(
+                a, b.names[a], p[0], p[1], p[2] / 1000))
+        out.append("EEPROM: {} Schreibzyklen, meistbeschriebene Seite {}x".format(
+            self.eeprom.cycles, max(self.eeprom.wear)))
+        out.append("1-Wire: {} Wandlungen".format(sum(s.convs for s in self.sensors)))
+        out.append("Pins: " + " ".join("{}={}".format(n, p.level) for n, p in sorted(self.pins.items())))
+        return "\n".join(out)
+
+#-------------------------------------------------------------------------------
+# Einsetzen
+
+def install(board = None):
+
+    global _board
+
+    if _board is not None: return _board
+    _board = board if board is not None else Board()
+    st = _board.st
+
+    # time um die Funktionen von MicroPython ergaenzen, Warten laeuft auf simulierter Zeit
+    time.ticks_ms = st.ticks_ms
+    time.ticks_us = st.ticks_us
+    time.ticks_diff = ticks_diff
+    time.ticks_add = ticks_add
+    time.sleep = st.sleep
+    time.sleep_ms = lambda ms: st.sleep(ms / 1000)
+    time.sleep_us = lambda us: st.sleep(us / 1000000)
+    time.time = lambda: int(_board.rtc.secs())
+    time.mktime = mp_mktime
+    time.localtime = lambda secs = None: mp_gmtime(_board.rtc.secs() if secs is None else secs)
+
+    # Speicherstatistik nur mit tracemalloc, sonst 0
+    _gc.mem_alloc = lambda: tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+    _gc.mem_free = lambda: 192 * 1024 - _gc.mem_alloc()
+
+    m = types.ModuleType("micropython")
+    m.const = lambda x: x
+    m.schedule = lambda fn, arg: fn(arg)
+    sys.modules["micropython"] = m
+
+    # uctypes nur mit addressof/bytearray_at: Bytes-Sicht auf fremden Speicher ohne Kopie
+    m = types.ModuleType("uctypes")
+    m.addressof = lambda obj: ctypes.addressof(ctypes.c_char.from_buffer(obj))
+    m.bytearray_at = lambda addr, n: memoryview((ctypes.c_ubyte * n).from_address(addr)).cast("B")
+    sys.modules["uctypes"] = m
+
+    m = types.ModuleType("machine")
+    m.Pin = Pin
+    m.I2C = I2C
+    m.SoftI2C = I2C
+    m.RTC = RTC
+    m.freq = lambda *a: 125000000
+    m.unique_id = lambda: b"\xe6\x61\x41\x04\x03\x52\x5f\x2a"
+    sys.modules["machine"] = m
+
+    m = types.ModuleType("onewire")
+    m.OneWire = OneWire
+    m.OneWireError = OneWireError
+    sys.modules["onewire"] = m
+
+    m = types.ModuleType("ds18x20")
+    m.DS18X20 = DS18X20
+    sys.modules["ds18x20"] = m
+
+    m = types.ModuleType("network")
+    m.STA_IF = 0
+    m.AP_IF = 1
+    m.WLAN = WLAN
+    for k, v in globals().items():
+        if k.startswith("STAT_"): setattr(m, k, v)
+    sys.modules["network"] = m
+
+    sys.modules["uasyncio"] = uasyncio_module()
+    return _board
+
+# Steuerung laden, NTP geht an den simulierten Server (socket nur im Modul ersetzt,
+# asyncio braucht das echte socket fuer den Webserver)
+def load(name = "gw2_pico"):
+    board = install()
+    gw = importlib.import_module(name)
+    gw.socket = socket_module(board)
+    return gw
+
+#-------------------------------------------------------------------------------
+# Eigenstaendig: starten, Regelung laufen lassen, Zustand ausgeben
+
+async def _run(gw, board, secs):
+    task = asyncio.create_task(gw.main())
+    t_end = time.monotonic() + secs
+    while time.monotonic() < t_end:
+        await asyncio.sleep(min(10, t_end - time.monotonic()))
+        print(board.report())
+    task.cancel()
+
+if __name__ == "__main__":
+
+    secs = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    board = install()
+    gw = load()
+    t0 = time.monotonic()
+    gw.boot()
+    print("Start nach {:.2f} s (simuliert {:.1f} s)".format(time.monotonic() - t0, board.st.mono()))
+    print(board.report())
+    board.bus.reset_stats()
+    try:
+        asyncio.run(_run(gw, board, secs))
+    except KeyboardInterrupt:
+        pass
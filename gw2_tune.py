@@ -0,0 +1,288 @@
+#------------------------------------------------------------------------------#
+#                                                                              #
+# Project:           Greenhouse control with Raspberry Pi Pico W               #
+# Module:            gw2_tune.py (Schwellwerte per Simulation einstellen)      #
+#                                                                              #
+# Bewertet Tausende Parametersaetze (Fenster-, Ventilator-, Heizungsgrenzen    #
+# und t_wcut_close) ueber mehrere Wetterverlaeufe gleichzeitig: die Zweipunkt- #
+# Logik der Regeltabelle und das Waermemodell aus gw2_season als NumPy-Batch.  #
+# Ausgabe des besten Satzes als Datensatz wie im EEPROM (cfg_pack).            #
+#                                                                              #
+# Aufruf:   python gw2_tune.py [--sets 2048] [--scen 3] [--weather a.csv,..]   #
+#                  [--start 2025-03-01] [--days 245] [--step 300]              #
+#                  [--band 5,35] [--weights 1,0.05,0.3] [--out best.bin]       #
+#                                                                              #
+#------------------------------------------------------------------------------#
+
+import sys, io, time, contextlib
+
+import numpy as np
+
+import gw2_sim
+import gw2_season
+
+#-------------------------------------------------------------------------------
+# Suchraum
+
+# Paare wie PARAM_PAIRS (erster Wert groesser): der untere Wert im Bereich, der obere
+# um den Abstand darueber. Gerastert auf 0.5 Grad, begrenzt auf die Grenzen aus PARAMS.
+TUNE_PAIRS = (
+    ("t_win_f_open", "t_win_f_close", (14, 28), (1, 10)),
+    ("t_win_s_open", "t_win_s_close", (14, 30), (1, 10)),
+    ("t_win_h_open", "t_win_h_close", (14, 28), (1, 10)),
+    ("t_heat_off",   "t_heat_on",     (1, 12),  (0.5, 5)),
+    ("t_vc_on",      "t_vc_off",      (24, 44), (0.5, 5)),
+    ("t_vo_on",      "t_vo_off",      (24, 44), (0.5, 5)),
+)
+TUNE_SINGLE = (
+    ("t_wcut_close", (4, 18)),
+)
+
+TUNE_GRID        = 0.5
+
+# Spaltenkoepfe der Rangliste (F/S/H Jahreszeit, Hz Heizung, VZ/VO Ventilator Tuer zu/offen)
+TUNE_LABEL = {"win_f_open": "F-auf", "win_f_close": "F-zu", "win_s_open": "S-auf", "win_s_close": "S-zu",
+              "win_h_open": "H-auf", "win_h_close": "H-zu", "heat_off": "Hz-aus", "heat_on": "Hz-ein",
+              "vc_on": "VZ-ein", "vc_off": "VZ-aus", "vo_on": "VO-ein", "vo_off": "VO-aus", "wcut_close": "A-zu"}
+
+# Bewertung je Satz, gemittelt ueber die Wetterverlaeufe:
+#   Kelvinstunden ausserhalb des Bandes (Pflanzen, nicht der Alarm ex_unten/ex_oben)
+#   Schaltspiele (Fensterfahrten, Ventilator, Heizung)
+#   Heizenergie in kWh
+BAND             = (5.0, 35.0)
+WEIGHTS          = (1.0, 0.05, 0.3)
+
+#-------------------------------------------------------------------------------
+# Wetterverlaeufe auf gemeinsamem Zeitraster
+
+# Was nicht von den Parametern abhaengt, wird vorab je Schritt berechnet:
+# Jahreszeit (wie set_year_time), Abendzeit (wie gh_wdtime, ct_hour/ct_min bleiben fest)
+# und die Tuer (gw2_season.door_auto, Tuer offen waehlt die Ventilatorgrenzen t_vo_*).
+
+class Scenarios:
+
+    def __init__(self, weathers, start, days, step, ct_hour, ct_min):
+        n = int(days * 86400 // step)
+        s = len(weathers)
+        self.step = step
+        self.n = n
+        self.t_out = np.empty((s, n))
+        self.sun = np.empty((s, n))
+        self.door = np.empty((s, n), dtype = bool)
+        self.yt = np.empty(n, dtype = np.int8)
+        self.wdtime = np.empty(n, dtype = bool)
+        utc = start - gw2_sim.eu_offset(start)
+        wd = False
+        for i in range(n):
+            u = utc + i * step
+            lt = time.gmtime(int(u + gw2_sim.eu_offset(u)))
+            mon = lt[1]
+            self.yt[i] = 0 if 3 <= mon <= 5 else 1 if 6 <= mon <= 8 else 2 if 9 <= mon <= 11 else 3
+            if lt[3] == ct_hour and lt[4] >= ct_min: wd = True
+            if lt[3] == 23: wd = False
+            self.wdtime[i] = wd
+            for k in range(s):
+                t, r = weathers[k].at(u)
+                self.t_out[k, i] = t
+                self.sun[k, i] = r
+                self.door[k, i] = gw2_season.door_auto(lt, t)
+
+#-------------------------------------------------------------------------------
+# Parametersaetze
+
+def sample(n, rnd, defaults, bounds):
+
+    names = [p[0] for p in TUNE_PAIRS] + [p[1] for p in TUNE_PAIRS] + [p[0] for p in TUNE_SINGLE]
+    sets = {k: np.empty(n) for k in names}
+
+    def grid(x):
+        return np.round(x / TUNE_GRID) * TUNE_GRID
+
+    for hi, lo, r, d in TUNE_PAIRS:
+        a = grid(rnd.uniform(r[0], r[1], n))
+        b = a + np.maximum(grid(rnd.uniform(d[0], d[1], n)), TUNE_GRID)
+        # nach dem Begrenzen bleibt der obere Wert mindestens ein Raster ueber dem unteren
+        sets[lo] = np.clip(a, bounds[lo][0], bounds[hi][1] - TUNE_GRID)
+        sets[hi] = np.clip(b, sets[lo] + TUNE_GRID, bounds[hi][1])
+    for k, r in TUNE_SINGLE:
+        sets[k] = np.clip(grid(rnd.uniform(r[0], r[1], n)), bounds[k][0], bounds[k][1])
+
+    # Satz 0 sind die aktuellen Werte, zum Vergleich
+    for k in names:
+        sets[k][0] = defaults[k]
+    return sets
+
+#-------------------------------------------------------------------------------
+# Zweipunkt-Logik und Waermemodell fuer einen Batch
+
+# Arrays (Saetze, Wetterverlaeufe). Je Schritt wie gw2_season: erst wirken die
+# Stellungen des letzten Schritts im Waermemodell, dann regelt job_ctrl:
+# gh_wdtime (vorab), gh_rules (Fenster, Ventilator, Heizung), gh_tsave.
+# Das Fenster faehrt in der Schrittweite ganz auf oder zu (Motorlaufzeit 30 s).
+
+def run_batch(par, sc, house, t_tsave, band):
+
+    p = len(par["t_heat_on"])
+    shape = (p, sc.t_out.shape[0])
+
+    def col(k):
+        return par[k][:, None]
+
+    win_on = np.stack([par["t_win_f_open"], par["t_win_s_open"], par["t_win_h_open"], par["t_win_h_open"]], 1)
+    win_off = np.stack([par["t_win_f_close"], par["t_win_s_close"], par["t_win_h_close"], par["t_win_h_close"]], 1)
+    wcut = col("t_wcut_close")
+    wcut_rel = wcut + t_tsave
+    vo_on, vo_off = col("t_vo_on"), col("t_vo_off")
+    vc_on, vc_off = col("t_vc_on"), col("t_vc_off")
+    h_on, h_off = col("t_heat_on"), col("t_heat_off")
+
+    ti = np.repeat(sc.t_out[None, :, 0], p, 0)
+    win = np.zeros(shape, dtype = bool)
+    vent = np.zeros(shape, dtype = bool)
+    heat = np.zeros(shape, dtype = bool)
+    tsave = np.zeros(shape, dtype = bool)
+    sw = np.zeros(shape)
+    heat_n = np.zeros(shape)
+    out_k = np.zeros(shape)
+
+    k_air = gw2_season.AIR_J_M3K / 3600
+    lo, hi = band
+    for t in range(sc.n):
+        to = sc.t_out[:, t]
+        dr = sc.door[:, t]
+
+        m3h = house.vol * (house.ach + win * house.win_ach + dr * house.door_ach) + vent * house.fan_m3h
+        ua = house.ua + k_air * m3h
+        teq = to + (house.floor * house.gain * sc.sun[:, t] + heat * house.heat_w) / ua
+        ti = teq + (ti - teq) * np.exp(-sc.step / house.cap * ua)
+        out_k += np.maximum(lo - ti, 0) + np.maximum(ti - hi, 0)
+        heat_n += heat
+
+        # Fenster: Sperre bei Waermespeicher/Abendzeit, Zwang zu bei Aussentemperatur/Abendzeit
+        yt = sc.yt[t]
+        wd = sc.wdtime[t]
+        want_on = (ti >= win_on[:, yt, None]) & ~tsave
+        if wd: want_on[:] = False
+        cold = to <= wcut
+        tsave |= cold & (want_on | win)
+        new = ~(ti <= win_off[:, yt, None]) & (want_on | win) & ~cold
+        if wd: new[:] = False
+        sw += new != win
+        win = new
+
+        # Ventilator, Grenzen nach Tuer
+        new = ~(ti <= np.where(dr, vo_off, vc_off)) & ((ti >= np.where(dr, vo_on, vc_on)) | vent)
+        sw += new != vent
+        vent = new
+
+        # Heizung
+        new = ~(ti >= h_off) & ((ti <= h_on) | heat)
+        sw += new != heat
+        heat = new
+
+        tsave &= ~(to >= wcut_rel)
+
+    h = sc.step / 3600
+    return (out_k * h).mean(1), sw.mean(1), (heat_n * h * house.heat_w / 1000).mean(1)
+
+#-------------------------------------------------------------------------------
+# Bester Satz im EEPROM-Format (Datensatz des Parameter-Rings, siehe cfg_pack)
+
+def emit(gw, best, seq, path):
+
+    # wie param_set, aber ohne Scheduler und Ereignisprotokoll (Steuerung nicht gestartet)
+    g = gw.__dict__
+    for k, v in best.items():
+        g[k] = round(float(v), 1)
+    for p in gw.PARAMS:
+        if not p[2] <= g[p[0]] <= p[3]: raise ValueError(p[0])
+    for on, off in gw.PARAM_PAIRS:
+        if g[on] <= g[off]: raise ValueError(on)
+    buf = gw.cfg_pack(seq)
+    if gw.cfg_unpack(buf) is None: raise ValueError("Datensatz ungueltig")
+    if path:
+        with open(path, "wb") as f:
+            f.write(buf)
+    return buf
+
+def main(argv):
+
+    n_sets = 2048
+    n_scen = 3
+    wpaths = None
+    start = gw2_season.parse_date("2025-03-01")
+    days = 245
+    step = 300
+    batch = 1024
+    seed = 1
+    band = BAND
+    weights = WEIGHTS
+    out = None
+    i = 1
+    try:
+        while i < len(argv):
+            a, v = argv[i], argv[i + 1]
+            if a == "--sets": n_sets = int(v)
+            elif a == "--scen": n_scen = int(v)
+            elif a == "--weather": wpaths = v.split(",")
+            elif a == "--start": start = gw2_season.parse_date(v)
+            elif a == "--days": days = float(v)
+            elif a == "--step": step = int(v)
+            elif a == "--batch": batch = int(v)
+            elif a == "--seed": seed = int(v)
+            elif a == "--band": band = tuple(float(x) for x in v.split(","))
+            elif a == "--weights": weights = tuple(float(x) for x in v.split(","))
+            elif a == "--out": out = v
+            else: raise ValueError(a)
+            i += 2
+    except (ValueError, IndexError):
+        print("Aufruf: python gw2_tune.py [--sets n] [--scen n] [--weather a.csv,b.csv] [--start JJJJ-MM-TT] [--days n]")
+        print("        [--step s] [--batch n] [--seed n] [--band lo,hi] [--weights band,schalt,kwh] [--out datei]")
+        return 2
+
+    # Steuerung nur laden (ohne boot) fuer Vorgaben, Grenzen und cfg_pack
+    gw2_sim.install()
+    with contextlib.redirect_stdout(io.StringIO()):
+        gw = gw2_sim.load()
+    bounds = {p[0]: (p[2], p[3]) for p in gw.PARAMS}
+    defaults = {p[0]: gw.__dict__[p[0]] for p in gw.PARAMS}
+
+    t0 = time.monotonic()
+    if wpaths:
+        weathers = [gw2_season.WeatherCsv(p) for p in wpaths]
+    else:
+        weathers = [gw2_season.Weather(seed + k) for k in range(n_scen)]
+    sc = Scenarios(weathers, start, days, step, gw.ct_hour, gw.ct_min)
+    house = gw2_season.Greenhouse()
+    par = sample(n_sets, np.random.default_rng(seed), defaults, bounds)
+    t1 = time.monotonic()
+
+    res = [np.empty(n_sets) for k in range(3)]
+    for b in range(0, n_sets, batch):
+        r = run_batch({k: v[b:b + batch] for k, v in par.items()}, sc, house, gw.t_tsave, band)
+        for k in range(3):
+            res[k][b:b + batch] = r[k]
+    score = weights[0] * res[0] + weights[1] * res[1] + weights[2] * res[2]
+    t2 = time.monotonic()
+
+    print("{} Saetze x {} Wetterverlaeufe x {} Schritte ({} s) in {:.1f} s (Wetter {:.1f} s)".format(
+        n_sets, len(weathers), sc.n, step, t2 - t0, t1 - t0))
+    print("Band {} .. {} Grad, Gewichte Kh {} / Schaltung {} / kWh {}".format(band[0], band[1], *weights))
+    names = [n for p in TUNE_PAIRS for n in p[:2]] + [p[0] for p in TUNE_SINGLE]
+    print("Rang  Bewertung     Kh  Schalt.    kWh " + "".join(" {:>6s}".format(TUNE_LABEL.get(n[2:], n[2:])) for n in names))
+    order = np.argsort(score)
+    for r, k in enumerate(list(order[:10]) + ([0] if 0 not in order[:10] else [])):
+        print("{:4s} {:10.1f} {:6.1f} {:8.0f} {:6.0f}".format(str(r + 1) if k != 0 else "akt", score[k],
+              res[0][k], res[1][k], res[2][k]) + "".join(" {:6.1f}".format(par[n][k]) for n in names))
+
+    k = order[0]
+    best = {n: par[n][k] for n in names}
+    buf = emit(gw, best, 1, out)
+    print("Bester Satz: " + ", ".join("{}={:.1f}".format(n, best[n]) for n in names))
+    print("EEPROM-Datensatz (Version {}, {} Bytes): {}".format(gw.CFG_VERSION, len(buf), buf.hex()))
+    print("Per Web-App: /param/set?" + "&".join("{}={:.1f}".format(n, best[n]) for n in names) + "&save=1")
+    if out: print("Datensatz in {} geschrieben.".format(out))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
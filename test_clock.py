@@ -0,0 +1,216 @@
+#------------------------------------------------------------------------------#
+#                                                                              #
+# Project:           Greenhouse control with Raspberry Pi Pico W               #
+# Module:            test_clock.py (NTP-Abgleich, Gangabweichung, Sommerzeit)  #
+#                                                                              #
+#------------------------------------------------------------------------------#
+
+import io, time, struct, asyncio, contextlib
+
+import pytest
+
+import gw2_sim
+
+# laengste zulaessige Blockade eines Uhren-Job-Laufs (Platinenzeit)
+JOB_MAX_S        = 0.05
+
+#-------------------------------------------------------------------------------
+# WLAN im Simulator auf- und abbauen, dazwischen den Test laufen lassen
+
+async def net_up(sim):
+    gw = sim.gw
+    sim.board.wlan.ap = True
+    sim.board.http_port = 0
+    while not gw.webcon:
+        gw.job_net()
+        await asyncio.sleep(0.5)
+
+async def net_down(sim):
+    gw = sim.gw
+    sim.board.wlan.ap = False
+    sim.board.wlan.disconnect()
+    gw.job_net()
+    if gw.web_srv is not None:
+        gw.web_srv.close()
+        await gw.web_srv.wait_closed()
+        gw.web_srv = None
+
+# einen Abgleich anstossen und bis zum Ende laufen lassen, Rueckgabe laengste Blockade in s
+async def clock_cycle(sim):
+    gw = sim.gw
+    st = sim.board.st
+    gw.clk_next = time.ticks_ms()
+    worst = 0.0
+    while True:
+        w0 = st.warp
+        r = gw.job_clock()
+        worst = max(worst, st.warp - w0)
+        if r != gw.NTP_POLL_MS: return worst
+        await asyncio.sleep(r / 1000)
+
+@pytest.fixture
+def net(sim):
+    b = sim.board
+    saved = (b.dns_ok, b.ntp_ok, sim.gw.clk_addr)
+    yield sim
+    sim.run(net_down(sim))
+    b.dns_ok, b.ntp_ok, sim.gw.clk_addr = saved
+
+#-------------------------------------------------------------------------------
+
+def test_ntp_no_dns_in_clock_job(net):
+
+    sim = net
+    gw = sim.gw
+    b = sim.board
+
+    async def run():
+        gw.clk_addr = None
+        b.dns_ok = False
+        n0 = b.dns_requests
+        await net_up(sim)
+        assert b.dns_requests == n0 + 1
+        assert gw.clk_addr is None
+
+        # Abgleiche scheitern (keine Antwort), ohne neue Namensaufloesung und ohne Blockade
+        b.ntp_ok = False
+        fails = gw.clk_stat["fails"]
+        for i in range(3):
+            assert await clock_cycle(sim) < JOB_MAX_S
+        assert gw.clk_stat["fails"] == fails + 3
+        assert b.dns_requests == n0 + 1
+
+        # mit Antwort gelingt der Abgleich ueber die Ersatzadresse
+        b.ntp_ok = True
+        syncs = gw.clk_stat["syncs"]
+        assert await clock_cycle(sim) < JOB_MAX_S
+        assert gw.clk_stat["syncs"] == syncs + 1
+        assert b.dns_requests == n0 + 1
+
+    sim.run(run())
+
+def test_ntp_address_kept(net):
+
+    sim = net
+    gw = sim.gw
+    b = sim.board
+
+    async def run():
+        gw.clk_addr = None
+        b.dns_ok = True
+        n0 = b.dns_requests
+        await net_up(sim)
+        assert gw.clk_addr is not None
+        addr = gw.clk_addr
+        b.ntp_ok = False
+        await clock_cycle(sim)
+        assert gw.clk_addr == addr
+        assert b.dns_requests == n0 + 1
+
+    sim.run(run())
+
+#-------------------------------------------------------------------------------
+# Abgleich-Abstand nach Gangabweichung, direkt ueber clk_sync mit NTP-Antworten
+
+def ntp_reply(board):
+    secs = board.utc() + gw2_sim.NTP_DELTA
+    buf = bytearray(48)
+    struct.pack_into("!II", buf, 40, int(secs), int((secs % 1) * 4294967296))
+    return bytes(buf)
+
+@pytest.fixture
+def drift(sim):
+    gw = sim.gw
+    b = sim.board
+    saved = (b.rtc.ppm, b.ertc.ppm, gw.clk_last, dict(gw.clk_stat))
+
+    # Abgleiche im jeweils geplanten Abstand, Rueckgabe Abstaende und Abweichungen (s)
+    def run(ppm_rtc, ppm_ertc, n):
+        gw.clk_last = 0
+        gw.clk_stat.update({"interval": 0, "ppm_rtc": 0.0, "ppm_ertc": 0.0})
+        ivs = []
+        errs = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            # erster Abgleich stellt die Uhren, ab dann mit Gangabweichung
+            b.st.sleep(0.37)
+            gw.clk_sync(ntp_reply(b))
+            b.rtc.ppm = ppm_rtc
+            b.ertc.ppm = ppm_ertc
+            for i in range(n):
+                iv = gw.clk_stat["interval"]
+                ivs.append(iv)
+                b.st.sleep(iv + 0.21)
+                gw.clk_sync(ntp_reply(b))
+                errs.append(max(abs(gw.clk_stat["drift_rtc"]), abs(gw.clk_stat["drift_ertc"])))
+        return ivs, errs
+
+    yield run
+    b.rtc.ppm, b.ertc.ppm, gw.clk_last = saved[:3]
+    gw.clk_stat.update(saved[3])
+
+def test_interval_backs_off_without_drift(drift):
+    ivs, errs = drift(0.0, 0.0, 8)
+    assert ivs[:6] == [3600, 7200, 14400, 28800, 57600, 86400]
+    assert ivs[-1] == 86400
+    assert max(errs) <= 1.0
+
+def test_interval_follows_measurable_drift(sim, drift):
+    # 1 s/h (278 ppm) am DS1307: Abgleich alle ~2 h fuer hoechstens CLK_MAX_ERR s,
+    # die ganzen Sekunden der Uhr verschieben die einzelne Messung um bis zu 1 s
+    ivs, errs = drift(0.0, 1000000 / 3600, 12)
+    assert all(iv <= 3 * 3600 for iv in ivs)
+    assert all(iv >= 4500 for iv in ivs[2:])
+    assert max(errs[1:]) <= sim.gw.CLK_MAX_ERR + 1
+    assert 200 < abs(sim.gw.clk_stat["ppm_ertc"]) < 360
+
+def test_interval_small_drift(sim, drift):
+    # 20 ppm: unter der Aufloesung erst verdoppeln, dann nach Gangabweichung, hoechstens taeglich
+    ivs, errs = drift(-20.0, 5.0, 10)
+    assert ivs[:3] == [3600, 7200, 14400]
+    assert ivs[-1] >= 43200
+    assert max(errs) <= sim.gw.CLK_MAX_ERR + 1
+    assert -40 < sim.gw.clk_stat["ppm_rtc"] < -5
+
+#-------------------------------------------------------------------------------
+# UTC-Versatz der DS1307 im RAM, Neustart ueber eine verpasste Umstellung
+
+@pytest.fixture
+def rtc_ram(sim):
+    gw = sim.gw
+    yield sim
+    # Uhren wieder auf die Ortszeit der Platine
+    gw.clk_set(int(sim.board.local()), gw.utc_offset(int(sim.board.utc())))
+    gw.clk_off = gw.utc_offset(int(sim.board.utc()))
+
+def test_offset_saved_with_clocks(rtc_ram):
+    gw = rtc_ram.gw
+    gw.clk_set(int(rtc_ram.board.local()), 7200)
+    assert bytes(gw.ertc.memory(gw.CLK_RAM_OFF, n = 2)) == bytes((gw.CLK_RAM_MAGIC, 2))
+
+def test_missed_dst_switch_after_restart(rtc_ram):
+    sim = rtc_ram
+    gw = sim.gw
+    loc = int(sim.board.local())
+
+    # DS1307 zuletzt im Winter gestellt (MEZ), seitdem ohne Strom bis in den Juni
+    gw.clk_set(loc - 3600, 3600)
+    with contextlib.redirect_stdout(io.StringIO()):
+        gw.act_clocks()
+    assert gw.clk_off == 3600
+
+    # der Uhren-Job stellt ohne Netz auf Sommerzeit um
+    with contextlib.redirect_stdout(io.StringIO()):
+        gw.job_clock()
+    assert gw.clk_off == 7200
+    assert abs(time.time() - loc) <= 1
+    assert abs(gw.dt_secs(gw.ertc.datetime()) - loc) <= 1
+    assert gw.ertc.memory(gw.CLK_RAM_OFF, n = 2)[1] == 2
+
+def test_offset_guessed_without_ram_entry(rtc_ram):
+    gw = rtc_ram.gw
+    gw.ertc.memory(gw.CLK_RAM_OFF, b"\xff\xff")
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        gw.act_clocks()
+    assert gw.clk_off == 7200
+    assert "Kein UTC-Versatz" in out.getvalue()
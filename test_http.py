@@ -0,0 +1,102 @@
+#------------------------------------------------------------------------------#
+#                                                                              #
+# Project:           Greenhouse control with Raspberry Pi Pico W               #
+# Module:            test_http.py (Anfragen zerlegen, Routen, Fehlerfaelle)    #
+#                                                                              #
+#------------------------------------------------------------------------------#
+
+import json, struct, asyncio
+
+import pytest
+
+from conftest import CaptureWriter
+
+def test_route_and_404(sim):
+    w = sim.http("/api/status")
+    assert w.status() == 200 and w.closed
+    w = sim.http("/gibtsnicht")
+    assert w.status() == 404 and w.closed
+
+def test_query_unquote(sim):
+    gw = sim.gw
+    assert gw.parse_query("a=1+2&b=%41%2f&c") == {"a": "1 2", "b": "A/", "c": ""}
+    assert gw.url_unquote("50%") == "50%"
+
+@pytest.mark.parametrize("raw", [
+    b"GET /api/status?x=%ff HTTP/1.1\r\n\r\n",
+    b"GET /api/status HTTP/1.1\r\nContent-Length: abc\r\n\r\n",
+    b"POST /param/set HTTP/1.1\r\nContent-Length: 40\r\n\r\nt_heat_on=6",
+    b"GET /\xff HTTP/1.1\r\n\r\n",
+    b"POST /param/set HTTP/1.1\r\nContent-Length: 4\r\n\r\n\xff\xfe=1",
+    b'POST /param/set HTTP/1.1\r\nContent-Length: 27\r\n\r\n{"name": ["x"], "value": 1}',
+    b'POST /param/set HTTP/1.1\r\nContent-Length: 12\r\n\r\n{"name": 1, ',
+    b"\r\n",
+])
+def test_bad_request(sim, raw):
+    w = sim.run(sim.request(raw))
+    assert w.status() == 400
+    assert w.closed
+
+@pytest.mark.parametrize("q", ["page=-1", "n=0", "n=-3", "n=101", "page=x", "page=1&n=-1"])
+def test_events_bad_args(sim, q):
+    w = sim.http("/api/events?" + q)
+    assert w.status() == 400
+    assert w.closed
+
+def test_events_page(sim):
+    for i in range(5): sim.gw.evlog.add(sim.gw.EV_PARAM, i)
+    d = json.loads(sim.http("/api/events?page=1&n=2").body())
+    assert d["page"] == 1 and d["n"] == 2 and len(d["events"]) == 2
+    assert json.loads(sim.http("/api/events?page=9999&n=100").body())["events"] == []
+
+@pytest.mark.parametrize("q, num", [("n=-5", 0), ("n=0", 0), ("n=3", 3), ("n=99999", 1440)])
+def test_hist_n_clamped(sim, q, num):
+    gw = sim.gw
+    t = gw.clock.secs()
+    for k in range(3, 0, -1): gw.HIST[1].add(t - k * 60, 20.0, 10.0)
+    d = json.loads(sim.http("/api/hist?res=1&" + q).body())
+    assert d["n"] == num and len(d["in_avg"]) == num
+    w = sim.http("/api/hist?res=1&fmt=bin&" + q)
+    assert w.status() == 200 and w.closed
+    assert len(w.body()) == 8 + num * 12
+
+# Schreiber, der jeden Aufruf von write mitschreibt
+class ChunkWriter(CaptureWriter):
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def write(self, buf):
+        self.chunks.append(buf)
+        super().write(buf)
+
+def test_hist_bin_chunks(sim):
+    gw = sim.gw
+    h = gw.HIST[1]
+    t = gw.clock.secs()
+    for k in range(5, 0, -1): h.add(t - k * 60, 20.0 + k, 10.0 - k)
+    d = json.loads(sim.http("/api/hist?res=1").body())
+
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"GET /api/hist?res=1&fmt=bin HTTP/1.1\r\n\r\n")
+        reader.feed_eof()
+        w = ChunkWriter()
+        await gw.serve_client(reader, w)
+        return w
+
+    w = sim.run(run())
+    body = w.body()
+    t0, step, num = struct.unpack_from("<IHH", body)
+    assert (t0, step, num) == (d["t0"], d["step"], d["n"])
+
+    # gleiche Werte wie JSON, ueber das Ringende hinweg
+    v = struct.unpack_from("<{}h".format(num * 6), body, 8)
+    for j, key in enumerate(("in_min", "in_max", "in_avg", "out_min", "out_max", "out_avg")):
+        assert [None if x == gw.HIST_NONE else x for x in v[j::6]] == d[key]
+
+    # Buckets als Ausschnitte des Rings ohne Kopie, je hoechstens HIST_CHUNK
+    data = [c for c in w.chunks if isinstance(c, memoryview)]
+    assert sum(len(c) for c in data) == num * 12
+    assert all(len(c) <= gw.HIST_CHUNK * 12 for c in data)
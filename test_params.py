@@ -0,0 +1,77 @@
+#------------------------------------------------------------------------------#
+#                                                                              #
+# Project:           Greenhouse control with Raspberry Pi Pico W               #
+# Module:            test_params.py (Parameter setzen, pruefen, speichern)     #
+#                                                                              #
+#------------------------------------------------------------------------------#
+
+import json
+
+import pytest
+
+@pytest.fixture
+def gw(sim):
+    g = sim.gw
+    saved = {p[0]: getattr(g, p[0]) for p in g.PARAMS}
+    yield g
+    for k, v in saved.items():
+        setattr(g, k, v)
+
+def test_set_pair(sim, gw):
+    w = sim.http("/param/set?t_vc_on=37&t_vc_off=34.5")
+    assert w.status() == 200
+    assert gw.t_vc_on == 37.0 and gw.t_vc_off == 34.5
+    assert json.loads(w.body())["t_vc_on"] == 37.0
+
+def test_reject_inverted_pair(sim, gw):
+    w = sim.http("/param/set?t_heat_on=9")
+    assert w.status() == 400
+    assert gw.t_heat_on == 6.0
+
+@pytest.mark.parametrize("v", ["nan", "NaN", "inf", "-inf", "1e999"])
+def test_reject_non_finite(sim, gw, v):
+    w = sim.http("/param/set?t_heat_on=" + v)
+    assert w.status() == 400
+    assert gw.t_heat_on == 6.0
+    assert gw.param_set({"t_heat_on": float(v)}) is not None
+    assert gw.param_set({"ct_hour": float(v)}) is not None
+    body = sim.http("/api/params").body()
+    assert b"NaN" not in body and b"Infinity" not in body
+
+def test_name_value_with_save(sim, gw):
+    pc = gw.pcache
+    seq = pc.seq
+    flushes = pc.stat["flushes"]
+    w = sim.http("/param/set?name=t_vc_on&value=37.5&save=1")
+    assert w.status() == 200
+    assert gw.t_vc_on == 37.5
+    assert pc.stat["flushes"] == flushes + 1
+    assert pc.seq == (seq + 1) & 0xFFFF
+    assert gw.cfg_unpack(sim.board.eeprom.mem[gw.EPR_CFG + pc.slot * gw.EPR_CFG_SLOT:])[1]["t_vc_on"] == 37.5
+
+def test_int_param_not_truncated(sim, gw):
+    raw = b'POST /param/set HTTP/1.1\r\nContent-Length: {}\r\n\r\n'
+    for body, status, ct in ((b'{"ct_hour": 17.9}', 400, 18), (b'{"ct_hour": 17.0}', 200, 17),
+                             (b'{"ct_hour": 19}', 200, 19)):
+        w = sim.run(sim.request(raw.replace(b"{}", str(len(body)).encode()) + body))
+        assert w.status() == status
+        assert gw.ct_hour == ct
+
+def test_step_keeps_pairs(gw):
+    # t_heat_on (6.0) nach oben bis an t_heat_off (8.0), Schritt 1
+    gw.psel = [p[0] for p in gw.PARAMS].index("t_heat_on") + 1
+    gw.param_step(1)
+    assert gw.t_heat_on == 7.0
+    gw.param_step(1)
+    assert gw.t_heat_on == 7.0
+    gw.param_step(-1)
+    assert gw.t_heat_on == 6.0
+    gw.psel = 0
+
+@pytest.mark.parametrize("body", [b'{"t_heat_on": true}', b'{"t_heat_on": false}', b'{"ct_hour": true}',
+                                  b'{"name": "t_heat_on", "value": true}', b'{"name": 3, "value": 5}'])
+def test_reject_json_bool_and_bad_name(sim, gw, body):
+    raw = "POST /param/set HTTP/1.1\r\nContent-Length: {}\r\n\r\n".format(len(body)).encode() + body
+    w = sim.run(sim.request(raw))
+    assert w.status() == 400 and w.closed
+    assert gw.t_heat_on == 6.0 and gw.ct_hour == 18
@@ -0,0 +1,50 @@
+#------------------------------------------------------------------------------#
+#                                                                              #
+# Project:           Greenhouse control with Raspberry Pi Pico W               #
+# Module:            test_perf.py (Laufzeitprofil, /api/perf)                  #
+#                                                                              #
+#------------------------------------------------------------------------------#
+
+import json, asyncio
+
+from conftest import CaptureWriter
+
+# Client, der jedes drain() eine Sekunde aufhaelt (langsame Verbindung)
+class SlowWriter(CaptureWriter):
+
+    async def drain(self):
+        await asyncio.sleep(1)
+
+async def slow_get(sim, path):
+    reader = asyncio.StreamReader()
+    reader.feed_data("GET {} HTTP/1.1\r\n\r\n".format(path).encode())
+    reader.feed_eof()
+    w = SlowWriter()
+    await sim.gw.serve_client(reader, w)
+    return w
+
+def test_handler_time_excludes_drain(sim):
+
+    gw = sim.gw
+    assert json.loads(sim.http("/api/perf?on=1").body())["on"] is True
+
+    async def run():
+        # vier langsame Seitenabrufe gleichzeitig, zusammen weit ueber 100 % der Zeit
+        for i in range(15):
+            ws = await asyncio.gather(*[slow_get(sim, "/") for k in range(4)])
+            assert all(w.status() == 200 for w in ws)
+        await asyncio.sleep(1)
+        gw.prof.roll()
+
+    try:
+        sim.run(run())
+        d = json.loads(sim.http("/api/perf").body())
+    finally:
+        sim.http("/api/perf?on=0")
+
+    st = d["stages"]["h_page"]
+    assert st["n"] == 60
+    assert st["max"] < 50000
+    assert d["span_ms"] > 60000
+    assert 0 <= d["busy"] <= 1000
+    assert gw.prof_on is False
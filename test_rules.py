@@ -0,0 +1,275 @@
+#------------------------------------------------------------------------------#
+#                                                                              #
+# Project:           Greenhouse control with Raspberry Pi Pico W               #
+# Module:            test_rules.py (Regeltabelle ueber den Steuer-Job)         #
+#                                                                              #
+#------------------------------------------------------------------------------#
+
+import time, asyncio
+
+import pytest
+
+# Globals, die die Tests verstellen und danach zuruecksetzen
+SAVED            = ("tsave", "wdtime", "tval", "year_time", "wins_open", "vent_on", "heat_on",
+                    "wins_manu", "vent_manu", "heat_manu", "pid_on", "ct_hour", "ct_min")
+
+#-------------------------------------------------------------------------------
+# Steuer-Job mit vorgegebener Uhrzeit und Temperaturen
+
+@pytest.fixture
+def ctrl(sim):
+    gw = sim.gw
+    g = vars(gw)
+    saved = {k: g[k] for k in SAVED}
+    temps = [s[0] for s in gw.tsamples]
+    pos = gw.wdrive.pos
+    levels = (gw.rel05.value(), gw.rel06.value())
+    gw.pid_on = False
+    gw.wins_manu = gw.vent_manu = gw.heat_manu = False
+    yield sim
+    gw.wdrive.cancel()
+    gw.wdrive.pos = pos
+    for r in gw.RULES:
+        if r.pid: r.pid.reset()
+    gw.rel05.value(levels[0])
+    gw.rel06.value(levels[1])
+    for s, t in zip(gw.tsamples, temps): s[0] = t
+    g.update(saved)
+    gw.clk_set(int(sim.board.local()), gw.utc_offset(int(sim.board.utc())))
+
+# Uhren auf Ortszeit h:m stellen (Sommer)
+def at(gw, h, m):
+    gw.clk_set(time.mktime((2025, 6, 2, h, m, 0, 0, 0)), 7200)
+
+# ein Durchlauf mit Innen-/Aussentemperatur, Rueckgabe die neuen Meldungen (ohne Zeit)
+def step(sim, ti, ta):
+    gw = sim.gw
+    gw.tsamples[0][0] = ti - gw.tcorr_in
+    gw.tsamples[1][0] = ta - gw.tcorr_out
+    n0 = gw.ver[gw.VER_LOG]
+
+    async def run():
+        gw.job_ctrl()
+        await asyncio.sleep(0)
+
+    sim.run(run())
+    n = gw.ver[gw.VER_LOG] - n0
+    return [m[20:].rstrip() for m in gw.msg_txt[:n]]
+
+# Fahrt zu Ende laufen lassen, danach stehen alle Relais in Ruhe
+def travel(sim):
+    sim.run(asyncio.sleep(sim.gw.mot_duration + 1))
+    assert win_relays(sim.gw) == WIN_REST
+
+# Fensterrelais: a-Relais (1, 3) nach oben, b-Relais (2, 4) nach unten, aktiv low
+def win_relays(gw):
+    return tuple(r.value() for r in gw.wdrive.rel)
+
+WIN_UP           = (0, 1, 0, 1)
+WIN_DOWN         = (1, 0, 1, 0)
+WIN_REST         = (1, 1, 1, 1)
+
+# Fenster ohne Meldung in einen Zustand bringen, ohne Fahrt
+def win_state(gw, on):
+    gw.wdrive.cancel()
+    gw.wdrive.pos = 1.0 if on else 0.0
+    gw.wins_open = on
+
+#-------------------------------------------------------------------------------
+
+def test_window_limits_by_season(ctrl):
+    sim = ctrl
+    gw = sim.gw
+    at(gw, 12, 0)
+    win_state(gw, False)
+
+    # Sommer oeffnet erst ab 32 Grad, Fruehling ab 30
+    gw.year_time = 1
+    assert step(sim, 31.0, 20.0) == []
+    assert not gw.wins_open and win_relays(gw) == WIN_REST
+    gw.year_time = 0
+    assert step(sim, 31.0, 20.0) == ["Oeffne Fenster"]
+    assert gw.wins_open and win_relays(gw) == WIN_UP
+
+    # Winter schliesst wie Herbst erst bei 22 Grad, Sommer schon bei 24
+    win_state(gw, True)
+    gw.year_time = 3
+    assert step(sim, 23.0, 20.0) == []
+    assert gw.wins_open and win_relays(gw) == WIN_REST
+    gw.year_time = 1
+    assert step(sim, 23.0, 20.0) == ["Schliesse Fenster"]
+    assert not gw.wins_open and win_relays(gw) == WIN_DOWN
+
+def test_tsave_closes_and_blocks(ctrl):
+    sim = ctrl
+    gw = sim.gw
+    at(gw, 12, 0)
+    gw.year_time = 1
+    win_state(gw, True)
+
+    # kalt draussen: schliessen mit eigener Meldung, Waermespeicher gesetzt
+    txt = "Schliesse Fenster (Waermespeicher)"
+    assert step(sim, 35.0, gw.t_wcut_close - 1) == [txt[:30]]
+    assert gw.tsave and not gw.wins_open and win_relays(gw) == WIN_DOWN
+    travel(sim)
+
+    # waermer, aber noch keine t_tsave Grad ueber der Grenze: bleibt zu
+    assert step(sim, 35.0, gw.t_wcut_close + gw.t_tsave - 1) == []
+    assert gw.tsave and not gw.wins_open
+
+    # genug waermer: Flag faellt nach den Regeln, geoeffnet wird im naechsten Durchlauf
+    assert step(sim, 35.0, gw.t_wcut_close + gw.t_tsave) == []
+    assert not gw.tsave and not gw.wins_open
+    assert step(sim, 35.0, gw.t_wcut_close + gw.t_tsave) == ["Oeffne Fenster"]
+    assert gw.wins_open and win_relays(gw) == WIN_UP
+
+def test_tsave_set_in_same_pass_without_opening(ctrl):
+    sim = ctrl
+    gw = sim.gw
+    at(gw, 12, 0)
+    gw.year_time = 1
+    gw.tsave = False
+    win_state(gw, False)
+
+    # wuerde oeffnen, es ist aber zu kalt: weder Fahrt noch Meldung, nur das Flag
+    assert step(sim, 35.0, gw.t_wcut_close - 1) == []
+    assert gw.tsave
+    assert not gw.wins_open and not gw.wdrive.moving()
+    assert win_relays(gw) == WIN_REST
+
+def test_wdtime_closes_until_23(ctrl):
+    sim = ctrl
+    gw = sim.gw
+    gw.year_time = 1
+    gw.ct_hour, gw.ct_min = 18, 30
+    win_state(gw, True)
+
+    at(gw, 18, 29)
+    assert step(sim, 35.0, 20.0) == []
+    assert not gw.wdtime and gw.wins_open
+
+    at(gw, 18, 30)
+    assert step(sim, 35.0, 20.0) == ["Schliesse Fenster (Abendzeit)"]
+    assert gw.wdtime and not gw.wins_open and win_relays(gw) == WIN_DOWN
+    travel(sim)
+
+    at(gw, 22, 59)
+    assert step(sim, 35.0, 20.0) == []
+    assert gw.wdtime and not gw.wins_open
+
+    # um 23 Uhr aufgehoben, im selben Durchlauf wird wieder geoeffnet
+    at(gw, 23, 0)
+    assert step(sim, 35.0, 20.0) == ["Oeffne Fenster"]
+    assert not gw.wdtime and gw.wins_open and win_relays(gw) == WIN_UP
+
+def test_vent_limits_by_door(ctrl):
+    sim = ctrl
+    gw = sim.gw
+    at(gw, 12, 0)
+    gw.wins_manu = True
+    gw.vent_on = False
+    gw.rel05.value(1)
+
+    # Tuer offen (tval 0): t_vo_on 40 Grad, bei 37 bleibt der Ventilator aus
+    gw.tval = 0
+    assert step(sim, 37.0, 20.0) == []
+    assert not gw.vent_on and gw.rel05.value() == 1
+
+    # Tuer zu (tval 1): t_vc_on 36 Grad
+    gw.tval = 1
+    assert step(sim, 37.0, 20.0) == ["Ventilator ein"]
+    assert gw.vent_on and gw.rel05.value() == 0
+
+    # zwischen t_vc_off und t_vc_on bleibt er an
+    assert step(sim, 35.5, 20.0) == []
+    assert gw.vent_on and gw.rel05.value() == 0
+
+    # Tuer wieder offen: unter t_vo_off aus
+    gw.tval = 0
+    assert step(sim, 35.5, 20.0) == ["Ventilator aus"]
+    assert not gw.vent_on and gw.rel05.value() == 1
+
+#-------------------------------------------------------------------------------
+# Stetiger Modus: Heizung mit PID und Relais-PWM ueber den Steuer-Job
+
+RULE_HEAT        = 2
+
+# Steuer-Job im Regeltakt fuer secs Sekunden, Temperatur aus temp(ti, ein), Rueckgabe je
+# Durchlauf (ticks_ms, Relaispegel, Fensterbeginn, Tastgrad) und die Meldungen
+def heat_run(sim, secs, ti, temp):
+    gw = sim.gw
+    pid = gw.RULES[RULE_HEAT].pid
+    rec = []
+    n0 = gw.ver[gw.VER_LOG]
+
+    async def run():
+        t = ti
+        for i in range(secs * 1000 // gw.CTRL_PERIOD):
+            gw.tsamples[0][0] = t - gw.tcorr_in
+            gw.job_ctrl()
+            rec.append((time.ticks_ms(), gw.rel06.value(), pid.w0, pid.u))
+            await asyncio.sleep(gw.CTRL_PERIOD / 1000)
+            t = temp(t, gw.rel06.value() == 0)
+        return t
+
+    t = sim.run(run())
+    return t, rec, gw.ver[gw.VER_LOG] - n0
+
+@pytest.fixture
+def pid(ctrl):
+    gw = ctrl.gw
+    at(gw, 12, 0)
+    gw.wins_manu = gw.vent_manu = True
+    gw.pid_on = True
+    gw.heat_on = False
+    gw.rel06.value(1)
+    gw.tsamples[1][0] = 20.0 - gw.tcorr_out
+    gw.RULES[RULE_HEAT].pid.reset()
+    return ctrl
+
+def test_pid_anti_windup(pid):
+    sim = pid
+    gw = sim.gw
+    p = gw.RULES[RULE_HEAT].pid
+    sp = (gw.t_heat_on + gw.t_heat_off) / 2
+
+    # 3 h ein Kelvin unter dem Sollwert: Ausgang begrenzt, der I-Anteil waechst nicht weiter
+    t, rec, n = heat_run(sim, 3 * 3600, sp - 1, lambda t, on: t)
+    # (ohne Begrenzung des Integrierens stuende der I-Anteil hier bei 3)
+    assert rec[-1][3] > 0.99 and rec[-1][1] == 0
+    assert all(r[1] == 0 for r in rec[-120:])
+    assert gw.PID_KP * p.i / gw.PID_TI <= 1.0
+
+    # ueber dem Sollwert: Tastgrad faellt sofort deutlich, nach einer Stunde aus
+    t, rec, n = heat_run(sim, 3600, sp + 0.5, lambda t, on: t)
+    assert max(r[3] for r in rec[12:]) < 0.5
+    assert rec[-1][3] < 0.01 and rec[-1][1] == 1
+    assert n == 0
+
+def test_pid_pwm_min_times_and_windows(pid):
+    sim = pid
+    gw = sim.gw
+
+    # Heizung gegen 5 Grad Umgebung, voll ein haelt 10 Grad (Zeitkonstante 1 h)
+    def temp(t, on):
+        return t + (5.0 - t + (5.0 if on else 0.0)) * gw.CTRL_PERIOD / 3600000
+
+    t, rec, n = heat_run(sim, 12 * 3600, 5.0, temp)
+    assert n == 0
+
+    # Wechsel des Relais: Zeitpunkt, neuer Pegel, Fensterbeginn
+    ch = [(r[0], r[1], r[2]) for a, r in zip(rec, rec[1:]) if r[1] != a[1]]
+    assert len(ch) >= 20
+
+    # keine Ein- oder Auszeit unter der Mindestdauer
+    for a, b in zip(ch, ch[1:]):
+        lim = gw.PWM_MIN_ON_MS if a[1] == 0 else gw.PWM_MIN_OFF_MS
+        assert time.ticks_diff(b[0], a[0]) >= lim
+
+    # hoechstens ein Wechsel je PWM-Fenster
+    w0s = [c[2] for c in ch]
+    assert len(set(w0s)) == len(w0s)
+
+    # eingeschwungen nahe am Sollwert (Zeitkonstante 1 h, Fenster 10 min)
+    sp = (gw.t_heat_on + gw.t_heat_off) / 2
+    assert abs(t - sp) < 0.5
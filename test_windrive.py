@@ -0,0 +1,78 @@
+#------------------------------------------------------------------------------#
+#                                                                              #
+# Project:           Greenhouse control with Raspberry Pi Pico W               #
+# Module:            test_windrive.py (Fensterantrieb ohne Blockieren)         #
+#                                                                              #
+#------------------------------------------------------------------------------#
+
+import asyncio
+
+# Abfrage im Sekundentakt: Verzoegerung gegenueber dem geplanten Zeitpunkt bis zur
+# fertigen Antwort, in Platinenzeit (virtuelle Zeit plus blockierte Zeit). Eine
+# blockierende Fahrt (sleep ueber die Motorlaufzeit) zeigte sich hier als 30 s.
+
+PROBE_MAX_MS     = 50
+
+async def probe(sim, secs):
+    st = sim.board.st
+    lat = []
+    for i in range(secs):
+        due = st.mono() + 1
+        await asyncio.sleep(1)
+        w = await sim.get("/api/status")
+        assert w.status() == 200
+        lat.append((st.mono() - due) * 1000)
+    return lat
+
+def test_travel_keeps_http_responsive(sim):
+
+    gw = sim.gw
+    wd = gw.wdrive
+
+    async def run():
+        if wd.position() > 0:
+            wd.start(gw.WD_DOWN, True)
+            await asyncio.sleep(gw.mot_duration + 1)
+        before = await probe(sim, 5)
+        st = sim.board.st
+        t0 = st.mono()
+        w = await sim.get("/wins/on")
+        t_page = st.mono() - t0
+        assert w.status() == 200
+        assert wd.moving()
+        during = await probe(sim, gw.mot_duration - 2)
+        assert wd.moving()
+        await asyncio.sleep(3)
+        return before, t_page, during
+
+    before, t_page, during = sim.run(run())
+
+    # Fahrt zu Ende, oben angekommen, Relais in Ruhestellung
+    assert not wd.moving()
+    assert wd.position() == 1.0
+    assert all(r.value() == 1 for r in wd.rel)
+
+    # Antwort sofort, Verzoegerung waehrend der Fahrt wie davor
+    assert t_page * 1000 < PROBE_MAX_MS
+    assert max(before) < PROBE_MAX_MS
+    assert max(during) < PROBE_MAX_MS
+    assert max(during) <= max(before) + 1
+
+def test_reverse_during_travel(sim):
+
+    gw = sim.gw
+    wd = gw.wdrive
+
+    async def run():
+        wd.start(gw.WD_DOWN, True)
+        await asyncio.sleep(10)
+        p = wd.position()
+        wd.reverse()
+        await asyncio.sleep(gw.WD_PAUSE_MS / 1000 + 5)
+        return p
+
+    p = sim.run(run())
+    assert wd.moving() and wd.state == gw.WD_UP
+    assert wd.position() > p - 0.01
+    wd.cancel()
+    assert not wd.moving()